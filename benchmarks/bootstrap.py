@@ -0,0 +1,7 @@
+"""
+Puts the repo root on sys.path, the scripts here import it ahead of src so they run from any directory
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
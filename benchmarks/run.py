@@ -0,0 +1,241 @@
+"""
+Parser benchmarks over frozen pages
+
+python benchmarks/run.py freeze      fetch every page in fixtures/manifest.json into fixtures/cache (needs the network)
+python benchmarks/run.py freeze --synthetic    write synthetic stand ins for those pages instead (see synthetic.py)
+python benchmarks/run.py run         time every accessor on every fixture and write results.json
+python benchmarks/run.py baseline    same as run, but store the results as baseline.json
+python benchmarks/run.py compare     same as run, then exit 1 if anything regressed past the manifest's thresholds
+
+The fixtures are a PageCache, so the page classes load them by url exactly as they would from the site, and the run
+crawler refuses to touch the network. Bump the manifest version when the fixtures are re-frozen, results are only
+compared against a baseline of the same version
+The committed fixtures and baseline.json are the synthetic pages, so run and compare work offline from a checkout
+Re-baseline on the machine doing the comparing, timings from another machine aren't comparable
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import bootstrap  # noqa: F401 (puts the repo root on sys.path for src)
+from src.data import crawler
+from src.data.game_data import GameData
+from src.data.page_cache import PageCache, set_default_cache
+from src.data.season_data import SeasonData
+from src.data.team_data import TeamData
+from src.data.week_data import WeekData
+import synthetic
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(BENCH_DIR, 'fixtures', 'manifest.json')
+CACHE_DIR = os.path.join(BENCH_DIR, 'fixtures', 'cache')
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results.json')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+class FrozenCrawler(crawler.Crawler):
+    # Only ever serves pages from the fixture cache
+
+    def request(self, url, headers=None):
+        raise KeyError(f'Fixture Not Frozen: {url}')
+
+
+def load_manifest():
+    with open(MANIFEST_PATH) as file:
+        return json.load(file)
+
+
+def team_url(fixture):
+    return f"{TeamData.bs_pg}/teams/{fixture['team']}/{fixture['year']}.htm"
+
+
+def freeze(manifest, slp_tm=3, synthetic_pages=False):
+    # Constructing each page class pulls its pages through the crawler and into the fixture cache
+    cache = PageCache(CACHE_DIR)
+    if synthetic_pages:
+        for url, body in synthetic.pages(manifest).items():
+            cache.put(url, body)
+        # Served from the cache only, so the game urls below are read off the synthetic week pages
+        slp_tm = 0
+    set_default_cache(cache)
+    crawler.set_default_crawler((FrozenCrawler if synthetic_pages else crawler.Crawler)(delay=slp_tm, cache=cache))
+    for fixture in manifest['fixtures']:
+        print('freezing', fixture['name'])
+        if fixture['kind'] == 'season':
+            SeasonData(fixture['year'])
+        elif fixture['kind'] == 'week':
+            WeekData(fixture['year'], fixture['week'])
+        elif fixture['kind'] == 'game':
+            if 'url' not in fixture:
+                fixture['url'] = WeekData(fixture['year'], fixture['week']).game_urls[fixture['game']]
+            GameData(fixture['url'])
+        elif fixture['kind'] == 'team':
+            TeamData(fixture['year']).soup_team_extract(team_url(fixture))
+    with open(MANIFEST_PATH, 'w') as file:
+        json.dump(manifest, file, indent=1)
+
+
+def accessors(fixture):
+    """
+    (name, setup, call) for everything to measure on the fixture, setup builds a fresh object outside the timing
+    and call(obj) is what's timed
+    """
+    year = fixture['year']
+    if fixture['kind'] == 'game':
+        page = crawler.fetch_page(fixture['url'])
+
+        def new():
+            return GameData(fixture['url'], page=page)
+        tables = [table for table in GameData.table_dict if table != 'stats_table']
+        tables += list(GameData.table_dict['stats_table'])
+        return ([('construct', None, lambda obj: new())]
+                + [(table, new, lambda obj, table=table: obj.extract([table])) for table in tables])
+    if fixture['kind'] == 'season':
+        def new():
+            return SeasonData(year)
+        return ([('construct', None, lambda obj: new()),
+                 ('week_urls', new, lambda obj: obj.week_urls),
+                 ('awards', new, lambda obj: obj.awards)]
+                + [(div_id, new, lambda obj, div_id=div_id: obj.season_stats(div_id))
+                   for div_id in SeasonData.table_dict['season_stats']])
+    if fixture['kind'] == 'week':
+        def new():
+            return WeekData(year, fixture['week'])
+        return ([('construct', None, lambda obj: new()),
+                 ('week_summaries', new, lambda obj: obj.week_summaries),
+                 ('potw', new, lambda obj: obj.potw)]
+                + [(div_id, new, lambda obj, div_id=div_id: obj.player_stat(div_id))
+                   for div_id in WeekData.table_dict['player_stat']])
+    if fixture['kind'] == 'team':
+        def new():
+            team = TeamData(year)
+            team.soup_team_extract(team_url(fixture))
+            return team
+        return [('construct', None, lambda obj: TeamData(year)),
+                ('soup_team_extract', lambda: TeamData(year), lambda obj: obj.soup_team_extract(team_url(fixture))),
+                ('team_stats', new, lambda obj: obj.team_stats()),
+                ('team_game_results', new, lambda obj: obj.team_game_results()),
+                ('team_conversion', new, lambda obj: obj.team_conversion())]
+    raise KeyError('Fixture Kind Not Found')
+
+
+def measure(setup, call, repeat):
+    """
+    Median and best wall time over repeat calls, then one traced call for the peak memory and the memory and
+    number of blocks still held once it returns
+    """
+    times = []
+    for _ in range(repeat):
+        obj = setup() if setup is not None else None
+        start = time.perf_counter()
+        call(obj)
+        times.append(time.perf_counter() - start)
+    obj = setup() if setup is not None else None
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = call(obj)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained_blocks = sys.getallocatedblocks() - blocks
+    del result
+    return {
+        'time': statistics.median(times),
+        'best_time': min(times),
+        'peak_kb': peak / 1024,
+        'retained_kb': current / 1024,
+        'retained_blocks': retained_blocks,
+    }
+
+
+def run(manifest, repeat=5, names=None):
+    cache = PageCache(CACHE_DIR)
+    set_default_cache(cache)
+    crawler.set_default_crawler(FrozenCrawler(delay=0, cache=cache))
+    results = {'version': manifest['version'], 'python': sys.version.split()[0], 'fixtures': {}}
+    for fixture in manifest['fixtures']:
+        if names and fixture['name'] not in names:
+            continue
+        fixture_results = results['fixtures'][fixture['name']] = {}
+        try:
+            fixture_accessors = accessors(fixture)
+        except (KeyError, AttributeError) as err:
+            fixture_results['error'] = repr(err)
+            continue
+        for name, setup, call in fixture_accessors:
+            try:
+                fixture_results[name] = measure(setup, call, repeat)
+            except Exception as err:
+                # Older pages lack some tables, that's recorded rather than fatal
+                fixture_results[name] = {'error': repr(err)}
+    return results
+
+
+def compare(results, baseline, thresholds):
+    """
+    Returns a line per accessor that got slower or needed more memory than the thresholds allow
+    Times under min_time are too noisy for a ratio and are only flagged once they cross it
+    """
+    regressions = []
+    if baseline.get('version') != results['version']:
+        return [f"baseline is for fixtures version {baseline.get('version')}, these are {results['version']}"]
+    for fixture, accessor_results in results['fixtures'].items():
+        for name, stats in accessor_results.items():
+            base = baseline['fixtures'].get(fixture, {}).get(name)
+            if not isinstance(stats, dict) or base is None or 'error' in base:
+                continue
+            if 'error' in stats:
+                regressions.append(f"{fixture} {name}: {stats['error']}")
+                continue
+            if stats['time'] > max(base['time'], thresholds['min_time']) * thresholds['time']:
+                regressions.append(f"{fixture} {name}: time {base['time'] * 1000:.2f}ms -> {stats['time'] * 1000:.2f}ms")
+            if stats['peak_kb'] > base['peak_kb'] * thresholds['peak_kb']:
+                regressions.append(f"{fixture} {name}: peak {base['peak_kb']:.0f}kB -> {stats['peak_kb']:.0f}kB")
+    return regressions
+
+
+def report(results):
+    for fixture, accessor_results in results['fixtures'].items():
+        for name, stats in accessor_results.items():
+            if not isinstance(stats, dict) or 'error' in stats:
+                print(f'{fixture:16} {name:26} {stats if not isinstance(stats, dict) else stats["error"]}')
+            else:
+                print(f"{fixture:16} {name:26} {stats['time'] * 1000:9.2f}ms {stats['peak_kb']:9.0f}kB peak "
+                      f"{stats['retained_kb']:9.0f}kB retained")
+
+
+def write_json(obj, path):
+    with open(path, 'w') as file:
+        json.dump(obj, file, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=['freeze', 'run', 'baseline', 'compare'])
+    parser.add_argument("-r", "--repeat", help="timed calls per accessor", type=int, default=5)
+    parser.add_argument("-f", "--fixtures", help="only these fixtures", nargs='*')
+    parser.add_argument("-s", "--sleep_time", help="seconds between requests when freezing", type=int, default=3)
+    parser.add_argument("--synthetic", help="freeze synthetic pages rather than fetching the site",
+                        action='store_true')
+    args = parser.parse_args()
+    manifest = load_manifest()
+    if args.command == 'freeze':
+        freeze(manifest, args.sleep_time, args.synthetic)
+        sys.exit(0)
+    if args.command == 'compare' and not os.path.exists(BASELINE_PATH):
+        sys.exit(f'No baseline at {BASELINE_PATH}, run `python benchmarks/run.py baseline` first')
+    results = run(manifest, args.repeat, args.fixtures)
+    report(results)
+    write_json(results, RESULTS_PATH)
+    if args.command == 'baseline':
+        write_json(results, BASELINE_PATH)
+    elif args.command == 'compare':
+        with open(BASELINE_PATH) as file:
+            regressions = compare(results, json.load(file), manifest['thresholds'])
+        for line in regressions:
+            print('REGRESSION', line)
+        sys.exit(1 if regressions else 0)
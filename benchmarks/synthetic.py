@@ -0,0 +1,249 @@
+"""
+Synthetic pages shaped like pro-football-reference's, for benchmarking without the site
+
+python benchmarks/run.py freeze --synthetic     writes these into fixtures/cache under the urls they stand in for
+
+Every table a page class reads is there, with the layout the site uses (tables hidden in html comments, the same
+classes, ids and data-stat cells) and a full league of 32 teams, so the timings scale like a real page's. The game
+is the test suite's boxscore fixture
+"""
+import os
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BOXSCORE_PATH = os.path.join(os.path.dirname(BENCH_DIR), 'tests', 'fixtures', 'boxscore.htm')
+SITE = 'https://www.pro-football-reference.com'
+
+TEAMS = [
+    ('nwe', 'New England Patriots', 'AFC East'), ('buf', 'Buffalo Bills', 'AFC East'),
+    ('mia', 'Miami Dolphins', 'AFC East'), ('nyj', 'New York Jets', 'AFC East'),
+    ('pit', 'Pittsburgh Steelers', 'AFC North'), ('rav', 'Baltimore Ravens', 'AFC North'),
+    ('cin', 'Cincinnati Bengals', 'AFC North'), ('cle', 'Cleveland Browns', 'AFC North'),
+    ('jax', 'Jacksonville Jaguars', 'AFC South'), ('oti', 'Tennessee Titans', 'AFC South'),
+    ('clt', 'Indianapolis Colts', 'AFC South'), ('htx', 'Houston Texans', 'AFC South'),
+    ('kan', 'Kansas City Chiefs', 'AFC West'), ('sdg', 'Los Angeles Chargers', 'AFC West'),
+    ('rai', 'Oakland Raiders', 'AFC West'), ('den', 'Denver Broncos', 'AFC West'),
+    ('phi', 'Philadelphia Eagles', 'NFC East'), ('dal', 'Dallas Cowboys', 'NFC East'),
+    ('was', 'Washington Redskins', 'NFC East'), ('nyg', 'New York Giants', 'NFC East'),
+    ('min', 'Minnesota Vikings', 'NFC North'), ('det', 'Detroit Lions', 'NFC North'),
+    ('gnb', 'Green Bay Packers', 'NFC North'), ('chi', 'Chicago Bears', 'NFC North'),
+    ('nor', 'New Orleans Saints', 'NFC South'), ('car', 'Carolina Panthers', 'NFC South'),
+    ('atl', 'Atlanta Falcons', 'NFC South'), ('tam', 'Tampa Bay Buccaneers', 'NFC South'),
+    ('ram', 'Los Angeles Rams', 'NFC West'), ('sea', 'Seattle Seahawks', 'NFC West'),
+    ('crd', 'Arizona Cardinals', 'NFC West'), ('sfo', 'San Francisco 49ers', 'NFC West'),
+]
+
+SEASON_STAT_COLS = {
+    'all_team_stats': ['points', 'total_yards', 'plays_offense', 'yds_per_play_offense', 'turnovers', 'fumbles_lost'],
+    'all_passing': ['pass_cmp', 'pass_att', 'pass_cmp_perc', 'pass_yds', 'pass_td', 'pass_int'],
+    'all_rushing': ['rush_att', 'rush_yds', 'rush_td', 'rush_yds_per_att', 'fumbles'],
+    'all_returns': ['punt_ret', 'punt_ret_yds', 'kick_ret', 'kick_ret_yds', 'all_purpose_yds'],
+    'all_kicking': ['fga', 'fgm', 'fg_perc', 'xpa', 'xpm', 'xp_perc', 'punt', 'punt_yds'],
+    'all_team_scoring': ['rushtd', 'rectd', 'prtd', 'krtd', 'frtd', 'twopm', 'scoring'],
+    'all_team_conversions': ['third_down_att', 'third_down_success', 'third_down_pct', 'red_zone_att',
+                             'red_zone_pct'],
+    'all_drives': ['drives', 'plays', 'score_pct', 'turnover_pct', 'start_avg', 'time_avg'],
+}
+
+
+def _td(stat, body='', tag='td', extra=''):
+    return f'<{tag} data-stat="{stat}"{extra}>{body}</{tag}>'
+
+
+def _tr(cells, cls=None):
+    return f'<tr class="{cls}">' + ''.join(cells) + '</tr>' if cls else '<tr>' + ''.join(cells) + '</tr>'
+
+
+def _team_link(team_id, name, year):
+    return f'<a href="/teams/{team_id}/{year}.htm">{name}</a>'
+
+
+def _player_link(player_id, name):
+    return f'<a href="/players/{player_id[0]}/{player_id}.htm">{name}</a>'
+
+
+def _table(head_rows, body_rows):
+    return ('<table class="stats_table"><thead>' + ''.join(head_rows) + '</thead><tbody>' + ''.join(body_rows)
+            + '</tbody></table>')
+
+
+def _commented(div_id, table):
+    # The site ships most tables inside a comment and fills them in with javascript
+    return (f'<div id="{div_id}" class="table_wrapper"><div class="section_heading"><h2>{div_id}</h2></div>'
+            f'<div class="placeholder"></div><!--\n<div class="table_container" id="div_{div_id[4:]}">{table}</div>\n'
+            f'--></div>\n')
+
+
+def _inline(div_id, table):
+    return f'<div id="{div_id}" class="table_wrapper"><div class="table_container">{table}</div></div>\n'
+
+
+def _stat_val(col, idx):
+    if col.endswith(('perc', 'pct')):
+        return f'{40 + idx % 30}.{idx % 10}%'
+    if col == 'start_avg':
+        return ('Own ' if idx % 2 else 'Opp ') + f'{25 + idx % 10}.{idx % 10}'
+    if col == 'time_avg':
+        return f'2:{10 + idx % 50:02d}'
+    if col.endswith('per_att') or col.endswith('offense') and col.startswith('yds'):
+        return f'{4 + idx % 3}.{idx % 10}'
+    return str(100 + 7 * idx + len(col))
+
+
+def season_page(year):
+    # Standings per conference, playoff standings and results, every team stats table, the weeks and the awards
+    head = [_tr([_td('', 'x', 'th')], 'over_header'), _tr([_td('team', 'Tm', 'th'), _td('wins', 'W', 'th')])]
+    divs = []
+    for conf in ['AFC', 'NFC']:
+        rows = []
+        for idx, (team_id, name, division) in enumerate(team for team in TEAMS if team[2].startswith(conf)):
+            if idx % 4 == 0:
+                rows.append(_tr([_td('onecell', division)], 'thead onecell'))
+            rows.append(_tr([_td('team', _team_link(team_id, name, year) + ('*' if idx % 4 == 0 else ''), 'th'),
+                             _td('wins', str(13 - idx % 8)), _td('losses', str(3 + idx % 8)), _td('ties', ''),
+                             _td('win_loss_perc', f'.{813 - 60 * (idx % 8)}'), _td('points', str(450 - 9 * idx)),
+                             _td('mov', f'{8 - idx}.{idx % 10}'), _td('srs', f'{7 - idx}.{idx % 10}')]))
+        divs.append((_inline if conf == 'AFC' else _commented)(f'all_{conf}', _table(head, rows)))
+        rows = []
+        for seed, (team_id, name, _) in enumerate([team for team in TEAMS if team[2].startswith(conf)][:7], 1):
+            rows.append(_tr([_td('team', f'<a name="{seed}"></a>' + _team_link(team_id, name, year), 'th'),
+                             _td('why', 'Bye &amp; home' if seed < 3 else ''), _td('wins', str(13 - seed)),
+                             _td('losses', str(3 + seed))]))
+        divs.append(_commented(f'all_{conf.lower()}_playoff_standings',
+                               _table([_tr([_td('team', 'Tm', 'th'), _td('why', 'Why', 'th')])], rows)))
+    rows = []
+    for idx in range(11):
+        winner, loser = TEAMS[idx], TEAMS[31 - idx]
+        rows.append(_tr([_td('week_num', 'WildCard' if idx < 4 else 'Division', 'th'),
+                         _td('game_day_of_week', 'Sat'), _td('winner', _team_link(winner[0], winner[1], year)),
+                         _td('game_location', '@' if idx % 2 else ''),
+                         _td('loser', _team_link(loser[0], loser[1], year)),
+                         _td('boxscore_word',
+                             f'<a href="/boxscores/{year + 1}0106{idx:01d}{winner[0]}.htm">boxscore</a>'),
+                         _td('pts_win', str(30 - idx)), _td('pts_lose', str(20 - idx))]))
+    divs.append(_commented('all_playoff_results',
+                           _table([_tr([_td('week_num', 'Week', 'th'), _td('winner', 'Winner', 'th')])], rows)))
+    for div_id, cols in SEASON_STAT_COLS.items():
+        head = [_tr([_td('', 'x', 'th')], 'over_header'),
+                _tr([_td('ranker', 'Rk', 'th'), _td('team', 'Tm', 'th'), _td('g', 'G', 'th')]
+                    + [_td(col, col, 'th') for col in cols])]
+        rows = []
+        for idx, (team_id, name, _) in enumerate(TEAMS):
+            rows.append(_tr([_td('ranker', str(idx + 1), 'th'), _td('team', _team_link(team_id, name, year)),
+                             _td('g', '16')]
+                            + [_td(col, _stat_val(col, idx), extra=f' csk="{25 + idx % 10}.0"' if col == 'start_avg'
+                                   else '') for col in cols]))
+        for label in ['Avg Team', 'League Total', 'Avg Tm/G']:
+            rows.append(_tr([_td('ranker', '', 'th'), _td('team', label), _td('g', '16')]
+                            + [_td(col, '') for col in cols]))
+        divs.append(_commented(div_id, _table(head, rows)))
+    weeks = ''.join(f'<a href="/years/{year}/week_{week}.htm">Week {week}</a>' for week in range(1, 18))
+    divs.append(_commented('all_week_games', f'<table><tr><td>{weeks}</td></tr></table>'))
+    awards = ''.join(f'<tr><td><a href="/awards/{award}.htm">{name}</a></td><td>{_player_link(player_id, player)}'
+                     f'</td></tr>'
+                     for award, name, player_id, player in [('ap-nfl-mvp-award', 'AP MVP', 'BradTo00', 'Tom Brady'),
+                                                            ('ap-offensive-rookie-of-the-year-award', 'AP Off. ROY',
+                                                             'KamaAl00', 'Alvin Kamara'),
+                                                            ('ap-defensive-player-of-the-year-award', 'AP DPOY',
+                                                             'DonaAa00', 'Aaron Donald')])
+    divs.append(_commented('all_awards', f'<table>{awards}</table>'))
+    return f'<html><head><title>{year} NFL Standings</title></head><body>' + ''.join(divs) + '</body></html>'
+
+
+def game_href(year, idx):
+    # The first game is the boxscore fixture's, 201709070nwe for 2017
+    return f'/boxscores/{year}09{7 + idx % 4:02d}0{TEAMS[idx][0]}.htm'
+
+
+def _summary(idx, year):
+    winner, loser = TEAMS[idx], TEAMS[31 - idx]
+    leaders = ''.join(f'<tr><td>{title}</td><td><a href="/players/{pid[0]}/{pid}.htm" title="{name}">{name}</a>'
+                      f'-{team.upper()}</td><td>{val}</td></tr>'
+                      for title, pid, name, team, val in [('PassYds', f'PassPl{idx:02d}', f'Passer {idx}', winner[0],
+                                                           250 + idx),
+                                                          ('RushYds', f'RushPl{idx:02d}', f'Rusher {idx}', loser[0],
+                                                           90 + idx),
+                                                          ('RecYds', f'RecvPl{idx:02d}', f'Receiver {idx}', winner[0],
+                                                           110 + idx)])
+    return ('<div class="game_summary expanded nohover"><table class="teams"><tbody>'
+            f'<tr class="date"><td colspan="3">Sep {7 + idx % 4}, {year}</td></tr>'
+            f'<tr class="winner"><td>{_team_link(winner[0], winner[1], year)}</td><td class="right">{30 - idx}</td>'
+            f'<td class="right gamelink"><a href="{game_href(year, idx)}">Final</a></td></tr>'
+            f'<tr class="loser"><td>{_team_link(loser[0], loser[1], year)}</td><td class="right">{10 + idx % 9}</td>'
+            f'<td class="right"></td></tr></tbody></table>'
+            f'<table class="stats"><tbody>{leaders}</tbody></table></div>\n')
+
+
+def week_page(year, week):
+    # Sixteen game summaries, the players of the week and the week's top players
+    summaries = [_summary(idx, year) for idx in range(16)]
+    potw_rows = ''.join(f'<tr><th>{conf}</th>'
+                        + ''.join(_td(side, _player_link(f'{conf[0]}{side[:3].title()}Pw00', f'{conf} {side} player'))
+                                  for side in ['offense', 'defense', 'special_teams'])
+                        + '</tr>' for conf in ['AFC', 'NFC'])
+    divs = ['<div class="game_summaries">' + ''.join(summaries) + '</div>\n',
+            _inline('all_potw', f'<table><tr><th>Conf</th><th>Off</th><th>Def</th><th>ST</th></tr>{potw_rows}</table>')]
+    for div_id, cols in [('all_qb_stats', ['pass_cmp', 'pass_att', 'pass_yds', 'pass_td']),
+                         ('all_rec_stats', ['rec', 'rec_yds', 'rec_td']),
+                         ('all_rush_stats', ['rush_att', 'rush_yds', 'rush_td']),
+                         ('all_def_stats', ['tackles_solo', 'sacks', 'def_int'])]:
+        rows = []
+        for idx in range(10):
+            team, opp = TEAMS[idx], TEAMS[31 - idx]
+            rows.append('<tr>' + _td('player', _player_link(f'{div_id[4:8].title()}Pl{idx:02d}', f'Player {idx}'), 'th')
+                        + _td('game_date', f'<a href="{game_href(year, idx)}">{year}-09-{7 + idx % 4:02d}</a>')
+                        + _td('team', team[0].upper()) + _td('game_location', '@' if idx % 2 else '')
+                        + _td('opp', opp[0].upper()) + _td('game_result', f'{"W" if idx % 3 else "L"} 27-{17 + idx}')
+                        + ''.join(_td(col, str(5 + idx + len(col))) for col in cols) + '</tr>')
+        head = _tr([_td('player', 'Player', 'th')] + [_td(col, col, 'th') for col in cols])
+        divs.append(_commented(div_id, f'<table class="stats_table"><thead>{head}</thead><tbody>{"".join(rows)}'
+                                       f'</tbody></table>'))
+    return f'<html><head><title>{year} Week {week}</title></head><body>' + ''.join(divs) + '</body></html>'
+
+
+def team_page(year, team_id):
+    # The team's season totals, game by game results and conversions
+    over = _tr([_td('', 'x', 'th')], 'over_header')
+    stat_cols = ['points', 'total_yards', 'plays_offense', 'fumbles_lost', 'start_avg', 'time_avg', 'plays_per_drive',
+                 'yds_per_drive', 'points_avg']
+    stat_rows = [_tr([_td('player', label, 'th')] + [_td(col, _stat_val(col, idx)) for col in stat_cols])
+                 for idx, label in enumerate(['Team Stats', 'Opp. Stats', 'Lg Rank Offense', 'Lg Rank Defense'])]
+    game_rows = []
+    for week in range(1, 18):
+        if week == 9:
+            game_rows.append(_tr([_td('week_num', str(week), 'th'), _td('game_day_of_week', ''),
+                                  _td('boxscore_word', ''), _td('game_outcome', ''), _td('overtime', ''),
+                                  _td('opp', 'Bye Week'), _td('pts_off', ''), _td('pts_def', '')]))
+            continue
+        opp = TEAMS[(week * 3) % 31 + 1]
+        game_rows.append(_tr([_td('week_num', str(week), 'th'), _td('game_day_of_week', 'Sun'),
+                              _td('boxscore_word',
+                                  f'<a href="/boxscores/{year}09{week:02d}0{team_id}.htm">boxscore</a>'),
+                              _td('game_outcome', 'W' if week % 4 else 'L'), _td('overtime', 'OT' if week == 5 else ''),
+                              _td('opp', _team_link(opp[0], opp[1], year)), _td('pts_off', str(20 + week)),
+                              _td('pts_def', str(10 + week))]))
+    conv_rows = [_tr([_td('player', label, 'th'), _td('third_down_att', str(211 - idx)),
+                      _td('third_down_success_pct', f'4{idx}.2%'), _td('red_zone_att', str(60 - idx))])
+                 for idx, label in enumerate(['Team Stats', 'Opp. Stats'])]
+    divs = [_inline('all_team_stats', _table([over, _tr([_td('player', 'Player', 'th')])], stat_rows)),
+            _inline('all_games', _table([over, _tr([_td('week_num', 'Week', 'th')])], game_rows)),
+            _commented('all_team_conversions', _table([over, _tr([_td('player', 'Player', 'th')])], conv_rows))]
+    return f'<html><head><title>{year} {team_id}</title></head><body>' + ''.join(divs) + '</body></html>'
+
+
+def pages(manifest):
+    """
+    {url: page bytes} for every page the manifest's fixtures load, every game is the boxscore fixture
+    """
+    with open(BOXSCORE_PATH, 'rb') as file:
+        boxscore = file.read()
+    out = {}
+    for fixture in manifest['fixtures']:
+        year = fixture['year']
+        out[f'{SITE}/years/{year}'] = season_page(year).encode()
+        if fixture['kind'] in ['week', 'game']:
+            out[f"{SITE}/years/{year}/week_{fixture['week']}.htm"] = week_page(year, fixture['week']).encode()
+        if fixture['kind'] == 'game':
+            out[SITE + game_href(year, fixture['game'])] = boxscore
+        if fixture['kind'] == 'team':
+            out[f"{SITE}/teams/{fixture['team']}/{year}.htm"] = team_page(year, fixture['team']).encode()
+    return out
@@ -7,4 +7,11 @@ setup(
     description='A short description of the project.',
     author='Michoel Snow',
     license='MIT',
+    extras_require={
+        # Only src.models needs it, to fit models and unpickle them
+        'models': ['scikit-learn'],
+    },
+    entry_points={
+        'console_scripts': ['ff-data=src.data.cli:main'],
+    },
 )
@@ -0,0 +1,23 @@
+from contextlib import contextmanager
+import os
+import tempfile
+
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    """
+    Opens a temp file next to path and renames it over path once the with block is done, so a reader, another
+    worker or the next run sees the old file or the new one and never half of one
+    If the block raises, the temp file is removed and path is left as it was
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, mode) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
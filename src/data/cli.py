@@ -0,0 +1,226 @@
+"""
+ff-data, one command line for every scraper
+
+    ff-data season 2017 -o out
+    ff-data week 2017 1 --tables week_summaries
+    ff-data game https://www.pro-football-reference.com/boxscores/201709070nwe.htm --tables scoring drives
+    ff-data team 2017 nwe
+    ff-data pbp 2017 -w 1
+    ff-data ingest 2010 2017 -o data/interim
+    ff-data load data/interim -d data/interim/ff.db
+
+Only argparse is imported up front, each subcommand imports the scrapers (bs4, lxml, numpy, pandas) when it runs,
+so --help and shell completion don't pay for them
+"""
+import argparse
+import json
+import os
+import sys
+from src.data.manifest import INCREMENTAL_TTL
+
+
+def _setup(args):
+    # Options every subcommand shares, applied before any page is fetched
+    # The registry file is resolved once here, so it's the same one interned into, saved and loaded
+    args.id_registry = args.id_registry or os.environ.get('FF_ID_REGISTRY')
+    if args.no_cache:
+        from src.data.page_cache import set_default_cache
+        set_default_cache(None)
+    elif args.cache is not None:
+        from src.data.page_cache import PageCache, set_default_cache
+        set_default_cache(PageCache(args.cache))
+    if args.report is not None:
+        from src.data import instrument
+        instrument.enable()
+    if args.id_registry is not None:
+        from src.data.registry import IdRegistry, set_default_registry
+        set_default_registry(IdRegistry(args.id_registry))
+    from src.data.crawler import Crawler, set_default_crawler
+    set_default_crawler(Crawler(delay=args.sleep_time))
+
+
+def _output(table_rows, args, season, week=None):
+    """
+    Prints the tables as json, or with --out_dir writes them there as json lines, parquet or feather
+    """
+    if args.out_dir is None:
+        json.dump(table_rows, sys.stdout, default=str, indent=1)
+        sys.stdout.write('\n')
+    elif args.format == 'jsonl':
+        os.makedirs(args.out_dir, exist_ok=True)
+        for table in sorted(table_rows):
+            with open(os.path.join(args.out_dir, f'{table}.jsonl'), 'w') as file:
+                for row in table_rows[table]:
+                    file.write(json.dumps(row, sort_keys=True, default=str) + '\n')
+    else:
+        from src.data.export import write_partitions
+        write_partitions(table_rows, args.out_dir, season, week, args.format)
+
+
+def season(args):
+    from src.data.season_data import SeasonData
+    with SeasonData(args.year, parser=args.parser) as sd:
+        table_rows = sd.extract_rows(args.tables)
+    _output(table_rows, args, args.year)
+
+
+def week(args):
+    from src.data.week_data import WeekData
+    with WeekData(args.year, args.week, parser=args.parser) as wd:
+        table_rows = wd.extract_rows(args.tables)
+    _output(table_rows, args, args.year, args.week)
+
+
+def _game_season(game_datetime):
+    # Playoff games are played in January and February, in the season that started the September before
+    return game_datetime.year - 1 if game_datetime.month < 3 else game_datetime.year
+
+
+def game(args):
+    from src.data.game_data import GameData
+    with GameData(args.url, args.tables, args.parser) as gd:
+        table_rows = gd.extract_rows()
+    if args.out_dir is not None and args.format != 'jsonl':
+        # A single game has no week to partition on, so it gets its own directory
+        args.out_dir = os.path.join(args.out_dir, gd.scrbox_dict['game_id'])
+    _output(table_rows, args, _game_season(gd.scrbox_dict['datetime']))
+
+
+def team(args):
+    from src.data.team_data import TeamData
+    tables = args.tables or ['team_stats', 'team_game_results', 'team_conversion']
+    table_rows = {}
+    with TeamData(args.year, parser=args.parser) as td:
+        td.soup_team_extract(f'{td.bs_pg}/teams/{args.team}/{args.year}.htm')
+        for table in tables:
+            if table not in ['team_stats', 'team_game_results', 'team_conversion']:
+                raise KeyError('Table Not in List of Tables')
+            table_rows[table] = [dict(row, team_id=args.team) for row in getattr(td, table)()]
+    _output(table_rows, args, args.year)
+
+
+def pbp(args):
+    from src.data import pbp as pbp_export
+    if args.manifest is not None:
+        pbp_export.pbp_incremental_export(yr=args.year, wk=args.week, manifest_path=args.manifest,
+                                          out_dir=args.out_dir or '.', slp_tm=args.sleep_time, workers=args.workers,
+                                          ttl=args.ttl)
+    elif args.week is None:
+        pbp_export.pbp_season_export(yr=args.year, slp_tm=args.sleep_time, workers=args.workers, fmt=args.format)
+    else:
+        pbp_export.pbp_export(yr=args.year, wk=args.week, slp_tm=args.sleep_time, workers=args.workers,
+                              fmt=args.format)
+
+
+def ingest(args):
+    from src.data.pipeline import ingest_seasons
+    row_cts, failed = ingest_seasons(args.first_year, args.last_year or args.first_year, args.out_dir or '.',
+                                     tables=args.tables, workers=args.workers, fetch_workers=args.fetch_workers,
+                                     slp_tm=args.sleep_time, parser=args.parser, manifest_path=args.manifest,
+                                     ttl=args.ttl)
+    for table, year in sorted(row_cts):
+        print(f'{table} {year}: {row_cts[(table, year)]} rows')
+    for url, err in failed:
+        print(f'failed {url}: {err}', file=sys.stderr)
+
+
+def load(args):
+    from src.data.warehouse import Warehouse
+    with Warehouse(args.db) as wh:
+        row_cts = wh.load_partitions(args.in_dir)
+        if args.id_registry is not None:
+            from src.data.registry import default_registry
+            wh.load_registry(default_registry())
+        wh.create_indexes()
+    for table, name in sorted(row_cts):
+        print(f'{table} {name}: {row_cts[(table, name)]} rows')
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-o", "--out_dir", help="Directory to write to, prints json when left out")
+    common.add_argument("-s", "--sleep_time", help="The number of seconds to break between each webpage crawl",
+                        type=int, default=3)
+    common.add_argument("-p", "--parser", help="html.parser or lxml, defaults to lxml")
+    common.add_argument("-c", "--cache", help="Page cache directory, defaults to $FF_PAGE_CACHE or data/raw/page_cache")
+    common.add_argument("--no_cache", help="Fetch every page, neither reading nor writing the page cache",
+                        action='store_true')
+    common.add_argument("-r", "--report", help="Time every stage and write the run to REPORT.json and REPORT.prom")
+    common.add_argument("-i", "--id_registry", help="Id registry file the run's ids are interned into and saved to, "
+                                                    "defaults to $FF_ID_REGISTRY")
+
+    parser = argparse.ArgumentParser(prog='ff-data', description='Scrape and extract pro-football-reference data')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    sub = subparsers.add_parser('season', parents=[common], help="a season's standings, awards and team stats")
+    sub.add_argument("year", type=int)
+    sub.add_argument("-t", "--tables", help="SeasonData table_dict keys or season_stats div ids", nargs='*')
+    sub.add_argument("-f", "--format", help="jsonl, parquet or feather", default='jsonl')
+    sub.set_defaults(func=season)
+
+    sub = subparsers.add_parser('week', parents=[common], help="a week's game summaries and top players")
+    sub.add_argument("year", type=int)
+    sub.add_argument("week", type=int)
+    sub.add_argument("-t", "--tables", help="WeekData table_dict keys or player_stat div ids", nargs='*')
+    sub.add_argument("-f", "--format", help="jsonl, parquet or feather", default='jsonl')
+    sub.set_defaults(func=week)
+
+    sub = subparsers.add_parser('game', parents=[common], help="every table of one boxscore")
+    sub.add_argument("url", help="boxscore url or a saved page")
+    sub.add_argument("-t", "--tables", help="GameData table_dict keys or stats_table div ids", nargs='*')
+    sub.add_argument("-f", "--format", help="jsonl, parquet or feather", default='jsonl')
+    sub.set_defaults(func=game)
+
+    sub = subparsers.add_parser('team', parents=[common], help="a team's season stats, results and conversions")
+    sub.add_argument("year", type=int)
+    sub.add_argument("team", help="team id, e.g., nwe")
+    sub.add_argument("-t", "--tables", help="team_stats, team_game_results and/or team_conversion", nargs='*')
+    sub.add_argument("-f", "--format", help="jsonl, parquet or feather", default='jsonl')
+    sub.set_defaults(func=team)
+
+    sub = subparsers.add_parser('pbp', parents=[common], help="raw play by play for a week or season")
+    sub.add_argument("year", type=int)
+    sub.add_argument("-w", "--week", help="week, leave out to export the whole season into one file (or with a "
+                                          "manifest, every week)")
+    sub.add_argument("-n", "--workers", help="The number of pages to fetch and parse at once", type=int, default=4)
+    sub.add_argument("-m", "--manifest", help="Manifest file, only games that are new or changed since the "
+                                              "last run are extracted, one csv per game")
+    sub.add_argument("--ttl", help="With a manifest, seconds a cached page is trusted before the server is asked "
+                                   "whether it changed", type=int, default=INCREMENTAL_TTL)
+    sub.add_argument("-f", "--format", help="csv, parquet or feather", default='csv')
+    sub.set_defaults(func=pbp)
+
+    sub = subparsers.add_parser('ingest', parents=[common], help="every game of a range of seasons, in parallel")
+    sub.add_argument("first_year", type=int)
+    sub.add_argument("last_year", type=int, nargs='?', help="defaults to the first")
+    sub.add_argument("-t", "--tables", help="GameData tables to extract, defaults to all of them", nargs='*')
+    sub.add_argument("-n", "--workers", help="The number of parsing processes", type=int)
+    sub.add_argument("-w", "--fetch_workers", help="The number of pages to fetch at once", type=int, default=4)
+    sub.add_argument("-m", "--manifest", help="Manifest file, only games that are new or changed since the last run "
+                                              "are parsed, the rest are carried over from out_dir")
+    sub.add_argument("--ttl", help="With a manifest, seconds a cached page is trusted before the server is asked "
+                                   "whether it changed", type=int, default=INCREMENTAL_TTL)
+    sub.set_defaults(func=ingest)
+
+    sub = subparsers.add_parser('load', parents=[common], help="ingest's output into an indexed SQLite warehouse")
+    sub.add_argument("in_dir", help="directory ingest wrote to")
+    sub.add_argument("-d", "--db", help="SQLite file, created when it doesn't exist", default='ff.db')
+    sub.set_defaults(func=load)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    _setup(args)
+    args.func(args)
+    if args.id_registry is not None:
+        from src.data.registry import default_registry
+        default_registry().save()
+    if args.report is not None:
+        from src.data import instrument
+        instrument.write_reports(args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib import error, parse, request
+from datetime import datetime, timezone
+import threading
+import time
+from src.data import instrument
+from src.data.page_cache import PageCache, default_cache
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average with bursts of up to burst requests
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Blocks until a token is free and returns how long it waited
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class Crawler:
+    """
+    Fetches pages on a thread pool while keeping every host under a polite request rate
+    delay is the average number of seconds between requests to the same host, burst how many can go back to back
+    Failed requests are retried with exponential backoff, a Retry-After header from the server takes precedence
+    Pages are read from and written to cache (the default PageCache when not given), a fresh cached page
+    never touches the network or the rate limit
+    """
+
+    retry_codes = (429, 500, 502, 503, 504)
+
+    def __init__(self, delay=3, burst=1, workers=4, retries=3, backoff=2, timeout=30, user_agent=None, cache=None):
+        self.delay = delay
+        self.burst = burst
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.failed = []
+        self.cache = cache if cache is not None else default_cache()
+
+    def bucket(self, url):
+        host = parse.urlsplit(url).netloc
+        with self.buckets_lock:
+            if host not in self.buckets:
+                rate = float('inf') if not self.delay else 1 / self.delay
+                self.buckets[host] = TokenBucket(rate, self.burst)
+            return self.buckets[host]
+
+    def fetch(self, url, ttl=None):
+        """
+        Returns the raw bytes of the page, straight from the cache when it holds a fresh copy
+        A stale copy is revalidated with the etag/last modified the server sent and only downloaded again if changed
+        ttl overrides the cache's ttl for this url
+        """
+        headers = {}
+        if self.cache is not None:
+            entry = self.cache.entry(url)
+            body = self.cache.get(url) if entry is not None else None
+            if body is not None:
+                if self.cache.is_fresh(entry, ttl):
+                    instrument.count('cache_hits')
+                    return body
+                headers = self.cache.revalidation_headers(entry)
+        status, resp_headers, resp_body = self.request(url, headers)
+        if status == 304:
+            instrument.count('cache_revalidated')
+            self.cache.touch(url)
+            return body
+        instrument.count('bytes_fetched', len(resp_body))
+        if self.cache is not None:
+            instrument.count('cache_misses')
+            self.cache.put(url, resp_body, resp_headers)
+        return resp_body
+
+    def fetch_if_changed(self, url, validators=None):
+        """
+        Returns (page, validators), page being None when it hasn't changed since validators, the etag/last modified
+        of the copy already processed, e.g., from IngestManifest.validators
+        A cached copy is used the way fetch uses it and counts as unchanged when the server's validators for it match.
+        Without one the server is asked with a conditional request, so an unchanged page costs a 304, not a download
+        """
+        validators = {key: (validators or {}).get(key) for key in ('etag', 'last_modified')}
+        if self.cache is not None and self.cache.entry(url) is not None:
+            pg = self.fetch(url)
+            entry = self.cache.entry(url)
+            current = {key: entry.get(key) for key in validators}
+            if any(current.values()) and current == validators:
+                instrument.count('unchanged')
+                return None, current
+            return pg, current
+        status, resp_headers, resp_body = self.request(url, PageCache.revalidation_headers(validators))
+        if status == 304:
+            instrument.count('unchanged')
+            return None, validators
+        instrument.count('bytes_fetched', len(resp_body))
+        if self.cache is not None:
+            instrument.count('cache_misses')
+            self.cache.put(url, resp_body, resp_headers)
+        return resp_body, {'etag': resp_headers.get('ETag'), 'last_modified': resp_headers.get('Last-Modified')}
+
+    def request(self, url, headers=None):
+        # Returns (status, headers, body), body is None for a 304
+        headers = dict(headers or {})
+        if self.user_agent:
+            headers['User-Agent'] = self.user_agent
+        bucket = self.bucket(url)
+        host = parse.urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            instrument.count('sleep_seconds', bucket.acquire(), reason='rate_limit')
+            instrument.count('requests', host=host)
+            try:
+                with instrument.timer('fetch', host=host):
+                    with request.urlopen(request.Request(url, headers=headers), timeout=self.timeout) as pg:
+                        return pg.status, pg.headers, pg.read()
+            except error.HTTPError as err:
+                if err.code == 304:
+                    return err.code, err.headers, None
+                if err.code not in self.retry_codes or attempt == self.retries:
+                    raise
+                wait = self.retry_after(err.headers.get('Retry-After'))
+                if wait is None:
+                    wait = self.backoff ** attempt
+            except error.URLError:
+                if attempt == self.retries:
+                    raise
+                wait = self.backoff ** attempt
+            instrument.count('retries', host=host)
+            instrument.count('sleep_seconds', wait, reason='retry')
+            time.sleep(wait)
+
+    @staticmethod
+    def retry_after(value):
+        # Retry-After is either a number of seconds or an http date
+        if value is None:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        try:
+            retry_dt = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (retry_dt - datetime.now(timezone.utc)).total_seconds())
+
+    def crawl(self, urls, extract=None, skip_errors=False, fetch=None):
+        """
+        Yields (url, result) in the order of urls, result is the raw page or extract(raw page)
+        Parsing happens on the worker threads so it overlaps with the other workers waiting on the network
+        Only a couple of pages per worker are held at once, so a slow consumer doesn't pile up results
+        With skip_errors, pages that still fail after every retry are left out and recorded in failed
+        fetch(url) gets the page in place of self.fetch, e.g., a fetch_if_changed with the url's validators
+        """
+        fetch = fetch or self.fetch
+
+        def work(url):
+            pg = fetch(url)
+            return extract(pg) if extract is not None else pg
+
+        urls = iter(urls)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for url in urls:
+                pending.append((url, executor.submit(work, url)))
+                if len(pending) >= self.workers * 2:
+                    yield from self._collect(pending.popleft(), skip_errors)
+            while pending:
+                yield from self._collect(pending.popleft(), skip_errors)
+
+    def _collect(self, item, skip_errors):
+        url, future = item
+        try:
+            result = future.result()
+        except (error.URLError, OSError) as err:
+            if not skip_errors:
+                raise
+            self.failed.append((url, err))
+            return
+        yield url, result
+
+
+_default_crawler = None
+
+
+def fetch_page(url, ttl=None):
+    """
+    Fetches a single page through a crawler shared by the whole process, so every scraper
+    shares one rate limit and the default page cache
+    """
+    global _default_crawler
+    if _default_crawler is None:
+        _default_crawler = Crawler()
+    return _default_crawler.fetch(url, ttl)
+
+
+def set_default_crawler(crawler):
+    # Lets a driver share its own crawler (and rate limit) with every scraper
+    global _default_crawler
+    _default_crawler = crawler
@@ -0,0 +1,323 @@
+from datetime import datetime as dt
+import itertools
+import json
+import os
+from src.data.atomic import atomic_write
+from src.data.game_data import GameData
+from src.data.registry import column_kind, default_registry
+
+# Column types, every column of every exported table is one of these
+INT = 'int16'
+BIG_INT = 'int32'
+FLOAT = 'float32'
+STR = 'str'
+DATETIME = 'datetime'
+
+FORMATS = ('parquet', 'feather')
+
+
+def _time_cols():
+    return [('sec_left_in_quarter', INT), ('sec_into_quarter', INT), ('sec_left_in_game', INT),
+            ('sec_into_game', INT)]
+
+
+def _id_name_cols(*prefixes):
+    return [(prefix + suffix, STR) for prefix in prefixes for suffix in ['_id', '_name']]
+
+
+def _scorebox_cols():
+    cols = []
+    for loc in ['home', 'away']:
+        for field, col_type in [('pg', STR), ('id', STR), ('name', STR), ('score', INT), ('coach_pg', STR),
+                                ('coach_id', STR), ('coach_name', STR), ('wins', INT), ('losses', INT),
+                                ('ties', INT)]:
+            cols.append((f'{loc}_team_{field}', col_type))
+    return cols + [('datetime', DATETIME), ('stadium_pg', STR), ('stadium_name', STR), ('stadium_id', STR),
+                   ('game_id', STR)]
+
+
+# Stats that are whole numbers (attempts, completions, yards, touchdowns, tackles, snaps, ...), int16 wherever a
+# stats table has them. The rest of a stats table's columns (rates, percentages, per attempt averages and sacks,
+# which come in halves) stay float32
+count_stats = frozenset([
+    # Passing, rushing, receiving
+    'pass_cmp', 'pass_att', 'pass_yds', 'pass_td', 'pass_int', 'pass_sacked', 'pass_sacked_yds', 'pass_long',
+    'pass_fd', 'rush_att', 'rush_yds', 'rush_td', 'rush_long', 'rush_fd', 'targets', 'rec', 'rec_yds', 'rec_td',
+    'rec_long', 'fumbles', 'fumbles_lost',
+    # Defense
+    'def_int', 'def_int_yds', 'def_int_td', 'def_int_long', 'pass_defended', 'tackles_combined', 'tackles_solo',
+    'tackles_assists', 'tackles_loss', 'qb_hits', 'fumbles_rec', 'fumbles_rec_yds', 'fumbles_rec_td',
+    'fumbles_forced',
+    # Returns and kicking
+    'kick_ret', 'kick_ret_yds', 'kick_ret_td', 'kick_ret_long', 'punt_ret', 'punt_ret_yds', 'punt_ret_td',
+    'punt_ret_long', 'all_purpose_yds', 'xpm', 'xpa', 'fgm', 'fga', 'punt', 'punt_yds', 'punt_long',
+    # Snap counts
+    'offense', 'defense', 'special_teams',
+    # Team totals
+    'g', 'points', 'total_yards', 'plays_offense', 'turnovers', 'first_down', 'penalties', 'penalties_yds',
+    'pen_fd', 'drives', 'plays',
+])
+
+_player_stat_keys = [('player_id', STR), ('player_name', STR), ('team', STR), ('pos', STR), ('game_id', STR)]
+_team_stat_keys = _id_name_cols('team')
+
+# The schema of every table the page classes' extract_rows produce, (columns, extra type)
+# The columns come first in the order given, any other column the page happens to have (e.g., the stat columns,
+# which come straight from the page's data-stat attributes) is appended in sorted order with the extra type,
+# None infers it from the values. -999, NaN and None are all nulls
+table_schemas = {
+    # GameData
+    'scorebox': (_scorebox_cols(), STR),
+    'scoring': ([('quarter', INT)] + _time_cols()
+                + [('scoring_team_name', STR), ('scoring_team_id', STR), ('scoring_team_loc', STR),
+                   ('away_team_score', INT), ('home_team_score', INT), ('play_desc', STR), ('score_type', STR),
+                   ('yards', INT), ('xp_success', INT), ('xp_type', STR)]
+                + _id_name_cols('kicker', 'pass_from', 'rec_by', 'rush_by', 'block_by', 'xp_kicker', 'xp_rush',
+                                'xp_rec_by', 'xp_pass_from')
+                + [('game_id', STR)], STR),
+    'game_info': ([('game_id', STR)], STR),
+    'officials': ([('ref_title', STR), ('ref_pg', STR), ('ref_id', STR), ('ref_name', STR), ('game_id', STR)], STR),
+    'game_summ': ([('home_team_name', STR), ('home_team_id', STR), ('away_team_name', STR), ('away_team_id', STR),
+                   ('game_id', STR)], STR),
+    'starters': ([('player_id', STR), ('player_name', STR), ('pos', STR), ('game_id', STR), ('team_name', STR),
+                  ('team_id', STR)], STR),
+    'drives': ([('game_id', STR), ('team_name', STR), ('team_id', STR), ('drive_num', INT), ('quarter', INT),
+                ('net_yds', INT)] + _time_cols()
+               + [('start_yrd', INT), ('start_side', STR), ('yds_to_td', INT), ('total_plays', INT),
+                  ('drive_sec', INT), ('end_event', STR)], INT),
+    'play_by_play': ([(field, INT if field in GameData.pbp_int_fields else STR) for field in GameData.pbp_fields],
+                     STR),
+    # pbp.py's raw play by play rows, cells are floats where they parse as one
+    'pbp_raw': ([('quarter', STR), ('qtr_time_remain', STR), ('down', INT), ('yds_to_go', INT), ('location', STR),
+                 ('pbp_score_aw', INT), ('pbp_score_hm', INT), ('detail', STR), ('exp_pts_before', FLOAT),
+                 ('exp_pts_after', FLOAT), ('year', INT), ('week', INT), ('away_team', STR), ('home_team', STR)],
+                None),
+    # SeasonData
+    'week_urls': ([('week_name', STR), ('week_url', STR)], STR),
+    'awards': ([('award', STR), ('award_url', STR), ('award_id', STR), ('player_name', STR), ('player_id', STR)],
+               STR),
+    'season_afc': (_team_stat_keys, STR),
+    'season_nfc': (_team_stat_keys, STR),
+    'season_playoff_results': (_id_name_cols('winner', 'loser') + [('game_location', STR), ('boxscore', STR)], STR),
+    'season_afc_playoff_standings': (_team_stat_keys, STR),
+    'season_nfc_playoff_standings': (_team_stat_keys, STR),
+    # WeekData
+    'week_summaries': ([('date', STR), ('winning_team', STR), ('winning_team_id', STR), ('wining_team_score', INT),
+                        ('boxscore', STR), ('losing_team', STR), ('losing_team_id', STR)], None),
+    'potw': ([], STR),
+}
+for _div_id in GameData.table_dict['stats_table']:
+    table_schemas[_div_id[4:]] = (_player_stat_keys, FLOAT)
+for _table in ['team_stats', 'passing', 'rushing', 'returns', 'kicking', 'team_scoring', 'team_conversions',
+               'drives']:
+    table_schemas['season_' + _table] = (_team_stat_keys, FLOAT)
+for _table in ['qb_stats', 'rec_stats', 'rush_stats', 'def_stats']:
+    table_schemas['week_' + _table] = ([('player_name', STR), ('player_id', STR), ('date', STR), ('boxscore', STR),
+                                        ('team_id', STR), ('opp_id', STR), ('winning_team_id', STR),
+                                        ('team_score', INT), ('opp_score', INT)], FLOAT)
+
+
+def _is_null(val):
+    return val is None or val == -999 or val != val
+
+
+def _infer_type(vals):
+    vals = [val for val in vals if not _is_null(val)]
+    if vals and all(isinstance(val, int) and not isinstance(val, bool) for val in vals):
+        return BIG_INT
+    if vals and all(isinstance(val, (int, float)) and not isinstance(val, bool) for val in vals):
+        return FLOAT
+    if vals and all(isinstance(val, dt) for val in vals):
+        return DATETIME
+    return STR
+
+
+def table_columns(table, rows):
+    """
+    The (column, type) pairs table is written with, the declared columns plus any extra ones in rows
+    """
+    if table not in table_schemas:
+        raise KeyError('Table Not in List of Tables')
+    columns, extra_type = table_schemas[table]
+    declared = set(col for col, _ in columns)
+    extras = sorted(set(col for row in rows for col in row) - declared - {'season', 'week'})
+    for col in extras:
+        if extra_type == FLOAT and col in count_stats:
+            # A stats table's counts
+            columns = columns + [(col, INT)]
+        else:
+            columns = columns + [(col, extra_type or _infer_type(row.get(col) for row in rows))]
+    return columns
+
+
+def _arrow_type(col_type):
+    import pyarrow as pa
+    return {
+        INT: pa.int16(),
+        BIG_INT: pa.int32(),
+        FLOAT: pa.float32(),
+        STR: pa.dictionary(pa.int32(), pa.string()),
+        DATETIME: pa.timestamp('s'),
+    }[col_type]
+
+
+def _convert(val, col_type):
+    if _is_null(val):
+        return None
+    if col_type in [INT, BIG_INT]:
+        return int(val)
+    if col_type == FLOAT:
+        return float(val)
+    if col_type == DATETIME:
+        return val if isinstance(val, dt) else dt.fromisoformat(val)
+    return str(val)
+
+
+def _dictionary_array(vals, dictionary):
+    # dictionary maps every string seen so far to its index and only ever grows, so the batches of one file share
+    # a dictionary, each one's a delta on the last (an IPC file can't replace a dictionary)
+    import pyarrow as pa
+    indices = [None if val is None else dictionary.setdefault(val, len(dictionary)) for val in vals]
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(list(dictionary), pa.string()))
+
+
+def _registry_array(vals, registry, kind):
+    # The ids' registry codes are the indices and the registry's ids of that kind the dictionary, which only ever
+    # grows, so every file (and every batch of one) agrees on the codes
+    import pyarrow as pa
+    indices = [None if val is None else registry.code(kind, val) for val in vals]
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(registry.ids[kind], pa.string()))
+
+
+def to_arrow(table, rows, columns=None, dictionaries=None, registry=None):
+    """
+    Builds a pyarrow Table for rows (list of dicts) with table's schema, strings are dictionary encoded
+    columns are table_columns(table, rows) unless given, a row with a column they don't have is a KeyError
+    dictionaries keeps the string columns' dictionaries across calls, for the batches of one file
+    Id columns (registry.column_kind) are encoded with registry's codes (the default_registry when None), every
+    other string column with a dictionary of its own
+    """
+    import pyarrow as pa
+    registry = registry if registry is not None else default_registry()
+    if columns is None:
+        columns = table_columns(table, rows)
+    else:
+        unknown = set(col for row in rows for col in row) - set(col for col, _ in columns) - {'season', 'week'}
+        if unknown:
+            raise KeyError(f'Column Not in Schema: {sorted(unknown)}')
+    dictionaries = dictionaries if dictionaries is not None else {}
+    arrays = []
+    for col, col_type in columns:
+        vals = [_convert(row.get(col), col_type) for row in rows]
+        if col_type == STR and column_kind(col) is not None:
+            arrays.append(_registry_array(vals, registry, column_kind(col)))
+        elif col_type == STR:
+            arrays.append(_dictionary_array(vals, dictionaries.setdefault(col, {})))
+        else:
+            arrays.append(pa.array(vals, _arrow_type(col_type)))
+    schema = pa.schema([(col, _arrow_type(col_type)) for col, col_type in columns])
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_table(table, rows, path, fmt='parquet', row_group_size=64 * 1024, registry=None):
+    """
+    Writes rows (a list or any iterable of dicts, e.g., a generator) to a single parquet or feather file
+    row_group_size rows are converted and written at a time, so only one batch is ever held as arrow arrays
+    The columns come from every row when rows is a list and from the first batch otherwise
+    Parquet files get min/max statistics for every row group so readers can skip the ones a filter rules out
+    Id columns are dictionary encoded with registry's codes (see to_arrow), save the registry after the run to keep
+    them
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if fmt not in FORMATS:
+        raise KeyError('Format Not Found')
+    batches = _batches(rows, row_group_size)
+    first = next(batches, [])
+    columns = table_columns(table, rows if isinstance(rows, list) else first)
+    schema = pa.schema([(col, _arrow_type(col_type)) for col, col_type in columns])
+    dictionaries = {}
+    row_ct = 0
+    # A reader never sees half a partition
+    with atomic_write(path) as file:
+        if fmt == 'parquet':
+            writer = pq.ParquetWriter(file, schema, compression='zstd', write_statistics=True)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression='zstd', emit_dictionary_deltas=True)
+            writer = pa.ipc.new_file(file, schema, options=options)
+        with writer:
+            for batch in itertools.chain([first], batches):
+                arrow_table = to_arrow(table, batch, columns, dictionaries, registry)
+                if fmt == 'parquet':
+                    writer.write_table(arrow_table, row_group_size=row_group_size)
+                else:
+                    writer.write_table(arrow_table, max_chunksize=row_group_size)
+                row_ct += arrow_table.num_rows
+    return row_ct
+
+
+def partition_path(out_dir, table, season, week=None, fmt='parquet'):
+    # Hive style directories, out_dir/<table>/season=<year>[/week=<week>]/part.<fmt>
+    path = os.path.join(out_dir, table, f'season={season}')
+    if week is not None:
+        path = os.path.join(path, f'week={week}')
+    return os.path.join(path, f'part.{fmt}')
+
+
+def write_partitions(table_rows, out_dir, season, week=None, fmt='parquet'):
+    """
+    Writes the output of a page class' extract_rows, one partition per table
+    Returns the number of rows written per table
+    """
+    row_cts = {}
+    for table in sorted(table_rows):
+        if table_rows[table]:
+            row_cts[table] = write_table(table, table_rows[table], partition_path(out_dir, table, season, week, fmt),
+                                         fmt)
+    return row_cts
+
+
+def convert_partitions(in_dir, out_dir, fmt='parquet'):
+    """
+    Converts the json lines partitions pipeline.ingest_seasons writes (<table>/season=<year>.jsonl) into typed
+    season/week/table partitions
+    """
+    row_cts = {}
+    for table in sorted(os.listdir(in_dir)):
+        for name in sorted(os.listdir(os.path.join(in_dir, table))):
+            if not name.endswith('.jsonl'):
+                continue
+            weeks = {}
+            with open(os.path.join(in_dir, table, name)) as file:
+                for line in file:
+                    row = json.loads(line)
+                    weeks.setdefault((row['season'], row['week']), []).append(row)
+            for (season, week), rows in sorted(weeks.items()):
+                row_cts[(table, season, week)] = write_table(table, rows,
+                                                             partition_path(out_dir, table, season, week, fmt), fmt)
+    return row_cts
+
+
+def read_table(out_dir, table, columns=None, filter=None, fmt='parquet'):
+    """
+    Reads a partitioned table back as a pyarrow Table, only the columns asked for are read and the season/week
+    directories and row group statistics that filter (a pyarrow.dataset expression) rules out are skipped
+    e.g., read_table(out_dir, 'player_offense', ['player_id', 'pass_yds'], pds.field('season') == 2017)
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as pds
+    fmt = 'ipc' if fmt == 'feather' else fmt
+    dataset = pds.dataset(os.path.join(out_dir, table), format=fmt, partitioning='hive')
+    # Partitions can have different extra columns, so read against all of them rather than the first file's
+    schema = pa.unify_schemas([frag.physical_schema for frag in dataset.get_fragments()] + [dataset.schema])
+    dataset = pds.dataset(os.path.join(out_dir, table), format=fmt, partitioning='hive', schema=schema)
+    return dataset.to_table(columns=columns, filter=filter)
@@ -1,13 +1,36 @@
-from urllib import request
-from bs4 import BeautifulSoup, Comment, Tag
+from bs4 import Tag
 from datetime import datetime as dt
+import functools
 import numpy as np
 import re
+import sys
+from src.data import instrument
+from src.data.crawler import fetch_page
+from src.data.page_parser import comment_table, page_fragments, parse_page, soup_parser
+from src.data.play_batch import PlayBatch
+from src.data.registry import default_registry, href_id
+from src.data.stat_batch import StatBatch
+
+
+def memoize_table(func):
+    # Keeps each extracted table on the instance so asking for it again doesn't re-extract it
+    timed = instrument.timed_table(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        key = (func.__name__,) + args
+        if key not in self._results:
+            self._results[key] = timed(self, *args)
+        return self._results[key]
+    return wrapper
 
 
 class GameData:
     # Extracts all data for a given game
 
+    # Bump whenever an accessor's output changes so incremental ingestion re-extracts every game
+    parser_version = 1
+
     table_dict = {
         'scorebox':'basic game info and results (dict)',
         'scoring':'every point scoring play in the game (list of dicts)',
@@ -33,24 +56,192 @@ class GameData:
         'drives':{
             'home': 'home team drives (list of dicts)',
             'away': 'away team drives (list of dicts)',
-        }
+        },
+        'play_by_play': 'every play in the game (list of dicts)',
     }
 
-    def __init__(self, gm_url, extract):
+    # Every play gets these detail fields, -999 when they don't apply to the play
+    play_detail_fields = [
+        'play_type', 'play_subtype', 'timeout_num', 'timeout_by', 'kicker_id', 'kicker_name', 'play_yds',
+        'kick_ret_id', 'kick_ret_name', 'kick_ret_yds', 'play_res', 'tackled_by_id', 'tackled_by_name',
+        'sacked_by_name', 'sacked_by_id', 'passer_id', 'passer_name', 'rec_id', 'rec_name', 'rush_id',
+        'rush_name', 'kneel_id', 'kneel_name', 'fmbl_id', 'fmbl_name', 'fmbl_forc_by_id',
+        'fmbl_forc_by_name', 'recover_id', 'recover_name', 'tackle_asst_id', 'tackle_asst_name',
+        'int_name', 'int_id', 'pen_on_id', 'pen_on_name', 'pen_cause', 'pen_res']
+
+    # Column order for play by play output, the last few only show up on plays with an assisted sack or two penalties
+    pbp_fields = (['quarter', 'sec_left_in_quarter', 'sec_into_quarter', 'sec_left_in_game', 'sec_into_game', 'down',
+                   'yds_to_go', 'loc_yrd', 'loc_side', 'play_str', 'play_count']
+                  + play_detail_fields
+                  + ['sack_asst_id', 'sack_asst_name', 'pen_on_id_2', 'pen_on_name_2', 'pen_cause_2', 'pen_res_2',
+                     'pbp_score_aw', 'pbp_score_hm', 'game_id'])
+
+    # The play by play fields that hold numbers, everything else is a string
+    pbp_int_fields = ['quarter', 'sec_left_in_quarter', 'sec_into_quarter', 'sec_left_in_game', 'sec_into_game', 'down',
+                      'yds_to_go', 'loc_yrd', 'play_count', 'timeout_num', 'play_yds', 'kick_ret_yds', 'pbp_score_aw',
+                      'pbp_score_hm']
+
+    # Every keyword the play description handlers branch on, a single findall over a play fragment tags all of them.
+    # None of the keywords overlap, so the first occurrence of each one is always found
+    play_keywords = re.compile('timeout|tackle by|sacked by|pass|right|middle|left|kneels|fumble|forced|recover|'
+                               'intercept|penalty|touchdown|two point attempt')
+
+    # The divs on the page each table is extracted from, the stats_table keys are their own div ids
+    table_divs = {
+        'scorebox': [],
+        'scoring': ['all_scoring'],
+        'game_info': ['all_game_info'],
+        'officials': ['all_officials'],
+        'game_summ': ['all_team_stats'],
+        'stats_table': list(table_dict['stats_table']),
+        'starters': ['all_home_starters', 'all_vis_starters'],
+        'drives': ['all_home_drives', 'all_vis_drives'],
+        'play_by_play': ['all_pbp'],
+    }
+
+    def __init__(self, gm_url, extract=None, parser=None, page=None, registry=None):
+        """
+        extract is a list of table_dict keys (or stats_table div ids), only the divs those tables need plus the
+        scorebox are parsed. None parses the whole page
+        page is the already fetched raw page, so gm_url isn't fetched again
+        registry is the IdRegistry the player, team, coach, referee and stadium ids are interned into, defaults to
+        the default_registry
+        Use it as a context manager (or call close) to release the page once the tables are extracted
+        """
         self.gm_url = gm_url
-        self.extract = extract
+        self.page = page
+        self.extract_tables = extract
+        self.parser = soup_parser(parser)
+        self.registry = registry if registry is not None else default_registry()
+        self._soup = None
         self.soupify()
+        self._div_index = None
+        self._table_index = {}
+        self._results = {}
         self.scrbox_dict = self.scorebox
 
     def soupify(self):
-        if self.gm_url[:5] == 'https':
-            pg = request.urlopen(self.gm_url)
-            self.soup = BeautifulSoup(pg, 'html.parser')
+        if self.page is not None:
+            pg = self.page
+        elif self.gm_url[:4] == 'http':
+            pg = fetch_page(self.gm_url)
         else:
-            self.soup = BeautifulSoup(open(self.gm_url), 'html.parser')
+            with open(self.gm_url) as file:
+                pg = file.read()
+        if self.extract_tables is not None:
+            pg = page_fragments(pg, self.extract_divs(self.extract_tables), div_classes=['scorebox'])
+        self.soup = parse_page(pg, self.parser)
 
+    @property
+    def soup(self):
+        if self._soup is None:
+            raise AttributeError('GameData is closed, extract tables before closing it')
+        return self._soup
+
+    @soup.setter
+    def soup(self, soup):
+        self._soup = soup
+
+    def close(self):
+        """
+        Decomposes the page and every comment table parsed from it, tables already extracted can still be read
+        bs4 trees are full of reference cycles, so without this they linger until the garbage collector runs
+        """
+        for table in self._table_index.values():
+            table.decompose()
+        self._table_index = {}
+        self._div_index = None
+        if self._soup is not None:
+            self._soup.decompose()
+            self._soup = None
+        self.page = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def extract_divs(self, tables):
+        div_ids = []
+        for table in tables:
+            if table in self.table_divs:
+                div_ids += self.table_divs[table]
+            elif table in self.table_dict['stats_table']:
+                div_ids.append(table)
+            else:
+                raise KeyError('Table Not in List of Tables')
+        return div_ids
+
+    def extract(self, tables=None):
+        """
+        Extracts every table in tables (table_dict keys or stats_table div ids) in one pass and returns them in a
+        dict shaped like table_dict. Defaults to the tables the object was created with, or all of them
+        Tables whose divs aren't on the page, e.g., snap counts before 2012, are left out, asking for one the object
+        wasn't created to extract is a KeyError
+        """
+        if tables is None:
+            tables = self.extract_tables if self.extract_tables is not None else list(self.table_dict)
+        if self.extract_tables is not None:
+            extracted = set(self.extract_divs(self.extract_tables))
+            missing = [table for table in tables if not set(self.extract_divs([table])) <= extracted]
+            if missing:
+                raise KeyError(f'Table Not Extracted: {missing} not in extract={self.extract_tables}')
+        results = {}
+        for table in tables:
+            for out_table, key, div_ids, accessor in self._table_sources(table):
+                if not all(self._has_div(div_id) for div_id in div_ids):
+                    continue
+                if key is None:
+                    results[out_table] = accessor()
+                else:
+                    results.setdefault(out_table, {})[key] = accessor()
+        return results
+
+    def _table_sources(self, table):
+        # Where each part of table ends up in extract's dict (output table and key, None for the whole table), the
+        # divs it needs on the page and the accessor that extracts it
+        stats_tables = self.table_dict['stats_table']
+        if table == 'stats_table' or table in stats_tables:
+            return [('stats_table', div_id, [div_id], functools.partial(self.stats_table, div_id))
+                    for div_id in (stats_tables if table == 'stats_table' else [table])]
+        if table in ['starters', 'drives']:
+            return [(table, loc, ['all_' + loc_html + '_' + table], functools.partial(getattr(self, table), loc))
+                    for loc, loc_html in [('home', 'home'), ('away', 'vis')]]
+        if table == 'play_by_play':
+            return [(table, None, ['all_pbp'], self.play_by_play)]
+        if table in self.table_divs:
+            return [(table, None, self.table_divs[table], lambda: getattr(self, table))]
+        raise KeyError('Table Not in List of Tables')
+
+    def extract_all(self):
+        return self.extract(list(self.table_dict))
+
+    def extract_rows(self, tables=None):
+        """
+        Same as extract but flattened to a list of row dicts per output table
+        The stats tables are named after their div without the all_ prefix, the home and away starters and drives are
+        combined (each row has its team_id) and the single dict tables become one row
+        Strings, keys included, are plain str rather than the bs4 strings the accessors return, which drag their whole
+        soup along and can't be sent back from a worker process once the soup is gone
+        """
+        rows = {}
+        for table, vals in self.extract(tables).items():
+            if table == 'stats_table':
+                for div_id, stat_list in vals.items():
+                    rows[div_id[4:]] = stat_list
+            elif table in ['starters', 'drives']:
+                rows[table] = vals.get('home', []) + vals.get('away', [])
+            elif isinstance(vals, dict):
+                rows[table] = [vals]
+            else:
+                rows[table] = vals
+        for table in rows:
+            rows[table] = [{str(k): str(v) if isinstance(v, str) else v for k, v in row.items()} for row in rows[table]]
+        return rows
 
     @property
+    @memoize_table
     def scorebox(self):
         # Extract the information from the scorebox div, i.e., basic game info and results
         scrbox_dict = {}
@@ -63,12 +254,12 @@ class GameData:
             score = scrbox[idx].find('div', {'class': 'score'})
             record = score.findNextSibling().string.split('-')
             scrbox_dict[team + '_team_pg'] = team_name['href']
-            scrbox_dict[team + '_team_id'] = team_name['href'].split('/')[-2]
-            scrbox_dict[team + '_team_name'] = team_name.string
+            scrbox_dict[team + '_team_id'], scrbox_dict[team + '_team_name'] = self.registry.intern(
+                'team', team_name['href'].split('/')[-2], team_name.string)
             scrbox_dict[team + '_team_score'] = int(score.string)
             scrbox_dict[team + '_team_coach_pg'] = coach_name['href']
-            scrbox_dict[team + '_team_coach_id'] = coach_name['href'].split('/')[-1].split('.')[0]
-            scrbox_dict[team + '_team_coach_name'] = coach_name.string
+            scrbox_dict[team + '_team_coach_id'], scrbox_dict[team + '_team_coach_name'] = self.registry.link(
+                'coach', coach_name)
             scrbox_dict[team + '_team_wins'] = int(record[0])
             scrbox_dict[team + '_team_losses'] = int(record[1])
             if len(record) == 3:
@@ -91,15 +282,15 @@ class GameData:
         for meta in scrbox_meta:
             if meta.contents[0].string == 'Stadium':
                 scrbox_dict['stadium_pg'] = meta.a['href']
-                scrbox_dict['stadium_name'] = meta.a.string
-                scrbox_dict['stadium_id'] = meta.a['href'].split('/')[-1].split('.')[0]
+                scrbox_dict['stadium_id'], scrbox_dict['stadium_name'] = self.registry.link('stadium', meta.a)
         scrbox_dict['game_id'] = scrbox_dict['datetime'].strftime('%Y%m%d') + '0' + scrbox_dict['home_team_id']
         return scrbox_dict
 
     @property
+    @memoize_table
     def scoring(self):
         scoring_list = []
-        scoring_div = self.soup.find('div', {'id': 'all_scoring'})
+        scoring_div = self._div('all_scoring')
         rows = scoring_div.find_all('tr')
         quarter = 1
         for row in rows[1:]:
@@ -171,11 +362,10 @@ class GameData:
         return scoring_list
 
     @property
+    @memoize_table
     def game_info(self):
         ginfo_dict = {}
-        ginfo_div = self.soup.find('div', {'id': 'all_game_info'})
-        comments = ginfo_div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = self._comment_table('all_game_info')
         rows = table.find_all('tr')
         for row in rows[1:]:
             row_lbl = row.contents[0].contents[0]
@@ -186,28 +376,26 @@ class GameData:
         return ginfo_dict
 
     @property
+    @memoize_table
     def officials(self):
         off_list = []
-        off_div = self.soup.find('div', {'id': 'all_officials'})
-        comments = off_div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = self._comment_table('all_officials')
         rows = table.find_all('tr')
         for row in rows[1:]:
             off_dict = {}
             off_dict['ref_title'] = row.contents[0].string
             off_dict['ref_pg'] = row.contents[1].a['href']
-            off_dict['ref_id'] = off_dict['ref_pg'].split('/')[-1].split('.')[0]
-            off_dict['ref_name'] = row.contents[1].string
+            off_dict['ref_id'], off_dict['ref_name'] = self.registry.intern(
+                'referee', href_id(off_dict['ref_pg']), row.contents[1].string)
             off_dict['game_id'] = self.scrbox_dict['game_id']
             off_list.append(off_dict)
         return off_list
 
     @property
+    @memoize_table
     def game_summ(self):
         summ_dict = {}
-        summ_div = self.soup.find('div', {'id': 'all_team_stats'})
-        comments = summ_div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = self._comment_table('all_team_stats')
         rows = table.find_all('tr')[1:]
         for row in rows:
             cont = row.contents
@@ -221,6 +409,7 @@ class GameData:
         summ_dict['game_id'] = self.scrbox_dict['game_id']
         return summ_dict
 
+    @memoize_table
     def stats_table(self, div_id):
         """
         works for the following tables and associated divs:
@@ -228,11 +417,23 @@ class GameData:
         Defense - all_player_defense
         Kick/Punt Returns - all_returns
         kicking and Punting - all_kicking
+        Missing cells are 0, stats_table_batch keeps them apart from real zeros
         """
-        stat_list = []
-        stat_div = self.soup.find('div', {'id': div_id})
-        comments = stat_div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        return [{lbl: 0 if val is None else val for lbl, val in row.items()} for row in self.iter_stats_table(div_id)]
+
+    def stats_table_batch(self, div_id, batch=None):
+        """
+        Appends the table's rows to a columnar StatBatch, pass the same batch for every game to build up a season
+        batch.to_frame() gives stat columns typed by the table's export schema and categorical team, pos and player_id,
+        the team and player_id codes are the registry's
+        """
+        if batch is None:
+            batch = StatBatch(registry=self.registry, table=div_id[4:])
+        return batch.extend(self.iter_stats_table(div_id))
+
+    def iter_stats_table(self, div_id):
+        # Yields each row of the stats table, missing cells are None
+        table = self._comment_table(div_id)
         rows = table.find_all('tr')[2:]
         for row in rows:
             cells = row.contents
@@ -242,35 +443,33 @@ class GameData:
                     lbl = cell['data-stat']
                     cell_str = cell.string
                     if cell_str is None:
-                        stat_dict[cell['data-stat']] = 0
+                        stat_dict[cell['data-stat']] = None
                     elif lbl == 'player':
-                        stat_dict['player_id'] = cell['data-append-csv']
-                        stat_dict['player_name'] = cell_str
+                        stat_dict['player_id'], stat_dict['player_name'] = self.registry.intern(
+                            'player', cell['data-append-csv'], cell_str)
                     elif lbl == 'team':
-                        stat_dict[cell['data-stat']] = cell_str.lower()
+                        stat_dict[cell['data-stat']] = self.registry.intern('team', cell_str.lower())[0]
                     elif lbl == 'pos':
-                        stat_dict[cell['data-stat']] = cell_str.lower()
+                        stat_dict[cell['data-stat']] = self._lower(cell_str)
                     else:
                         stat_dict[cell['data-stat']] = float(cell_str.replace('%', ''))
                 stat_dict['game_id'] = self.scrbox_dict['game_id']
-                stat_list.append(stat_dict)
-        return stat_list
+                yield stat_dict
 
+    @memoize_table
     def starters(self, loc):
         """
         loc is either home or away
         """
         loc_html = 'vis' if loc == 'away' else 'home'
         start_list = []
-        start_div = self.soup.find('div', {'id': 'all_' + loc_html + '_starters'})
-        comments = start_div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = self._comment_table('all_' + loc_html + '_starters')
         rows = table.find_all('tr')[1:]
         for row in rows:
             cells = row.contents
             start_dict = {}
-            start_dict['player_id'] = cells[0]['data-append-csv']
-            start_dict['player_name'] = cells[0].string
+            start_dict['player_id'], start_dict['player_name'] = self.registry.intern(
+                'player', cells[0]['data-append-csv'], cells[0].string)
             start_dict['pos'] = cells[1].string.lower()
             start_dict['game_id'] = self.scrbox_dict['game_id']
             start_dict['team_name'] = self.scrbox_dict[loc + '_team_name']
@@ -278,15 +477,14 @@ class GameData:
             start_list.append(start_dict)
         return start_list
 
+    @memoize_table
     def drives(self, loc):
         """
         loc is either home or away
         """
         loc_html = 'vis' if loc == 'away' else 'home'
         drive_list = []
-        drive_div = self.soup.find('div', {'id': 'all_' + loc_html + '_drives'})
-        comments = drive_div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = self._comment_table('all_' + loc_html + '_drives')
         rows = table.find_all('tr')[1:]
         for row in rows:
             cells = row.contents
@@ -334,16 +532,27 @@ class GameData:
             drive_list.append(drive_dict)
         return drive_list
 
+    @memoize_table
     def play_by_play(self):
-        pbp_list = []
+        return list(self.iter_play_by_play())
+
+    def play_by_play_batch(self, batch=None):
+        """
+        Appends every play to a columnar PlayBatch, pass the same batch for every game to build up a season
+        """
+        if batch is None:
+            batch = PlayBatch(self.pbp_fields, self.pbp_int_fields)
+        return batch.extend(self.iter_play_by_play())
+
+    def iter_play_by_play(self):
+        # Yields each play as soon as it is decoded, nothing is kept once the caller moves on
         rows = self.table_comments_extract(div_id='all_pbp')[2:]
-        for row_idx, row in enumerate(rows):
+        for row in rows:
             cells = row.contents
             if cells[0].name is not None and len(cells) == 10 and cells[5].string is None:
                 pbp_dict = self._cells_extract(cells)
                 pbp_dict['game_id'] = self.scrbox_dict['game_id']
-                pbp_list.append(pbp_dict)
-        return pbp_list
+                yield pbp_dict
 
     def _cells_extract(self, cells):
         pbp_dict = {}
@@ -360,7 +569,11 @@ class GameData:
             elif cell_data == 'location':
                 pbp_dict = self._play_loc(cell_str, pbp_dict)
             elif cell_data == 'detail':
-                pbp_dict = self._play_detail(cell, pbp_dict)
+                if instrument.active is None:
+                    pbp_dict = self._play_detail(cell, pbp_dict)
+                else:
+                    with instrument.timer('play_detail'):
+                        pbp_dict = self._play_detail(cell, pbp_dict)
         return pbp_dict
 
     def _play_detail(self, cell, pbp_dict):
@@ -371,12 +584,7 @@ class GameData:
         pbp_dict = self._play_detail_extract(cont, play_str, pbp_dict)
         if play_str.find('no play') > -1:
             pbp_dict['play_res'] = 'no_play'
-        for field in ['play_type', 'play_subtype', 'timeout_num', 'timeout_by', 'kicker_id', 'kicker_name', 'play_yds',
-                      'kick_ret_id', 'kick_ret_name', 'kick_ret_yds', 'play_res', 'tackled_by_id', 'tackled_by_name',
-                      'sacked_by_name', 'sacked_by_id', 'passer_id', 'passer_name', 'rec_id', 'rec_name', 'rush_id',
-                      'rush_name', 'kneel_id', 'kneel_name', 'fmbl_id', 'fmbl_name', 'fmbl_forc_by_id',
-                      'fmbl_forc_by_name', 'recover_id', 'recover_name', 'tackle_asst_id', 'tackle_asst_name',
-                      'int_name', 'int_id', 'pen_on_id', 'pen_on_name', 'pen_cause', 'pen_res']:
+        for field in self.play_detail_fields:
             if field not in pbp_dict:
                 pbp_dict[field] = -999
         return pbp_dict
@@ -387,36 +595,45 @@ class GameData:
             if str_srch is not None:
                 str_srch = str_srch.lower()
                 str_splt = str_srch.split()
+                found = set(self.play_keywords.findall(str_srch))
                 if str_splt[0] in ['kicks', 'punts'] or str_splt[0].isnumeric():
                     pbp_dict = self._play_details_kick(cont, str_splt, idx, str_srch, play_str, pbp_dict)
-                if str_srch.find('timeout') > -1:
+                if not found:
+                    continue
+                if 'timeout' in found:
                     pbp_dict = self._play_details_to(cont, pbp_dict)
-                pbp_dict = self._play_details_endpoints(cont, str_srch, idx, pbp_dict)
-                if 5 > str_srch.find('pass') > -1:
+                if 'tackle by' in found or 'sacked by' in found:
+                    pbp_dict = self._play_details_endpoints(cont, str_srch, idx, pbp_dict)
+                if 'pass' in found and str_srch.find('pass') < 5:
                     pbp_dict = self._play_details_pass(cont, str_srch, idx, play_str, pbp_dict)
-                elif max(str_srch.find(x) for x in ['right', 'middle', 'left']) > -1 and cont[idx].name is None:
+                elif not found.isdisjoint(['right', 'middle', 'left']) and cont[idx].name is None:
                     pbp_dict = self._play_details_rush(cont, str_srch, idx, pbp_dict)
-                elif str_srch.find('kneels') > -1:
+                elif 'kneels' in found:
                     pbp_dict = self._play_details_kneel(cont, str_srch, idx, pbp_dict)
-                if str_srch.find('fumble') > -1:
-                    pbp_dict = self._id_name_add(cont[idx - 1], pbp_dict, 'fmbl')
-                    if str_srch.find('forced') > -1:
-                        pbp_dict = self._id_name_add(cont[idx + 1], pbp_dict, 'fmbl_forc_by')
-                if str_srch.find('recover') > -1:
-                    pbp_dict = self._id_name_add(cont[idx + 1], pbp_dict, 'recover')
-                if str_srch.find('intercept') > -1:
-                    pbp_dict = self._id_name_add(cont[idx + 1], pbp_dict, 'int')
-                    pbp_dict['play_yds'] = int(cont[idx + 4].string.split('for')[-1].split('yard')[0].strip())
-                    pbp_dict['play_res'] = 'interception'
-                if str_srch.find('penalty') > -1:
+                if not found.isdisjoint(['fumble', 'recover', 'intercept']):
+                    pbp_dict = self._play_details_turnover(cont, idx, found, pbp_dict)
+                if 'penalty' in found:
                     pbp_dict = self._play_details_penalty(cont, idx, pbp_dict)
-                if str_srch.find('touchdown') > -1:
+                if 'touchdown' in found:
                     pbp_dict['play_res'] = 'touchdown'
-                if str_srch.find('two point attempt') > 1:
+                if 'two point attempt' in found and str_srch.find('two point attempt') > 1:
                     pbp_dict = self._play_details_tpc(cont, pbp_dict)
                     break
         return pbp_dict
 
+    def _play_details_turnover(self, cont, idx, found, pbp_dict):
+        if 'fumble' in found:
+            pbp_dict = self._id_name_add(cont[idx - 1], pbp_dict, 'fmbl')
+            if 'forced' in found:
+                pbp_dict = self._id_name_add(cont[idx + 1], pbp_dict, 'fmbl_forc_by')
+        if 'recover' in found:
+            pbp_dict = self._id_name_add(cont[idx + 1], pbp_dict, 'recover')
+        if 'intercept' in found:
+            pbp_dict = self._id_name_add(cont[idx + 1], pbp_dict, 'int')
+            pbp_dict['play_yds'] = int(cont[idx + 4].string.split('for')[-1].split('yard')[0].strip())
+            pbp_dict['play_res'] = 'interception'
+        return pbp_dict
+
     def _play_details_kneel(self, cont, str_srch, idx, pbp_dict):
         pbp_dict['play_type'] = 'kneel'
         pbp_dict = self._id_name_add(cont[idx - 1], pbp_dict, 'kneel')
@@ -555,10 +772,13 @@ class GameData:
             raise KeyError('Team Not Found')
         return tm_name, tm_id, tm_loc
 
+    @staticmethod
+    def _lower(cell_str):
+        # A handful of positions repeat on every row, interned so the rows share one string
+        return sys.intern(cell_str.lower())
+
     def _name_extract(self, cell):
-        cell_id = cell['href'].split('/')[-1].split('.')[0]
-        cell_name = cell.string
-        return cell_id, cell_name
+        return self.registry.link('player', cell)
 
     def _time_left_calc(self, cell_str, fld_dict):
         if cell_str is not None:
@@ -570,10 +790,10 @@ class GameData:
             fld_dict['sec_into_game'] = 4 * 15 * 60 - (
                         int(str_split[0]) * 60 + int(str_split[1]) + (4 - fld_dict['quarter']) * 15 * 60)
         else:
-            fld_dict['sec_left_in_quarter'] = np.NAN
-            fld_dict['sec_into_quarter'] = np.NAN
-            fld_dict['sec_left_in_game'] = np.NAN
-            fld_dict['sec_into_game'] = np.NAN
+            fld_dict['sec_left_in_quarter'] = np.nan
+            fld_dict['sec_into_quarter'] = np.nan
+            fld_dict['sec_left_in_game'] = np.nan
+            fld_dict['sec_into_game'] = np.nan
         return fld_dict
 
     def _id_name_add(self, cell, pbp_dict, id_name_str):
@@ -586,12 +806,33 @@ class GameData:
         return int(cell_cont.string.split('for')[-1].split('yard')[0].strip())
 
     def table_comments_extract(self, div_id):
-        div = self.soup.find('div', {'id': div_id})
-        comments = div.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = self._comment_table(div_id)
         rows = table.find_all('tr')
         return rows
 
+    def _comment_table(self, div_id):
+        # Most tables are hidden inside html comments, parse each one the first time it is asked for and reuse it
+        if div_id not in self._table_index:
+            self._table_index[div_id] = comment_table(self._div(div_id), self.parser)
+        return self._table_index[div_id]
+
+    def _divs(self):
+        if self._div_index is None:
+            self._div_index = {div['id']: div for div in self.soup.find_all('div', id=True)}
+        return self._div_index
+
+    def _div(self, div_id):
+        # The div a table lives in, or a KeyError naming the table when it wasn't extracted or isn't on the page
+        divs = self._divs()
+        if div_id not in divs:
+            if self.extract_tables is not None and div_id not in self.extract_divs(self.extract_tables):
+                raise KeyError(f'Table Not Extracted: {div_id} is not in extract={self.extract_tables}')
+            raise KeyError(f'Table Not Found: {div_id} is not on the page')
+        return divs[div_id]
+
+    def _has_div(self, div_id):
+        return div_id in self._divs()
+
     def _play_loc(self, cell_str, pbp_dict):
         if cell_str is None:
             pbp_dict['loc_yrd'] = -999
@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+from src.data.atomic import atomic_write
+
+
+class Instruments:
+    """
+    Timers and counters for one run, keyed by a name and a few labels (stage, table, parser, ...)
+    Safe to update from the crawler's worker threads
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def add_time(self, stage, secs, **labels):
+        key = self._key(stage, labels)
+        with self.lock:
+            calls, total, longest = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = (calls + 1, total + secs, max(longest, secs))
+
+    def count(self, name, amt=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amt
+
+    def merge(self, timers, counters):
+        # Folds in the timers and counters of another Instruments, e.g., one from a worker process
+        with self.lock:
+            for key, (calls, total, longest) in timers.items():
+                old_calls, old_total, old_longest = self.timers.get(key, (0, 0.0, 0.0))
+                self.timers[key] = (old_calls + calls, old_total + total, max(old_longest, longest))
+            for key, val in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + val
+
+    def counter_total(self, name):
+        return sum(val for (cnt_name, _), val in self.counters.items() if cnt_name == name)
+
+    def report(self):
+        hits = self.counter_total('cache_hits')
+        lookups = hits + self.counter_total('cache_misses') + self.counter_total('cache_revalidated')
+        return {
+            'started': self.started,
+            'duration_sec': time.time() - self.started,
+            'timers': [dict(stage=stage, labels=dict(labels), calls=calls, total_sec=total, max_sec=longest)
+                       for (stage, labels), (calls, total, longest) in sorted(self.timers.items())],
+            'counters': [dict(name=name, labels=dict(labels), value=val)
+                         for (name, labels), val in sorted(self.counters.items())],
+            'cache_hit_rate': hits / lookups if lookups else None,
+        }
+
+    def write_json(self, path):
+        _write(path, json.dumps(self.report(), indent=1))
+
+    def write_prometheus(self, path):
+        """
+        Writes the run in the Prometheus text format, for node_exporter's textfile collector
+        """
+        lines = []
+        for metric, idx in [('ff_stage_seconds_total', 1), ('ff_stage_calls_total', 0)]:
+            # Every sample of a metric has to be in one block
+            lines.append(f'# TYPE {metric} counter')
+            for (stage, labels), timer_vals in sorted(self.timers.items()):
+                lines.append(f"{metric}{_prom_labels((('stage', stage),) + labels)} {timer_vals[idx]}")
+        for name in sorted(set(name for name, _ in self.counters)):
+            lines.append(f'# TYPE ff_{name}_total counter')
+            for (cnt_name, labels), val in sorted(self.counters.items()):
+                if cnt_name == name:
+                    lines.append(f'ff_{name}_total{_prom_labels(labels)} {val}')
+        hit_rate = self.report()['cache_hit_rate']
+        if hit_rate is not None:
+            lines += ['# TYPE ff_cache_hit_ratio gauge', f'ff_cache_hit_ratio {hit_rate}']
+        _write(path, '\n'.join(lines) + '\n')
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_prom_escape(v)}"' for k, v in labels) + '}'
+
+
+def _prom_escape(val):
+    return str(val).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write(path, text):
+    # A scraper polling the report never reads half of one
+    with atomic_write(path, 'w') as file:
+        file.write(text)
+
+
+# None unless a run opted in, every hook checks this first so uninstrumented runs pay next to nothing
+active = None
+
+
+def enable():
+    global active
+    active = Instruments()
+    return active
+
+
+def disable():
+    global active
+    instruments, active = active, None
+    return instruments
+
+
+@contextmanager
+def timer(stage, **labels):
+    # Stages nest, e.g., extract includes the comment_parse it triggers, so stage totals overlap
+    if active is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if active is not None:
+            active.add_time(stage, time.perf_counter() - start, **labels)
+
+
+def count(name, amt=1, **labels):
+    if active is not None:
+        active.count(name, amt, **labels)
+
+
+def timed_table(func):
+    # Times an accessor under the extract stage, labelled with the table, and counts the rows it returns
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        if active is None:
+            return func(self, *args)
+        table = '_'.join([func.__name__] + [str(arg) for arg in args])
+        with timer('extract', cls=type(self).__name__, table=table):
+            result = func(self, *args)
+        count('rows', len(result) if isinstance(result, list) else 1, cls=type(self).__name__, table=table)
+        return result
+    return wrapper
+
+
+def write_reports(path):
+    """
+    Writes the active run to path.json and path.prom
+    """
+    if active is not None:
+        active.write_json(path + '.json')
+        active.write_prometheus(path + '.prom')
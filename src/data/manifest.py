@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import time
+from src.data.atomic import atomic_write
+
+# How long an incremental run trusts a cached page before asking the server whether it changed, so a stat correction
+# to a finished game is picked up within a day
+INCREMENTAL_TTL = 24 * 60 * 60
+
+
+def game_id_from_url(url):
+    # Boxscore urls end in the game_id scorebox builds, e.g., /boxscores/201709070nwe.htm
+    return url.rstrip('/').split('/')[-1].split('.')[0]
+
+
+def source_hash(pg):
+    return hashlib.sha256(pg).hexdigest()
+
+
+class IngestManifest:
+    """
+    Records which games have been ingested, keyed by game_id
+    Each entry holds the hash of the page it came from, the tables extracted and the parser version used,
+    so a re-run only has to touch games that are new, whose page changed, whose parser changed or that are
+    missing a table. The page's etag/last modified are kept too, so a re-run can ask the server whether the page
+    changed (Crawler.fetch_if_changed) rather than download it to hash it
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            with open(path) as file:
+                self.games = json.load(file)
+        else:
+            self.games = {}
+
+    def missing_tables(self, game_id, pg_hash, tables, parser_version):
+        """
+        Returns the tables that still need extracting, all of them if the game is new or its page or parser changed
+        """
+        entry = self.games.get(game_id)
+        if entry is None or entry['source_hash'] != pg_hash or entry['parser_version'] != parser_version:
+            return list(tables)
+        return [table for table in tables if table not in entry['tables']]
+
+    def is_current(self, game_id, pg_hash, tables, parser_version):
+        return not self.missing_tables(game_id, pg_hash, tables, parser_version)
+
+    def validators(self, game_id, tables, parser_version):
+        """
+        The etag/last modified of the page game_id was ingested from, None when the game needs extracting whatever
+        the page says, i.e., it's new, its parser changed or a table is missing
+        """
+        entry = self.games.get(game_id)
+        if entry is None or not self.is_current(game_id, entry['source_hash'], tables, parser_version):
+            return None
+        return {'etag': entry.get('etag'), 'last_modified': entry.get('last_modified')}
+
+    def record(self, game_id, url, pg_hash, tables, parser_version, validators=None):
+        entry = self.games.get(game_id)
+        if entry is not None and entry['source_hash'] == pg_hash and entry['parser_version'] == parser_version:
+            tables = sorted(set(entry['tables']) | set(tables))
+        validators = validators or {}
+        self.games[game_id] = {
+            'url': url,
+            'source_hash': pg_hash,
+            'tables': sorted(tables),
+            'parser_version': parser_version,
+            'etag': validators.get('etag'),
+            'last_modified': validators.get('last_modified'),
+            'ingested': time.time(),
+        }
+
+    def save(self):
+        # A crash mid save leaves the last manifest rather than a broken one
+        with atomic_write(self.path, 'w') as file:
+            json.dump(self.games, file, indent=1, sort_keys=True)
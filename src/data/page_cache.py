@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from src.data.atomic import atomic_write
+
+
+class PageCache:
+    """
+    On disk cache of raw page bytes keyed by url, shared by every scraper
+    Page bodies are stored gzipped under their content hash in blobs/, so identical pages are stored once,
+    and each url gets a small json entry in urls/ pointing at its blob along with the validators the server sent
+    ttl is how many seconds an entry is fresh for, None keeps it forever (finished games never change)
+    """
+
+    def __init__(self, root, ttl=None):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'urls'), exist_ok=True)
+
+    @staticmethod
+    def _hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _entry_path(self, url):
+        return os.path.join(self.root, 'urls', self._hash(url.encode('utf-8')) + '.json')
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.root, 'blobs', content_hash[:2], content_hash + '.gz')
+
+    def entry(self, url):
+        # The json entry for url, or None if it has never been cached
+        try:
+            with open(self._entry_path(url)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def is_fresh(self, entry, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        return ttl is None or time.time() - entry['checked'] < ttl
+
+    def get(self, url):
+        entry = self.entry(url)
+        if entry is None:
+            return None
+        try:
+            with gzip.open(self._blob_path(entry['content_hash'])) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url, body, headers=None):
+        headers = headers or {}
+        content_hash = self._hash(body)
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            self._write(blob_path, gzip.compress(body))
+        now = time.time()
+        entry = {
+            'url': url,
+            'content_hash': content_hash,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': now,
+            'checked': now,
+        }
+        self._write(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    def touch(self, url):
+        # The server said the page hasn't changed (304), so it is fresh again
+        entry = self.entry(url)
+        entry['checked'] = time.time()
+        self._write(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    @staticmethod
+    def revalidation_headers(entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def with_ttl(self, ttl):
+        # The same cache directory with entries only fresh for ttl seconds, e.g., for a run that wants changes
+        return PageCache(self.root, ttl)
+
+    @staticmethod
+    def _write(path, data):
+        # Concurrent workers read and write the same entries, none of them may see a half written file
+        with atomic_write(path) as file:
+            file.write(data)
+
+
+# Where the scrapers cache pages unless FF_PAGE_CACHE names another directory, data/raw/page_cache in the project
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 'data', 'raw', 'page_cache')
+
+_default_cache = None
+_default_set = False
+
+
+def default_cache():
+    """
+    The cache every scraper uses unless told otherwise, set with set_default_cache, else a PageCache in the
+    FF_PAGE_CACHE directory, else in DEFAULT_CACHE_DIR. FF_PAGE_CACHE=off (or set_default_cache(None)) turns
+    caching off
+    """
+    global _default_cache, _default_set
+    if not _default_set:
+        root = os.environ.get('FF_PAGE_CACHE') or DEFAULT_CACHE_DIR
+        _default_cache = None if root.lower() == 'off' else PageCache(root)
+        _default_set = True
+    return _default_cache
+
+
+def set_default_cache(cache):
+    # None turns caching off
+    global _default_cache, _default_set
+    _default_cache = cache
+    _default_set = True
@@ -0,0 +1,97 @@
+from bs4 import BeautifulSoup, Comment
+from lxml import html
+import re
+from src.data import instrument
+
+
+# Backends that build a BeautifulSoup tree, every page class accessor navigates one of these
+PARSERS = ('html.parser', 'lxml')
+DEFAULT_PARSER = 'lxml'
+
+
+def parse_page(markup, parser=DEFAULT_PARSER):
+    """
+    markup is a string, bytes or an open file/response
+    parser is one of PARSERS
+    """
+    with instrument.timer('parse', parser=parser):
+        return _parse(markup, parser)
+
+
+def _parse(markup, parser):
+    if parser not in PARSERS:
+        raise KeyError('Parser Not Found')
+    return BeautifulSoup(markup, parser)
+
+
+def parse_tree(markup):
+    # A bare lxml tree with no BeautifulSoup on top, for xpath based decoding like TableSpec's
+    with instrument.timer('parse', parser='lxml-tree'):
+        if hasattr(markup, 'read'):
+            markup = markup.read()
+        return html.document_fromstring(markup)
+
+
+def soup_parser(parser):
+    # The page classes only know how to walk a soup, so check the backend up front rather than fail mid extraction
+    if parser is None:
+        return DEFAULT_PARSER
+    if parser not in PARSERS:
+        raise KeyError(f'Parser must be one of {PARSERS}')
+    return parser
+
+
+def comment_table(div, parser=DEFAULT_PARSER):
+    # pro-football-reference hides most tables inside an html comment in the table's div
+    with instrument.timer('comment_parse', parser=parser):
+        comments = div.find_all(string=lambda text: isinstance(text, Comment))
+        return _parse(''.join(comments), parser)
+
+
+def table_markup(div):
+    # The html holding the div's table, inline or hidden in a comment, for decoding without building a soup
+    if div.find('tr') is not None:
+        return str(div)
+    return ''.join(div.find_all(string=lambda text: isinstance(text, Comment)))
+
+
+_div_tag = re.compile(r'<div\b[^>]*>|</div\s*>', re.IGNORECASE)
+# Anchored on the whitespace before the name, so data-id= or data-class= don't count
+_div_attr = re.compile(r'''\s(id|class)\s*=\s*["']([^"']*)["']''', re.IGNORECASE)
+
+
+def page_fragments(markup, div_ids, div_classes=()):
+    """
+    Pre-scans the raw page and keeps only the divs whose id is in div_ids or whose class is in div_classes
+    Returns a much smaller html string that can be handed to parse_page
+    """
+    with instrument.timer('prescan'):
+        return _page_fragments(markup, div_ids, div_classes)
+
+
+def _page_fragments(markup, div_ids, div_classes):
+    if hasattr(markup, 'read'):
+        markup = markup.read()
+    if isinstance(markup, bytes):
+        markup = markup.decode('utf-8')
+    div_ids = set(div_ids)
+    div_classes = set(div_classes)
+    fragments = []
+    depth = 0
+    start = None
+    for tag in _div_tag.finditer(markup):
+        closing = tag.group(0)[1] == '/'
+        if start is not None:
+            # Inside a wanted div, only track nesting until its closing tag
+            depth += -1 if closing else 1
+            if depth == 0:
+                fragments.append(markup[start:tag.end()])
+                start = None
+        elif not closing:
+            attrs = dict((k.lower(), v) for k, v in _div_attr.findall(tag.group(0)))
+            if attrs.get('id') in div_ids or attrs.get('class') in div_classes:
+                start = tag.start()
+                depth = 1
+    if start is not None:
+        fragments.append(markup[start:])
+    return '<html><body>' + '\n'.join(fragments) + '</body></html>'
@@ -1,34 +1,140 @@
-import urllib
-from bs4 import BeautifulSoup, Comment
-import pandas as pd
-import time
+from bs4 import Comment
+import csv
 import argparse
+import os
+import sys
 
+if __name__ == "__main__" and not __package__:
+    # Run as a plain script, python src/data/pbp.py, so put the repo root on the path for the src imports below
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from src.data import instrument
+from src.data.crawler import Crawler
+from src.data.export import table_schemas, write_table
+from src.data.manifest import INCREMENTAL_TTL, IngestManifest, game_id_from_url, source_hash
+from src.data.page_cache import default_cache
+from src.data.page_parser import parse_page
 
+# Bump whenever pbp_page_extract's output changes so incremental runs re-extract every game
+PARSER_VERSION = 2
 
+# The raw csv's columns, a play's first row can be missing cells the rest have
+PBP_RAW_FIELDS = [col for col, _ in table_schemas['pbp_raw'][0]]
 
-def pbp_export(yr, wk, slp_tm=3):
-    games_list = pbp_list(yr, wk)
-    df = pd.DataFrame.from_dict(games_list)
-    df.to_csv(f'{yr}_wk{wk}.csv', index=False)
+
+def pbp_export(yr, wk, slp_tm=3, workers=4, fmt='csv'):
+    crawler = Crawler(delay=slp_tm, workers=workers)
+    if fmt == 'csv':
+        pbp_write(pbp_iter(yr, wk, crawler), f'{yr}_wk{wk}.csv', PBP_RAW_FIELDS)
+    else:
+        # Parquet and feather get a fixed typed schema, see export.table_schemas, and are written a batch at a time
+        write_table('pbp_raw', pbp_iter(yr, wk, crawler), f'{yr}_wk{wk}.{fmt}', fmt)
+
+
+def pbp_season_export(yr, weeks=range(1, 18), slp_tm=3, workers=4, fmt='csv'):
+    # A whole season goes through a single writer one play at a time, so memory doesn't grow with the season
+    crawler = Crawler(delay=slp_tm, workers=workers)
+    rows = (row for wk in weeks for row in pbp_iter(yr, wk, crawler))
+    if fmt == 'csv':
+        pbp_write(rows, f'{yr}.csv', PBP_RAW_FIELDS)
+    else:
+        write_table('pbp_raw', rows, f'{yr}.{fmt}', fmt)
+
+
+def pbp_incremental_export(yr, wk, manifest_path, out_dir='.', slp_tm=3, workers=4, ttl=INCREMENTAL_TTL):
+    """
+    Writes one csv per game into {out_dir}/{yr}_wk{wk}/ and only extracts games that are new or whose page or
+    parser changed since the last run, as recorded in the manifest at manifest_path. wk None does every week
+    A game the manifest has is checked with a conditional request (or its cached copy's validators) before its page
+    is downloaded, and cached pages are only trusted for ttl seconds so a changed page is noticed
+    """
+    cache = default_cache()
+    crawler = Crawler(delay=slp_tm, workers=workers, cache=cache.with_ttl(ttl) if cache is not None else None)
+    manifest = IngestManifest(manifest_path)
+    weeks = {}
+
+    def url_list():
+        for week in (range(1, 18) if wk is None else [wk]):
+            for gurl in game_urls(yr, week, crawler):
+                weeks[gurl] = week
+                yield gurl
+
+    def fetch(gurl):
+        return crawler.fetch_if_changed(gurl, manifest.validators(game_id_from_url(gurl), ['pbp'], PARSER_VERSION))
+
+    written = []
+    for gurl, (pg, validators) in crawler.crawl(url_list(), fetch=fetch):
+        if pg is None:
+            continue
+        game_id = game_id_from_url(gurl)
+        pg_hash = source_hash(pg)
+        if not manifest.is_current(game_id, pg_hash, ['pbp'], PARSER_VERSION):
+            wk_dir = os.path.join(out_dir, f'{yr}_wk{weeks[gurl]}')
+            os.makedirs(wk_dir, exist_ok=True)
+            pbp_write(pbp_page_extract(pg, yr, weeks[gurl]), os.path.join(wk_dir, f'{game_id}.csv'),
+                      PBP_RAW_FIELDS)
+            written.append(game_id)
+        manifest.record(game_id, gurl, pg_hash, ['pbp'], PARSER_VERSION, validators)
+        # Saved after every game so an interrupted run keeps what it finished
+        manifest.save()
+    return written
 
 
 def pbp_list(yr, wk, slp_tm=3):
-    games_list = []
-    gurls = game_urls(yr,wk)
-    for gurl in gurls:
-        pbp = pbp_extract(gurl, yr, wk)
-        games_list += pbp
-        time.sleep(slp_tm)
-    return games_list
+    return list(pbp_iter(yr, wk, Crawler(delay=slp_tm)))
+
+
+def pbp_iter(yr, wk, crawler=None):
+    """
+    Yields every play of the week, the games are fetched and parsed concurrently by the crawler
+    which keeps requests to the site at most one every crawler.delay seconds
+    """
+    if crawler is None:
+        crawler = Crawler()
+    gurls = game_urls(yr, wk, crawler)
+    for gurl, pbp in crawler.crawl(gurls, extract=lambda pg: pbp_game_rows(pg, yr, wk)):
+        yield from pbp
 
 
-def game_urls(yr,wk):
+def pbp_game_rows(pg, yr, wk):
+    with instrument.timer('extract', table='pbp_raw'):
+        rows = list(pbp_page_extract(pg, yr, wk))
+    instrument.count('rows', len(rows), table='pbp_raw')
+    return rows
+
+
+def pbp_write(rows, path, fieldnames=None):
+    """
+    Writes rows (dicts) to a csv as they are produced, the header comes from fieldnames or the first row
+    e.g., pbp_write(gd.iter_play_by_play(), path, GameData.pbp_fields)
+    GameData's plays only have the fields they use (sack_asst, a second penalty, ...), so pass its pbp_fields.
+    Without fieldnames a field the first row doesn't have is a ValueError rather than silently dropped
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    row_ct = 0
+    with open(path, 'w', newline='') as file:
+        if first is None:
+            return row_ct
+        writer = csv.DictWriter(file, fieldnames=fieldnames or list(first),
+                                extrasaction='raise' if fieldnames is None else 'ignore')
+        writer.writeheader()
+        writer.writerow(first)
+        row_ct += 1
+        for row in rows:
+            writer.writerow(row)
+            row_ct += 1
+    return row_ct
+
+
+def game_urls(yr, wk, crawler=None, ttl=6 * 60 * 60):
+    # The week page picks up new games as they are played, so a cached copy is only trusted for ttl seconds
+    if crawler is None:
+        crawler = Crawler()
     bs_pg = 'https://www.pro-football-reference.com/years/'
     pg_url = f'{bs_pg}{yr}/week_{wk}.htm'
-    pg = urllib.request.urlopen(pg_url)
-    soup = BeautifulSoup(pg, 'html.parser')
+    pg = crawler.fetch(pg_url, ttl)
+    soup = parse_page(pg)
     summ = soup.find('div',{'class':'game_summaries'})
     links = summ.find_all('td',{'class':'gamelink'})
     game_urls = []
@@ -36,22 +142,36 @@ def game_urls(yr,wk):
     for game in links:
         game_str = game.a['href']
         game_urls.append(f'{game_urls_bs}{game_str}')
+    soup.decompose()
     return game_urls
 
 
-def pbp_extract(pg_url, yr, wk):
-    pg = urllib.request.urlopen(pg_url)
-    soup = BeautifulSoup(pg, 'html.parser')
+def pbp_extract(pg_url, yr, wk, crawler=None):
+    if crawler is None:
+        crawler = Crawler()
+    return list(pbp_page_extract(crawler.fetch(pg_url), yr, wk))
+
+
+def pbp_page_extract(pg, yr, wk):
+    soup = parse_page(pg)
     header = soup.find('h1').string.split(' -')[0]
     header = header.split(' at ')
     comments=soup.find_all(string=lambda text:isinstance(text,Comment))
     for v in comments:
         if v.find("div_pbp") > -1:
             break
-    table = BeautifulSoup(str(v), 'lxml')
+    table = parse_page(str(v))
+    # Only the pbp table is needed from here on, and both trees are released as soon as the game is read
+    soup.decompose()
+    try:
+        yield from _pbp_rows(table, yr, wk, header)
+    finally:
+        table.decompose()
+
+
+def _pbp_rows(table, yr, wk, header):
     rows = table.find_all('tr')
     quarter = 1
-    pbp = []
     for row in rows[1:]:
         tmp_dict = {}
         cells = row.find_all('td')
@@ -76,15 +196,33 @@ def pbp_extract(pg_url, yr, wk):
             tmp_dict['week'] = wk
             tmp_dict['away_team'] = header[0]
             tmp_dict['home_team'] = header[1]
-            pbp.append(tmp_dict)
-    return pbp
+            yield tmp_dict
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-y", "--year", help="season")
-    parser.add_argument("-w", "--week", help="week")
+    parser.add_argument("-w", "--week", help="week, leave out to export the whole season into one file (or with a "
+                                             "manifest, every week)")
     parser.add_argument("-s", "--sleep_time", help="The number of seconds to break between each webpage crawl",
                         type=int, default=3)
+    parser.add_argument("-n", "--workers", help="The number of pages to fetch and parse at once", type=int, default=4)
+    parser.add_argument("-m", "--manifest", help="Manifest file, only games that are new or changed since the "
+                                                 "last run are extracted, one csv per game")
+    parser.add_argument("-o", "--out_dir", help="Directory the per game csvs go in", default='.')
+    parser.add_argument("--ttl", help="With a manifest, seconds a cached page is trusted before the server is asked "
+                                      "whether it changed", type=int, default=INCREMENTAL_TTL)
+    parser.add_argument("-f", "--format", help="csv, parquet or feather", default='csv')
+    parser.add_argument("-r", "--report", help="Time every stage and write the run to REPORT.json and REPORT.prom")
     args = parser.parse_args()
-    pbp_export(yr=args.year, wk=args.week, slp_tm=args.sleep_time)
-
+    if args.report is not None:
+        instrument.enable()
+    if args.manifest is not None:
+        pbp_incremental_export(yr=args.year, wk=args.week, manifest_path=args.manifest, out_dir=args.out_dir,
+                               slp_tm=args.sleep_time, workers=args.workers, ttl=args.ttl)
+    elif args.week is None:
+        pbp_season_export(yr=args.year, slp_tm=args.sleep_time, workers=args.workers, fmt=args.format)
+    else:
+        pbp_export(yr=args.year, wk=args.week, slp_tm=args.sleep_time, workers=args.workers, fmt=args.format)
+    if args.report is not None:
+        instrument.write_reports(args.report)
@@ -0,0 +1,341 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import argparse
+import functools
+import json
+import os
+import re
+from src.data import instrument
+from src.data.atomic import atomic_write
+from src.data.crawler import Crawler, set_default_crawler
+from src.data.game_data import GameData
+from src.data.manifest import INCREMENTAL_TTL, IngestManifest, game_id_from_url, source_hash
+from src.data.page_cache import default_cache
+from src.data.registry import default_registry
+from src.data.season_data import SeasonData
+from src.data.week_data import WeekData
+
+
+def season_game_urls(year):
+    """
+    Yields (week, game url) for every game in the season, chaining SeasonData.week_urls into each WeekData
+    Each page's soup is released as soon as its urls are read, rather than held for the rest of the season
+    """
+    with SeasonData(year) as sd:
+        wurls, _ = sd.week_urls
+    weeks = []
+    for wurl in wurls:
+        week = int(re.search(r'week_(\d+)', wurl).group(1))
+        if week not in weeks:
+            weeks.append(week)
+    for week in weeks:
+        with WeekData(year, week) as wd:
+            gurls = wd.game_urls
+        for gurl in gurls:
+            yield week, gurl
+
+
+def parse_game(pg, url, tables, parser, instrumented=False):
+    """
+    Runs on the process pool, only the page goes in and only plain row dicts come back
+    When instrumented, the worker's timers and counters for this game come back too, for the parent to merge
+    """
+    if not instrumented:
+        with GameData(url, tables, parser, page=pg) as gd:
+            return gd.extract_rows(), None
+    parent = instrument.active
+    instruments = instrument.enable()
+    try:
+        with GameData(url, tables, parser, page=pg) as gd:
+            rows = gd.extract_rows()
+    finally:
+        # Forked workers inherit the parent's instruments, keep this game's numbers apart from them
+        instrument.active = parent
+    return rows, (instruments.timers, instruments.counters)
+
+
+class PartitionWriter:
+    """
+    Writes one json lines file per table per season, out_dir/<table>/season=<year>.jsonl
+    Each file is written under a temp name and renamed when its season is closed, so a partition on disk is always
+    complete, and rows go in the order they're written so the same input always gives the same files
+    A game that hasn't changed since the last run can be carried over, its rows copied from the season's files as
+    they were before this run
+    Next to each file goes season=<year>.weeks.json, the byte ranges each week's rows take up, so one week can be
+    read (read_week) without going through the whole season
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.files = {}
+        self.rows = {}
+        self.old = {}
+        self.weeks = {}
+
+    def path(self, table, year):
+        return os.path.join(self.out_dir, table, f'season={year}.jsonl')
+
+    def _add_span(self, key, week, size):
+        # Games come in week order, so a week's rows are usually one range, extended as its games are written
+        spans = self.weeks[key]
+        end = spans['size']
+        week_spans = spans['weeks'].setdefault(str(week), [])
+        if week_spans and week_spans[-1][1] == end:
+            week_spans[-1][1] = end + size
+        else:
+            week_spans.append([end, end + size])
+        spans['size'] = end + size
+
+    def _file(self, table, year):
+        key = (table, year)
+        if key not in self.files:
+            os.makedirs(os.path.dirname(self.path(table, year)), exist_ok=True)
+            self.files[key] = open(self.path(table, year) + '.tmp', 'w')
+            self.rows[key] = 0
+            self.weeks[key] = {'size': 0, 'weeks': {}}
+        return self.files[key]
+
+    def write(self, year, week, table, rows):
+        file = self._file(table, year)
+        lines = [json.dumps(dict(row, season=year, week=week), sort_keys=True, default=str) + '\n' for row in rows]
+        file.writelines(lines)
+        self.rows[(table, year)] += len(rows)
+        self._add_span((table, year), week, sum(len(line.encode()) for line in lines))
+
+    def old_rows(self, year):
+        """
+        The lines the last run wrote for year, {game_id: {table: [lines]}}, read the first time they're asked for
+        """
+        if year not in self.old:
+            games = {}
+            tables = sorted(os.listdir(self.out_dir)) if os.path.isdir(self.out_dir) else []
+            for table in tables:
+                if not os.path.exists(self.path(table, year)):
+                    continue
+                with open(self.path(table, year)) as file:
+                    for line in file:
+                        games.setdefault(json.loads(line)['game_id'], {}).setdefault(table, []).append(line)
+            self.old[year] = games
+        return self.old[year]
+
+    def has_game(self, year, game_id):
+        return game_id in self.old_rows(year)
+
+    def carry_over(self, year, game_id, week):
+        for table, lines in sorted(self.old_rows(year)[game_id].items()):
+            self._file(table, year).writelines(lines)
+            self.rows[(table, year)] += len(lines)
+            self._add_span((table, year), week, sum(len(line.encode()) for line in lines))
+
+    def close_season(self, year):
+        for table, file_yr in [key for key in self.files if key[1] == year]:
+            self.files.pop((table, file_yr)).close()
+            os.replace(self.path(table, year) + '.tmp', self.path(table, year))
+            # The size is checked on read, an index left from an earlier run never points into the wrong rows
+            with atomic_write(weeks_path(self.path(table, year)), 'w') as file:
+                json.dump(self.weeks.pop((table, file_yr)), file, sort_keys=True)
+        self.old.pop(year, None)
+
+    def close(self):
+        for year in sorted(set(key[1] for key in self.files)):
+            self.close_season(year)
+
+
+def weeks_path(path):
+    # season=<year>.jsonl -> season=<year>.weeks.json
+    return path[:-len('.jsonl')] + '.weeks.json'
+
+
+def read_week(path, week):
+    """
+    The rows of week in a partition PartitionWriter wrote, read from the week's byte ranges in its weeks index
+    A partition without an index, or one that doesn't match the file, is scanned instead
+    """
+    spans = None
+    if os.path.exists(weeks_path(path)):
+        with open(weeks_path(path)) as file:
+            spans = json.load(file)
+    with open(path, 'rb') as file:
+        if spans is None or spans['size'] != os.fstat(file.fileno()).st_size:
+            return [row for row in map(json.loads, file) if row['week'] == week]
+        rows = []
+        for start, end in spans['weeks'].get(str(week), []):
+            file.seek(start)
+            rows += map(json.loads, file.read(end - start).splitlines())
+        return rows
+
+
+def ingest_seasons(first_year, last_year, out_dir, tables=None, workers=None, fetch_workers=4, slp_tm=3,
+                   parser=None, skip_errors=True, registry=None, manifest_path=None, ttl=INCREMENTAL_TTL):
+    """
+    Fetches and parses every game from first_year to last_year (inclusive) into per table, per season partitions
+    Pages are fetched by fetch_workers threads under the crawler's rate limit and parsed on a pool of workers
+    processes (default one per core). Each stage only holds a couple of items per worker, so memory stays flat over
+    a long backfill and a slow stage holds back the ones before it
+    Returns (partition row counts, failed), failed being the (url, error) of every game that couldn't be fetched or
+    parsed when skip_errors is set
+    Every id is interned into registry (the default_registry when None) as its game is written, the workers each
+    have their own copy, so only this process hands out codes. A registry with a path is saved at the end
+    With manifest_path, only games that are new or changed since the run that wrote out_dir are parsed (see
+    IngestManifest), the rest are carried over from the partitions already there. A game the manifest has is checked
+    with a conditional request before its page is downloaded, and cached pages are only trusted for ttl seconds
+    """
+    cache = default_cache()
+    if manifest_path is not None and cache is not None:
+        cache = cache.with_ttl(ttl)
+    crawler = Crawler(delay=slp_tm, workers=fetch_workers, cache=cache)
+    # The season and week pages go through the same crawler, so everything shares one rate limit
+    set_default_crawler(crawler)
+    workers = workers or os.cpu_count()
+    registry = registry if registry is not None else default_registry()
+    writer = PartitionWriter(out_dir)
+    failed = []
+    manifest = IngestManifest(manifest_path) if manifest_path is not None else None
+    # What the manifest records as extracted for each game
+    manifest_tables = sorted(tables or GameData.table_dict)
+
+    games = deque()
+    fetch = functools.partial(_fetch_changed, crawler, manifest, manifest_tables) if manifest is not None else None
+    pending = deque()
+    current_year = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for url, pg in crawler.crawl(_season_urls(first_year, last_year, games), skip_errors=skip_errors, fetch=fetch):
+            year, week = _next_game(games, url, pending, writer, manifest)
+            record = None
+            if manifest is not None:
+                pg, record = _check_manifest(pg, year, url, crawler, writer, manifest, manifest_tables)
+                if pg is None:
+                    pending.append((year, week, url, None, record))
+                    continue
+            future = executor.submit(parse_game, pg, url, tables, parser, instrument.active is not None)
+            pending.append((year, week, url, future, record))
+            if len(pending) >= workers * 2:
+                current_year = _write_game(pending.popleft(), writer, registry, current_year, failed, skip_errors,
+                                           manifest)
+        for year, week, gurl in games:
+            _carry(pending, writer, manifest, year, week, gurl)
+        while pending:
+            current_year = _write_game(pending.popleft(), writer, registry, current_year, failed, skip_errors,
+                                       manifest)
+    failed = crawler.failed + failed
+    writer.close()
+    if manifest is not None:
+        manifest.save()
+    if registry.path is not None:
+        registry.save()
+    return dict(writer.rows), failed
+
+
+def _season_urls(first_year, last_year, games):
+    # Remembers which season/week each url came from in games, the crawler hands back urls in the same order
+    for year in range(first_year, last_year + 1):
+        for week, gurl in season_game_urls(year):
+            games.append((year, week, gurl))
+            yield gurl
+
+
+def _next_game(games, url, pending, writer, manifest):
+    # The season and week of url, pages the crawler gave up on are never handed over, so their place in line is
+    # dropped (carrying the game over) on the way
+    year, week, gurl = games.popleft()
+    while gurl != url:
+        _carry(pending, writer, manifest, year, week, gurl)
+        year, week, gurl = games.popleft()
+    return year, week
+
+
+def _fetch_changed(crawler, manifest, manifest_tables, url):
+    validators = manifest.validators(game_id_from_url(url), manifest_tables, GameData.parser_version)
+    return crawler.fetch_if_changed(url, validators)
+
+
+def _carry(pending, writer, manifest, year, week, url):
+    # A game that couldn't be fetched keeps the rows the last run got for it
+    if manifest is not None and writer.has_game(year, game_id_from_url(url)):
+        pending.append((year, week, url, None, None))
+
+
+def _check_manifest(fetched, year, url, crawler, writer, manifest, manifest_tables):
+    """
+    Returns the page to parse and the game's manifest record, with the crawler's (page or None, validators)
+    No page means the game is carried over, it's unchanged (or parsed from the same page) and its rows are in out_dir
+    """
+    pg, validators = fetched
+    game_id = game_id_from_url(url)
+    if pg is None and writer.has_game(year, game_id):
+        return None, None
+    if pg is None:
+        # Unchanged, but its rows aren't in out_dir any more
+        pg = crawler.fetch(url)
+    pg_hash = source_hash(pg)
+    record = (pg_hash, manifest_tables, GameData.parser_version, validators)
+    if manifest.is_current(game_id, pg_hash, manifest_tables, GameData.parser_version) and \
+            writer.has_game(year, game_id):
+        return None, record
+    return pg, record
+
+
+def _close_season(writer, year, manifest=None):
+    # Games come back in order, so once the next season starts the last one is done
+    writer.close_season(year)
+    if manifest is not None:
+        # Only saved once the season's partitions are in place, so it never gets ahead of them
+        manifest.save()
+
+
+def _write_game(item, writer, registry, current_year, failed, skip_errors, manifest=None):
+    """
+    Writes a parsed game, or carries an unchanged one over when it has no future, and records it in the manifest
+    """
+    year, week, url, future, record = item
+    if current_year is not None and year != current_year:
+        _close_season(writer, current_year, manifest)
+    game_id = game_id_from_url(url)
+    if future is None:
+        writer.carry_over(year, game_id, week)
+    else:
+        try:
+            rows, worker_stats = future.result()
+        except Exception as err:
+            if not skip_errors:
+                raise
+            failed.append((url, err))
+            if manifest is not None and writer.has_game(year, game_id):
+                writer.carry_over(year, game_id, week)
+            return year
+        if worker_stats is not None:
+            instrument.active.merge(*worker_stats)
+        for table in sorted(rows):
+            writer.write(year, week, table, registry.intern_rows(rows[table]))
+    if record is not None:
+        manifest.record(game_id, url, *record)
+    return year
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--first_year", help="first season", type=int)
+    parser.add_argument("-l", "--last_year", help="last season, defaults to the first", type=int)
+    parser.add_argument("-o", "--out_dir", help="Directory the partitions go in", default='.')
+    parser.add_argument("-t", "--tables", help="GameData tables to extract, defaults to all of them", nargs='*')
+    parser.add_argument("-n", "--workers", help="The number of parsing processes", type=int)
+    parser.add_argument("-c", "--fetch_workers", help="The number of pages to fetch at once", type=int, default=4)
+    parser.add_argument("-s", "--sleep_time", help="The number of seconds to break between each webpage crawl",
+                        type=int, default=3)
+    parser.add_argument("-m", "--manifest", help="Manifest file, only games that are new or changed since the last "
+                                                 "run are parsed, the rest are carried over from out_dir")
+    parser.add_argument("--ttl", help="With a manifest, seconds a cached page is trusted before the server is asked "
+                                      "whether it changed", type=int, default=INCREMENTAL_TTL)
+    parser.add_argument("-r", "--report", help="Time every stage and write the run to REPORT.json and REPORT.prom")
+    args = parser.parse_args()
+    if args.report is not None:
+        instrument.enable()
+    row_cts, failed = ingest_seasons(args.first_year, args.last_year or args.first_year, args.out_dir,
+                                     tables=args.tables, workers=args.workers, fetch_workers=args.fetch_workers,
+                                     slp_tm=args.sleep_time, manifest_path=args.manifest, ttl=args.ttl)
+    for table, year in sorted(row_cts):
+        print(f'{table} {year}: {row_cts[(table, year)]} rows')
+    for url, err in failed:
+        print(f'failed {url}: {err}')
+    if args.report is not None:
+        instrument.write_reports(args.report)
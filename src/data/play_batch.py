@@ -0,0 +1,82 @@
+from array import array
+import numpy as np
+
+
+class PlayBatch:
+    """
+    Columnar store for play by play rows, one typed array per field instead of a dict per play
+    Integer fields are int16 with a null mask, every other field is a dictionary encoded string (int32 codes)
+    -999, NaN and None all become nulls
+    """
+
+    null_code = -1
+
+    def __init__(self, fields, int_fields):
+        self.fields = list(fields)
+        self.int_fields = set(int_fields)
+        self.columns = {}
+        self.masks = {}
+        self.categories = {}
+        self.lookups = {}
+        for field in self.fields:
+            if field in self.int_fields:
+                self.columns[field] = array('h')
+                self.masks[field] = bytearray()
+            else:
+                self.columns[field] = array('i')
+                self.categories[field] = []
+                self.lookups[field] = {}
+        self.row_ct = 0
+
+    def __len__(self):
+        return self.row_ct
+
+    def append(self, row):
+        for field in self.fields:
+            val = row.get(field)
+            missing = val is None or val == -999 or val != val
+            if field in self.int_fields:
+                self.columns[field].append(0 if missing else int(val))
+                self.masks[field].append(missing)
+            else:
+                self.columns[field].append(self.null_code if missing else self._encode(field, str(val)))
+        self.row_ct += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def _encode(self, field, val):
+        lookup = self.lookups[field]
+        code = lookup.get(val)
+        if code is None:
+            code = lookup[val] = len(self.categories[field])
+            self.categories[field].append(val)
+        return code
+
+    def nbytes(self):
+        total = 0
+        for field in self.fields:
+            total += self.columns[field].itemsize * len(self.columns[field])
+            if field in self.int_fields:
+                total += len(self.masks[field])
+        return total
+
+    def to_frame(self):
+        """
+        Builds a pandas DataFrame on top of the batch's buffers, the integer columns are nullable Int16 and the
+        strings are categoricals. The numeric buffers are shared rather than copied, so the batch can't be appended
+        to while the frame is alive
+        """
+        import pandas as pd
+        data = {}
+        for field in self.fields:
+            if field in self.int_fields:
+                values = np.frombuffer(self.columns[field], dtype=np.int16)
+                mask = np.frombuffer(self.masks[field], dtype=np.bool_)
+                data[field] = pd.arrays.IntegerArray(values, mask)
+            else:
+                codes = np.frombuffer(self.columns[field], dtype=np.int32)
+                data[field] = pd.Categorical.from_codes(codes, categories=self.categories[field])
+        return pd.DataFrame(data, copy=False)
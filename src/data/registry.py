@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+from src.data.atomic import atomic_write
+
+_href_ids = {}
+
+
+def href_id(href):
+    # The id at the end of a pro-football-reference link, /players/B/BradTo00.htm is BradTo00, each href is split once
+    cell_id = _href_ids.get(href)
+    if cell_id is None:
+        cell_id = _href_ids[href] = sys.intern(href.split('/')[-1].split('.')[0])
+    return cell_id
+
+
+# Which kind of id each id column holds, columns not listed here that end in _id are players, e.g., rec_by_id
+_column_kinds = {'team': 'team', 'opp_id': 'team', 'winner_id': 'team', 'loser_id': 'team', 'ref_id': 'referee',
+                 'stadium_id': 'stadium', 'game_id': None, 'award_id': None, 'college_id': None}
+
+
+def column_kind(col):
+    """
+    The registry kind of the ids in column col, None when it doesn't hold ids the registry keeps
+    """
+    if col in _column_kinds:
+        return _column_kinds[col]
+    if col.endswith('coach_id'):
+        return 'coach'
+    if col.endswith('team_id'):
+        return 'team'
+    if col.endswith('_id') or col.endswith('_id_2'):
+        return 'player'
+    return None
+
+
+class IdRegistry:
+    """
+    Interns the ids and names of every player, team, coach, referee and stadium the scrapers come across
+    Each id gets an integer code, dense and in the order the ids were first seen, per kind. Codes never change once
+    handed out, so they can stand in for the ids in dictionary encoded columns and agree across files and runs.
+    Every row holding an id or name gets the registry's copy of the string rather than a fresh one
+    path is the json file the registry is loaded from and saved to, None keeps it in memory
+    """
+
+    kinds = ('player', 'team', 'coach', 'referee', 'stadium')
+
+    def __init__(self, path=None):
+        self.path = path
+        self.ids = {kind: [] for kind in self.kinds}
+        self.names = {kind: [] for kind in self.kinds}
+        self.codes = {kind: {} for kind in self.kinds}
+        self._strings = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                for kind, entries in json.load(file).items():
+                    for id_str, name in entries:
+                        self.intern(kind, id_str, name)
+
+    def __len__(self):
+        return sum(len(self.ids[kind]) for kind in self.kinds)
+
+    def _string(self, val):
+        # Names repeat as often as ids do, one copy of each is kept
+        if val is None:
+            return None
+        val = str(val)
+        return self._strings.setdefault(val, val)
+
+    def intern(self, kind, id_str, name=None):
+        """
+        Registers id_str (and its name) under kind if it's new, returns the registry's copies of the id and name
+        """
+        codes = self.codes[kind]
+        code = codes.get(id_str)
+        if code is None:
+            id_str = self._string(id_str)
+            code = codes[id_str] = len(self.ids[kind])
+            self.ids[kind].append(id_str)
+            self.names[kind].append(self._string(name))
+        elif name is not None and self.names[kind][code] is None:
+            self.names[kind][code] = self._string(name)
+        return self.ids[kind][code], self._string(name)
+
+    def link(self, kind, link):
+        # The id and name of an <a>
+        return self.intern(kind, href_id(link['href']), link.string)
+
+    def code(self, kind, id_str):
+        codes = self.codes[kind]
+        if id_str not in codes:
+            self.intern(kind, id_str)
+        return codes[id_str]
+
+    def intern_rows(self, rows):
+        """
+        Registers the ids in every id column of rows (list of dicts) and swaps in the registry's copies
+        """
+        for row in rows:
+            for col, val in row.items():
+                if isinstance(val, str):
+                    kind = column_kind(col)
+                    if kind is not None:
+                        row[col] = self.intern(kind, val)[0]
+        return rows
+
+    def save(self, path=None):
+        path = path or self.path
+        entries = {kind: [[id_str, name] for id_str, name in zip(self.ids[kind], self.names[kind])]
+                   for kind in self.kinds}
+        # A crash mid save must never lose the codes already handed out
+        with atomic_write(path, 'w') as file:
+            json.dump(entries, file)
+
+
+_default_registry = None
+
+
+def default_registry():
+    """
+    The registry every scraper interns into unless told otherwise, set it with set_default_registry or point the
+    FF_ID_REGISTRY environment variable at a json file. Without either it lives in memory for the run
+    """
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = IdRegistry(os.environ.get('FF_ID_REGISTRY'))
+    return _default_registry
+
+
+def set_default_registry(registry):
+    global _default_registry
+    _default_registry = registry
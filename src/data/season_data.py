@@ -1,7 +1,10 @@
-from urllib import request
-from bs4 import BeautifulSoup, Comment
 import os
-import re
+from src.data.crawler import fetch_page
+from src.data.instrument import timed_table
+from src.data.page_parser import comment_table, parse_page, soup_parser, table_markup
+from src.data.registry import default_registry, href_id
+from src.data.table_spec import TableSpec, first_link, id_name, next_id_name, to_pct, to_float, to_sec
+
 
 class SeasonData:
     # Extracts all data for a given season
@@ -9,7 +12,6 @@ class SeasonData:
     bs_pg = 'https://www.pro-football-reference.com'
     bs_pg_yrs = 'https://www.pro-football-reference.com/years/'
 
-
     table_dict = {
         'week_urls': 'links to weekly summaries (dict)',
         'awards': 'award winners (dict)',
@@ -30,24 +32,92 @@ class SeasonData:
         },
     }
 
-    def __init__(self, year, loc=None):
+    # How each kind of season_stats table decodes, see TableSpec
+    table_specs = {
+        'conference': TableSpec(rows=slice(2, None), keep=lambda row: first_link(row[0]) is not None,
+                                converters={'team': id_name('team')}),
+        'conference_playoffs': TableSpec(rows=slice(1, None), keep=lambda row: first_link(row[0]) is not None,
+                                         converters={'team': next_id_name('team')}),
+        'all_playoffs': TableSpec(rows=slice(1, None), converters={
+            'team': id_name('team'),
+            'loser': id_name('loser'),
+            'winner': id_name('winner'),
+            'game_location': lambda lbl, cell, cell_str: ((lbl, 'winner' if cell_str is None else 'loser'),),
+            'boxscore_word': lambda lbl, cell, cell_str: (('boxscore', first_link(cell).get('href')),),
+        }),
+        'play_type': TableSpec(
+            rows=slice(1, None), keep=lambda row: len(row) > 1 and first_link(row[1]) is not None, missing=0,
+            converters={
+                'team': id_name('team'),
+                'start_avg': lambda lbl, cell, cell_str: (('yards_from_endzone_avg', float(cell.get('csk'))),),
+                'time_avg': to_sec('sec_avg'),
+            },
+            rules=[(lambda lbl: lbl.find('perc') > -1 or lbl.find('pct') > -1, to_pct)], default=to_float),
+    }
+
+    table_spec_divs = {
+        'conference': ['all_AFC', 'all_NFC'],
+        'conference_playoffs': ['all_afc_playoff_standings', 'all_nfc_playoff_standings'],
+        'all_playoffs': ['all_playoff_results'],
+        'play_type': ['all_team_stats', 'all_passing', 'all_rushing', 'all_returns', 'all_kicking',
+                      'all_team_scoring', 'all_team_conversions', 'all_drives'],
+    }
+
+    def __init__(self, year, loc=None, parser=None):
         self.year = str(year)
         self.loc = loc
+        self.parser = soup_parser(parser)
         self.soup = self.season_soup()
 
     def season_soup(self):
         if self.loc is None:
-            pg = request.urlopen(f'{self.bs_pg_yrs}{self.year}')
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(f'{self.bs_pg_yrs}{self.year}')
+            soup = parse_page(pg, self.parser)
         else:
-            soup = BeautifulSoup(open(os.path.join(self.loc, f'{self.year}.html')), 'html.parser')
+            soup = parse_page(open(os.path.join(self.loc, f'{self.year}.html')), self.parser)
         return soup
 
+    def close(self):
+        # Decomposes the page, the tables already extracted don't depend on it
+        if self.soup is not None:
+            self.soup.decompose()
+            self.soup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def extract_rows(self, tables=None):
+        """
+        Every table in tables (table_dict keys or season_stats div ids) as a list of row dicts, the season_stats
+        tables are named season_ plus their div id without the all_ prefix, lower cased
+        """
+        if tables is None:
+            tables = list(self.table_dict)
+        rows = {}
+        for table in tables:
+            if table == 'week_urls':
+                rows[table] = [{'week_name': str(k), 'week_url': v} for k, v in self.week_urls[1].items()]
+            elif table == 'awards':
+                rows[table] = [dict(award=k, **v) for k, v in self.awards.items()]
+            elif table == 'season_stats' or table in self.table_dict['season_stats']:
+                div_ids = list(self.table_dict['season_stats']) if table == 'season_stats' else [table]
+                for div_id in div_ids:
+                    if self.soup.find('div', {'id': div_id}) is not None:
+                        rows['season_' + div_id[4:].lower()] = self.season_stats(div_id)
+            else:
+                raise KeyError('Table Not in List of Tables')
+        for table in rows:
+            rows[table] = [{k: str(v) if isinstance(v, str) else v for k, v in row.items()} for row in rows[table]]
+        return rows
+
     @property
+    @timed_table
     def week_urls(self):
         weeks = self.soup.find('div', {'id': 'all_week_games'})
-        comments = weeks.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = comment_table(weeks, self.parser)
         vals = table.find_all('a')
         wurls_dict = {}
         wurls = []
@@ -55,134 +125,34 @@ class SeasonData:
             wurl_string = f"{self.bs_pg}{i['href']}"
             wurls.append(wurl_string)
             wurls_dict[i.string] = wurl_string
+        table.decompose()
         return wurls, wurls_dict
 
     @property
+    @timed_table
     def awards(self):
         awards = self.soup.find('div', {'id': 'all_awards'})
-        comments = awards.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = comment_table(awards, self.parser)
         vals = table.find_all('a')
         awards_dict = {}
         for i in range(0, len(vals), 2):
             award_id_str = vals[i]['href']
+            player_id, player_name = default_registry().link('player', vals[i+1])
             awards_dict[self.year + ' ' + vals[i].string] = {
                 'award_url': f"{self.bs_pg}{award_id_str}",
-                'award_id': award_id_str.split('/')[-1].split('.')[0],
-                'player_name': vals[i+1].string,
-                'player_id': vals[i+1]['href'].split('/')[-1].split('.')[0]}
+                'award_id': href_id(award_id_str),
+                'player_name': player_name,
+                'player_id': player_id}
+        table.decompose()
         return awards_dict
 
+    @timed_table
     def season_stats(self, stat_table):
         div_val = self.soup.find('div', {'id': stat_table})
-        table_rows = div_val.find_all('tr')
-        if not table_rows:
-            comments = div_val.find_all(string=lambda text: isinstance(text, Comment))
-            table = BeautifulSoup(str(comments), 'lxml')
-            table_rows = table.find_all('tr')
-        if stat_table in ['all_AFC', 'all_NFC']:
-            stat_list = self.stats_conference(table_rows)
-        elif stat_table in ['all_playoff_results']:
-            stat_list = self.stats_all_playoffs(table_rows)
-        elif stat_table in ['all_afc_playoff_standings', 'all_nfc_playoff_standings']:
-            stat_list = self.stats_conference_playoffs(table_rows)
-        elif stat_table in ['all_team_stats', 'all_passing', 'all_rushing', 'all_returns', 'all_kicking',
-                            'all_team_scoring', 'all_team_conversions', 'all_drives']:
-            stat_list = self.stats_play_type(table_rows)
-        else:
-            raise KeyError('Table Not in List of Tables')
-        return stat_list
-
-    def stats_conference(self, table_rows):
-        stat_list = []
-        for row in table_rows[2:]:
-            cells = row.contents
-            if cells[0].a is not None:
-                stat_dict = {}
-                for cell in cells:
-                    lbl = cell['data-stat']
-                    cell_str = cell.string
-                    if lbl in ['team']:
-                        stat_dict = self._id_name_add(cell.a, stat_dict, lbl)
-                    else:
-                        stat_dict[cell['data-stat']] = cell_str
-                stat_list.append(stat_dict)
-        return stat_list
-
-    def stats_conference_playoffs(self, table_rows):
-        stat_list = []
-        for row in table_rows[1:]:
-            cells = row.contents
-            if cells[0].a is not None:
-                stat_dict = {}
-                for cell in cells:
-                    lbl = cell['data-stat']
-                    cell_str = cell.string
-                    if lbl in ['team']:
-                        stat_dict = self._id_name_add(cell.a.next, stat_dict, lbl)
-                    else:
-                        stat_dict[cell['data-stat']] = cell_str
-                stat_list.append(stat_dict)
-        return stat_list
-
-    def stats_all_playoffs(self, table_rows):
-        stat_list = []
-        for row in table_rows[1:]:
-            cells = row.contents
-            stat_dict = {}
-            for cell in cells:
-                if cells[0].name is not None:
-                    lbl = cell['data-stat']
-                    cell_str = cell.string
-                    if lbl in ['team', 'loser', 'winner']:
-                        stat_dict = self._id_name_add(cell.a, stat_dict, lbl)
-                    elif lbl in ['game_location']:
-                        if cell_str is None:
-                            stat_dict[cell['data-stat']] = 'winner'
-                        else:
-                            stat_dict[cell['data-stat']] = 'loser'
-                    elif lbl in ['boxscore_word']:
-                        stat_dict['boxscore'] = cell.a['href']
-                    else:
-                        stat_dict[cell['data-stat']] = cell_str
-            stat_list.append(stat_dict)
-        return stat_list
-
-    def stats_play_type(self, table_rows):
-        stat_list = []
-        for row in table_rows[1:]:
-            cells = row.contents
-            if cells[0].name is not None and cells[1].a is not None:
-                stat_dict = {}
-                for cell in cells:
-                    lbl = cell['data-stat']
-                    cell_str = cell.string
-                    if cell_str is None:
-                        stat_dict[cell['data-stat']] = 0
-                    elif lbl in ['team']:
-                        stat_dict = self._id_name_add(cell.a, stat_dict, lbl)
-                    elif lbl.find('perc') > -1 or lbl.find('pct') > -1:
-                        stat_dict[cell['data-stat']] = float(cell_str[:-1])
-                    elif lbl == 'start_avg':
-                        stat_dict['yards_from_endzone_avg'] = float(cell['csk'])
-                    elif lbl == 'time_avg':
-                        tm = cell_str.split(':')
-                        stat_dict['sec_avg'] = int(tm[0]) * 60 + int(tm[1])
-                    else:
-                        stat_dict[cell['data-stat']] = float(cell_str)
-                stat_list.append(stat_dict)
-        return stat_list
-
-    def _name_extract(self, cell):
-        cell_id = re.findall('[^a-z]([a-z]{3})[^a-z]', cell['href'])[0]
-        cell_name = cell.string
-        return cell_id, cell_name
-
-    def _id_name_add(self, cell, dct, id_name_str):
-        id_str, name_str = self._name_extract(cell)
-        dct[id_name_str + '_id'] = id_str
-        dct[id_name_str + '_name'] = name_str
-        return dct
+        for spec_name, div_ids in self.table_spec_divs.items():
+            if stat_table in div_ids:
+                return self.table_specs[spec_name].decode(table_markup(div_val))
+        raise KeyError('Table Not in List of Tables')
 
     abbrev_dict = {
         'win_loss_perc': 'Win-Loss Percentage of team. After 1972, ties are counted as half-wins and half-losses. '
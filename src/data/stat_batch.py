@@ -0,0 +1,118 @@
+from array import array
+import numpy as np
+from src.data.registry import column_kind
+
+
+class StatBatch:
+    """
+    Columnar store for stats table rows, where the columns aren't known up front
+    Numbers are float32 with a null mask, strings are dictionary encoded (int32 codes), so a team, position or
+    player id is stored once per batch rather than once per row. A column first seen part way through is null for
+    the rows before it, and a missing cell stays null rather than becoming 0
+    With a registry, the id columns (player_id, team, ...) use the registry's codes, so every batch built with the
+    same registry encodes an id the same way and their frames can be joined or concatenated on the codes
+    table names the export.table_schemas entry the number columns take their dtypes from, so every batch of a table
+    gives the same frame dtypes whatever values it happened to hold
+    """
+
+    null_code = -1
+
+    def __init__(self, category_fields=('player_id', 'player_name', 'team', 'pos', 'game_id'), registry=None,
+                 table=None):
+        self.category_fields = set(category_fields)
+        self.registry = registry
+        self.table = table
+        self.kinds = {}
+        self.fields = []
+        self.columns = {}
+        self.masks = {}
+        self.categories = {}
+        self.lookups = {}
+        self.row_ct = 0
+
+    def __len__(self):
+        return self.row_ct
+
+    def _add_field(self, field, val):
+        # Backfills the rows appended before the field showed up
+        self.fields.append(field)
+        if field in self.category_fields or isinstance(val, str):
+            self.columns[field] = array('i', [self.null_code]) * self.row_ct
+            self.categories[field] = []
+            self.lookups[field] = {}
+            if self.registry is not None and column_kind(field) is not None:
+                self.kinds[field] = column_kind(field)
+        else:
+            self.columns[field] = array('f', [0]) * self.row_ct
+            self.masks[field] = bytearray(b'\x01') * self.row_ct
+
+    def append(self, row):
+        for field, val in row.items():
+            if field not in self.columns and val is not None:
+                self._add_field(field, val)
+        for field in self.fields:
+            val = row.get(field)
+            missing = val is None or val != val
+            if field in self.masks:
+                self.columns[field].append(0 if missing else val)
+                self.masks[field].append(missing)
+            else:
+                self.columns[field].append(self.null_code if missing else self._encode(field, str(val)))
+        self.row_ct += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def _encode(self, field, val):
+        if field in self.kinds:
+            return self.registry.code(self.kinds[field], val)
+        lookup = self.lookups[field]
+        code = lookup.get(val)
+        if code is None:
+            code = lookup[val] = len(self.categories[field])
+            self.categories[field].append(val)
+        return code
+
+    def nbytes(self):
+        total = 0
+        for field in self.fields:
+            total += self.columns[field].itemsize * len(self.columns[field])
+            if field in self.masks:
+                total += len(self.masks[field])
+        return total
+
+    def column_types(self):
+        # The export type of each field under table's column spec, no table leaves every number column a float
+        if self.table is None:
+            return {}
+        # export imports game_data, which imports this module
+        from src.data.export import table_columns
+        return dict(table_columns(self.table, [dict.fromkeys(self.fields)]))
+
+    def to_frame(self):
+        """
+        Builds a pandas DataFrame from the batch, string columns are categoricals and number columns are nullable
+        Int16, Int32 or Float32 as table's column spec types them, Float32 without a table
+        """
+        import pandas as pd
+        from src.data.export import BIG_INT, INT
+        int_types = {INT: np.int16, BIG_INT: np.int32}
+        types = self.column_types()
+        data = {}
+        for field in self.fields:
+            if field in self.masks:
+                values = np.frombuffer(self.columns[field], dtype=np.float32)
+                mask = np.frombuffer(self.masks[field], dtype=np.bool_)
+                if types.get(field) in int_types:
+                    # Nulls are NaN in the buffer, zeroed so the cast has nothing to choke on
+                    data[field] = pd.arrays.IntegerArray(np.where(mask, 0, values).astype(int_types[types[field]]),
+                                                         mask.copy())
+                else:
+                    data[field] = pd.arrays.FloatingArray(values.copy(), mask.copy())
+            else:
+                codes = np.frombuffer(self.columns[field], dtype=np.int32)
+                categories = self.registry.ids[self.kinds[field]] if field in self.kinds else self.categories[field]
+                data[field] = pd.Categorical.from_codes(codes, categories=list(categories))
+        return pd.DataFrame(data, copy=False)
@@ -0,0 +1,121 @@
+from src.data.page_parser import parse_tree
+from src.data.registry import default_registry
+import re
+
+
+# missing=RAW hands empty cells to the converters like any other cell
+RAW = object()
+
+_team_id = re.compile('[^a-z]([a-z]{3})[^a-z]')
+
+
+def cell_string(cell):
+    # lxml version of bs4's Tag.string, the text of a cell with a single child (descending through lone tags), else None
+    while True:
+        if len(cell) == 0:
+            return cell.text
+        if len(cell) == 1 and not cell.text and not cell[0].tail:
+            cell = cell[0]
+        else:
+            return None
+
+
+def first_link(cell):
+    # The first <a> in the cell, like bs4's cell.a
+    links = cell.xpath('.//a')
+    return links[0] if links else None
+
+
+def raw(lbl, cell, cell_str):
+    return ((lbl, cell_str),)
+
+
+def to_float(lbl, cell, cell_str):
+    return ((lbl, float(cell_str)),)
+
+
+def to_pct(lbl, cell, cell_str):
+    # Percentages come with a trailing %
+    return ((lbl, float(cell_str[:-1])),)
+
+
+def to_sec(key):
+    # mm:ss in seconds under key
+    def convert(lbl, cell, cell_str):
+        mins, secs = cell_str.split(':')
+        return ((key, int(mins) * 60 + int(secs)),)
+    return convert
+
+
+def _link_team(link, key):
+    # Interned in the default registry, the team id being the 3 lower case letters in the link
+    team_id, team_name = default_registry().intern('team', _team_id.search(link.get('href')).group(1),
+                                                   cell_string(link))
+    return (key + '_id', team_id), (key + '_name', team_name)
+
+
+def id_name(key):
+    # The team id and name of the cell's first link
+    def convert(lbl, cell, cell_str):
+        return _link_team(first_link(cell), key)
+    return convert
+
+
+def next_id_name(key):
+    # Same as id_name but for the element right after the cell's first link
+    def convert(lbl, cell, cell_str):
+        return _link_team(first_link(cell).xpath('(descendant::*|following::*)[1]')[0], key)
+    return convert
+
+
+def skip(lbl, cell, cell_str):
+    return ()
+
+
+class TableSpec:
+    """
+    Declares how one pro-football-reference table decodes into a list of dicts
+    rows is the slice of the table's <tr>s to decode and keep(row) decides whether a row is a data row
+    converters maps a data-stat to a function(lbl, cell, cell_str) returning (key, value) pairs, rules are
+    (test(lbl), converter) pairs for data-stats that follow a naming pattern, everything else goes through default
+    missing is what an empty cell becomes, checked before the converters, RAW passes it to the converters instead
+    Each data-stat's converter is looked up once and reused for every row
+    """
+
+    def __init__(self, rows=slice(None), keep=None, converters=None, rules=(), default=raw, missing=RAW):
+        self.rows = rows
+        self.keep = keep
+        self.converters = converters or {}
+        self.rules = rules
+        self.default = default
+        self.missing = missing
+        self._resolved = {}
+
+    def converter(self, lbl):
+        if lbl not in self._resolved:
+            convert = self.converters.get(lbl)
+            if convert is None:
+                convert = next((rule_conv for test, rule_conv in self.rules if test(lbl)), self.default)
+            self._resolved[lbl] = convert
+        return self._resolved[lbl]
+
+    def decode(self, markup):
+        """
+        markup is the html holding the table, all of its <tr>s are pulled with one xpath
+        """
+        if not markup.strip():
+            return []
+        rows = parse_tree(markup).xpath('//tr')[self.rows]
+        return [self.decode_row(row) for row in rows if self.keep is None or self.keep(row)]
+
+    def decode_row(self, row):
+        row_dict = {}
+        for cell in row:
+            lbl = cell.get('data-stat')
+            cell_str = cell_string(cell)
+            if cell_str is None and self.missing is not RAW:
+                row_dict[lbl] = self.missing
+            else:
+                for key, val in self.converter(lbl)(lbl, cell, cell_str):
+                    row_dict[key] = val
+        return row_dict
@@ -1,99 +1,169 @@
-from urllib import request
-from bs4 import BeautifulSoup, Comment
 import os
 import re
+from src.data.crawler import fetch_page
+from src.data.instrument import timed_table
+from src.data.page_parser import comment_table, parse_page, soup_parser, table_markup
+from src.data.registry import default_registry, href_id
+from src.data.table_spec import TableSpec, cell_string, first_link, skip, to_sec
+
+
+_stat_text = re.compile('[:a-zA-Z]')
+
+
+def _team_stat(convert=skip):
+    # Plain numbers are floats, cells with any text go through convert
+    def team_stat(lbl, cell, cell_str):
+        if _stat_text.search(cell_str) is None:
+            return ((lbl, float(cell_str)),)
+        return convert(lbl, cell, cell_str)
+    return team_stat
+
+
+def _start_avg(lbl, cell, cell_str):
+    # e.g., Own 28.3, a drive starting in the team's own half counts from midfield
+    start_avg_str = cell_str.split()
+    start_avg = float(start_avg_str[-1])
+    if start_avg_str[0].find('Own') > -1:
+        start_avg += 50
+    return (('start_avg', start_avg),)
+
+
+def _game_url(lbl, cell, cell_str):
+    return (('game_url', TeamData.bs_pg + first_link(cell).get('href')),)
+
+
+def _opp(lbl, cell, cell_str):
+    return (('opp_name', cell_str), ('opp_id', first_link(cell).get('href').split('/')[-2]))
 
 
 class TeamData:
     bs_pg = 'https://www.pro-football-reference.com'
     bs_pg_yrs = 'https://www.pro-football-reference.com/years/'
 
-    def __init__(self, year, path=None):
+    # How each team page table decodes, see TableSpec
+    table_specs = {
+        'team_stats': TableSpec(rows=slice(2, 4), missing=0, default=_team_stat(), converters={
+            'start_avg': _team_stat(_start_avg),
+            'time_avg': _team_stat(to_sec('time_avg_sec')),
+        }),
+        'team_game_results': TableSpec(rows=slice(2, None), keep=lambda row: cell_string(row[1]) is not None,
+                                       missing=0, converters={'boxscore_word': _game_url, 'opp': _opp}),
+        'team_conversion': TableSpec(rows=slice(2, 4), missing=0),
+    }
+
+    def __init__(self, year, path=None, parser=None):
         self.year = str(year)
         self.path = path
+        self.parser = soup_parser(parser)
         self.team_pages_dict = self.team_pages()
         self.soup_team = None
         self.soup_draft = None
         self.soup_roster = None
         self.soup_injuries = None
 
+    def close(self):
+        # Decomposes every page soup, the tables already extracted don't depend on them
+        for name in ['soup_team', 'soup_draft', 'soup_roster', 'soup_injuries']:
+            self._set_soup(name, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _set_soup(self, name, soup):
+        # Decomposes the soup being replaced, so moving on to the next team doesn't keep the last team's page around
+        old_soup = getattr(self, name)
+        if old_soup is not None:
+            old_soup.decompose()
+        setattr(self, name, soup)
+
     @staticmethod
     def save_soup(soup, path, name):
         with open(f"{path}{name}", "w") as file:
             file.write(str(soup))
 
     @staticmethod
-    def load_soup(path, name):
-        soup = BeautifulSoup(open(os.path.join(path, name)), 'html.parser')
+    def save_page(pg, path, name):
+        # Writes the raw page rather than re-serializing the soup
+        with open(f"{path}{name}", "wb") as file:
+            file.write(pg)
+
+    @staticmethod
+    def load_soup(path, name, parser=None):
+        soup = parse_page(open(os.path.join(path, name)), soup_parser(parser))
         return soup
 
     def team_pages(self):
         if self.path is None:
-            pg = request.urlopen(f'{self.bs_pg_yrs}{self.year}')
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(f'{self.bs_pg_yrs}{self.year}')
+            soup = parse_page(pg, self.parser)
         else:
-            soup = BeautifulSoup(open(os.path.join(self.path, f'{self.year}.html')), 'html.parser')
+            soup = parse_page(open(os.path.join(self.path, f'{self.year}.html')), self.parser)
         div_val = soup.find('div', {'id': 'all_team_stats'})
-        comments = div_val.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = comment_table(div_val, self.parser)
         table_rows = table.find_all('tr')[2:-3]
         team_pages_dict = {}
         for row in table_rows:
             cell = row.contents[1]
-            team_pages_dict[cell.string] = self.bs_pg + cell.a['href']
+            team_pages_dict[str(cell.string)] = self.bs_pg + cell.a['href']
+        table.decompose()
+        soup.decompose()
         return team_pages_dict
 
     def soup_team_extract(self, team_page, path_team=None, local=False, write_soup=False):
         team_id = team_page.split('/')[-2]
         if path_team is not None and local:
-            soup = BeautifulSoup(open(os.path.join(path_team, f'{self.year}_{team_id}.htm')), 'html.parser')
+            soup = parse_page(open(os.path.join(path_team, f'{self.year}_{team_id}.htm')), self.parser)
         else:
-            pg = request.urlopen(f'{team_page}')
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(team_page)
+            soup = parse_page(pg, self.parser)
             if write_soup and path_team is not None:
                 name = f'{self.year}_{team_id}.htm'
-                self.save_soup(soup, path_team, name)
-        self.soup_team = soup
+                self.save_page(pg, path_team, name)
+        self._set_soup('soup_team', soup)
 
     def soup_draft_extract(self, path_draft=None, local=False, write_soup=False):
         if path_draft is not None and local:
-            soup = BeautifulSoup(open(os.path.join(path_draft, f'{self.year}_draft.htm')), 'html.parser')
+            soup = parse_page(open(os.path.join(path_draft, f'{self.year}_draft.htm')), self.parser)
         else:
-            pg = request.urlopen(f'{self.bs_pg_yrs}{self.year}/draft.htm')
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(f'{self.bs_pg_yrs}{self.year}/draft.htm')
+            soup = parse_page(pg, self.parser)
             if write_soup and path_draft is not None:
                 name = f'{self.year}_draft.htm'
-                self.save_soup(soup, path_draft, name)
-        self.soup_draft = soup
+                self.save_page(pg, path_draft, name)
+        self._set_soup('soup_draft', soup)
 
     def soup_roster_extract(self, team_page, path_roster=None, local=False, write_soup=False):
         team_id = team_page.split('/')[-2]
         if path_roster is not None and local:
-            soup = BeautifulSoup(open(os.path.join(path_roster, f'{self.year}_{team_id}_roster.htm')), 'html.parser')
+            soup = parse_page(open(os.path.join(path_roster, f'{self.year}_{team_id}_roster.htm')), self.parser)
         else:
             roster_url = team_page.replace('.htm', '_roster.htm')
-            pg = request.urlopen(roster_url)
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(roster_url)
+            soup = parse_page(pg, self.parser)
             if write_soup and path_roster is not None:
                 name = f'{self.year}_{team_id}_roster.htm'
-                self.save_soup(soup, path_roster, name)
-        self.soup_roster = soup
+                self.save_page(pg, path_roster, name)
+        self._set_soup('soup_roster', soup)
 
     def soup_injuries_extract(self, team_page, path_injuries=None, local=False, write_soup=False):
         team_id = team_page.split('/')[-2]
         if path_injuries is not None and local:
-            soup = BeautifulSoup(open(os.path.join(path_injuries, f'{self.year}_{team_id}_injuries.htm')),
-                                 'html.parser')
+            soup = parse_page(open(os.path.join(path_injuries, f'{self.year}_{team_id}_injuries.htm')),
+                              self.parser)
         else:
             injuries_url = team_page.replace('.htm', '_injuries.htm')
-            pg = request.urlopen(injuries_url)
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(injuries_url)
+            soup = parse_page(pg, self.parser)
             if write_soup and path_injuries is not None:
                 name = f'{self.year}_{team_id}_injuries.htm'
-                self.save_soup(soup, path_injuries, name)
-        self.soup_injuries = soup
+                self.save_page(pg, path_injuries, name)
+        self._set_soup('soup_injuries', soup)
 
     @property
+    @timed_table
     def draft(self):
         if self.soup_draft is None:
             raise AttributeError('soup_draft does not exist, first run soup_draft method')
@@ -109,7 +179,8 @@ class TeamData:
                     draft_dict[col['data-stat']] = col.string
                     if col.string is None:
                         draft_dict[col['data-stat']] = 0
-                draft_dict['player_id'] = row[3].a['href'].split('/')[-1].split('.')[0]
+                draft_dict['player_id'] = default_registry().intern('player', href_id(row[3].a['href']),
+                                                                    row[3].a.string)[0]
                 if row[-1].a is not None:
                     draft_dict['college_stats_link'] = row[-1].a['href']
                 else:
@@ -119,63 +190,18 @@ class TeamData:
                 draft_list.append(draft_dict)
         return draft_list
 
+    @timed_table
     def team_stats(self):
         div = self.soup_team.find('div', {'id': 'all_team_stats'})
-        rows = div.find_all('tr')[2:4]
-        stat_list = []
-        for row_cont in rows:
-            cont = row_cont.contents
-            stat_dict = {}
-            for i in cont:
-                if i.string is None:
-                    stat_dict[i['data-stat']] = 0
-                elif re.search('[:a-zA-Z]', i.string) is None:
-                    stat_dict[i['data-stat']] = float(i.string)
-                elif i['data-stat'] == 'start_avg':
-                    start_avg_str = cont[-5].string.split()
-                    stat_dict['start_avg'] = float(start_avg_str[-1])
-                    if start_avg_str[0].find('Own') > -1:
-                        stat_dict['start_avg'] += 50
-                elif i['data-stat'] == 'time_avg':
-                    time_avg_str = cont[-4].string.split(':')
-                    stat_dict['time_avg_sec'] = int(time_avg_str[0]) * 60 + int(time_avg_str[1])
-            stat_list.append(stat_dict)
-        return stat_list
+        return self.table_specs['team_stats'].decode(table_markup(div))
 
+    @timed_table
     def team_game_results(self):
         div = self.soup_team.find('div', {'id': 'all_games'})
-        rows = div.find_all('tr')[2:]
-        stat_list = []
-        for row_cont in rows:
-            cont = row_cont.contents
-            if cont[1].string is not None:
-                stat_dict = {}
-                for i in cont:
-                    if i.string is None:
-                        stat_dict[i['data-stat']] = 0
-                    elif i['data-stat'] == 'boxscore_word':
-                        stat_dict['game_url'] = self.bs_pg + i.a['href']
-                    elif i['data-stat'] == 'opp':
-                        stat_dict['opp_name'] = i.string
-                        stat_dict['opp_id'] = i.a['href'].split('/')[-2]
-                    else:
-                        stat_dict[i['data-stat']] = i.string
-                stat_list.append(stat_dict)
-        return stat_list
+        return self.table_specs['team_game_results'].decode(table_markup(div))
 
+    @timed_table
     def team_conversion(self):
         div = self.soup_team.find('div', {'id': 'all_team_conversions'})
-        rows = div.find_all('tr')[2:4]
-        stat_list = []
-        for row_cont in rows:
-            cont = row_cont.contents
-            stat_dict = {}
-            for i in cont:
-                if i.string is None:
-                    stat_dict[i['data-stat']] = 0
-                else:
-                    stat_dict[i['data-stat']] = i.string
-            stat_list.append(stat_dict)
-        return stat_list
-
+        return self.table_specs['team_conversion'].decode(table_markup(div))
 
@@ -1,11 +1,13 @@
 import sys
 import os
-sys.path.append('/home/msnow/git/fantasy_football/src/src_data/')
+if __name__ == "__main__" and not __package__:
+    # Run as a plain script, python src/data/testing.py, so put the repo root on the path for the src imports below
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from game_data import *
-from season_data import *
-from week_data import *
-from team_data import *
+from src.data.game_data import *
+from src.data.season_data import *
+from src.data.week_data import *
+from src.data.team_data import *
 
 # gurl = 'https://www.pro-football-reference.com//boxscores/201709070nwe.htm'
 bs_pth = '/home/msnow/git/fantasy_football/data/external/game_data/2017/'
@@ -39,4 +41,4 @@ bs_pth = '/home/msnow/git/fantasy_football/data/external/game_data/2017/'
 td = TeamData(year=2017, loc=bs_pth)
 td.draft
 
-# self.year + ' ' + [i].string
\ No newline at end of file
+# self.year + ' ' + [i].string
@@ -0,0 +1,202 @@
+"""
+SQLite warehouse for the extracted tables, one sql table per extract_rows table, typed from export.table_schemas
+
+    with Warehouse('data/interim/ff.db') as wh:
+        wh.load_partitions('data/interim')
+        wh.create_indexes()
+        wh.player_game_log('BradTo00')
+"""
+from datetime import datetime as dt
+import json
+import os
+import sqlite3
+from src.data.export import BIG_INT, DATETIME, FLOAT, INT, _convert, table_columns
+
+_sql_types = {INT: 'INTEGER', BIG_INT: 'INTEGER', FLOAT: 'REAL', DATETIME: 'TEXT'}
+
+# Every table gets an index on whichever of these it has, the stats tables keep the team id in team
+index_keys = [('game_id',), ('player_id',), ('team_id',), ('team',), ('season', 'week'), ('year', 'week')]
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_val(val, col_type):
+    val = _convert(val, col_type)
+    # sqlite has no datetime type, iso strings sort and compare the same way
+    return val.isoformat(sep=' ') if isinstance(val, dt) else val
+
+
+class Warehouse:
+    """
+    Bulk loads lists of row dicts into a local SQLite file
+    Rows go in batch_size at a time, one transaction per batch, and a column a later batch brings along is added to
+    the table on the fly. Build the indexes with create_indexes once the bulk load is done, it's much faster than
+    keeping them up to date row by row
+    Loading a season (or season and week) again replaces what the last load put there, so re-running a load never
+    duplicates rows
+    """
+
+    def __init__(self, path, batch_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._columns = {}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def tables(self):
+        return [name for name, in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+    def table_columns(self, table):
+        if table not in self._columns:
+            self._columns[table] = [row[1] for row in self.conn.execute(f'PRAGMA table_info({_quote(table)})')]
+        return self._columns[table]
+
+    def _ensure_table(self, table, columns):
+        existing = self.table_columns(table)
+        if not existing:
+            col_defs = ', '.join(f'{_quote(col)} {_sql_types.get(col_type, "TEXT")}' for col, col_type in columns)
+            self.conn.execute(f'CREATE TABLE {_quote(table)} ({col_defs})')
+        else:
+            for col, col_type in columns:
+                if col not in existing:
+                    self.conn.execute(f'ALTER TABLE {_quote(table)} ADD COLUMN {_quote(col)} '
+                                      f'{_sql_types.get(col_type, "TEXT")}')
+        self._columns.pop(table)
+
+    def delete(self, table, season, week=None):
+        """
+        Deletes table's rows of season, or of season and week, returns the number deleted
+        """
+        existing = self.table_columns(table)
+        if 'season' not in existing or (week is not None and 'week' not in existing):
+            return 0
+        where, params = ('"season" = ?', (season,)) if week is None else ('"season" = ? AND "week" = ?', (season, week))
+        with self.conn:
+            return self.conn.execute(f'DELETE FROM {_quote(table)} WHERE {where}', params).rowcount
+
+    def load(self, table, rows, season=None, week=None):
+        """
+        Inserts rows (a list of dicts) into table, tagged with season and week when they're given, in place of the
+        rows an earlier load tagged with them
+        Returns the number of rows inserted
+        """
+        if season is not None:
+            self.delete(table, season, week)
+        if not rows:
+            return 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            columns = table_columns(table, batch)
+            if season is not None or any('season' in row for row in batch):
+                # pipeline rows come tagged already
+                declared = set(col for col, _ in columns)
+                columns = columns + [(col, INT) for col in ['season', 'week'] if col not in declared]
+            tags = {col: val for col, val in [('season', season), ('week', week)] if val is not None}
+            with self.conn:
+                self._ensure_table(table, columns)
+                names = ', '.join(_quote(col) for col, _ in columns)
+                marks = ', '.join('?' * len(columns))
+                self.conn.executemany(
+                    f'INSERT INTO {_quote(table)} ({names}) VALUES ({marks})',
+                    ([_sql_val(tags[col] if col in tags else row.get(col), col_type) for col, col_type in columns]
+                     for row in batch))
+        return len(rows)
+
+    def load_rows(self, table_rows, season=None, week=None):
+        """
+        Loads the output of a page class' extract_rows, returns the number of rows inserted per table
+        """
+        return {table: self.load(table, table_rows[table], season, week) for table in sorted(table_rows)}
+
+    def load_partitions(self, in_dir):
+        """
+        Loads the json lines partitions pipeline.ingest_seasons writes (<table>/season=<year>.jsonl), each in place of
+        the season an earlier load put in its table
+        Returns the number of rows inserted per (table, season file)
+        """
+        row_cts = {}
+        for table in sorted(os.listdir(in_dir)):
+            if not os.path.isdir(os.path.join(in_dir, table)):
+                continue
+            for name in sorted(os.listdir(os.path.join(in_dir, table))):
+                if not name.endswith('.jsonl'):
+                    continue
+                self.delete(table, int(name[len('season='):-len('.jsonl')]))
+                row_ct = 0
+                with open(os.path.join(in_dir, table, name)) as file:
+                    batch = []
+                    for line in file:
+                        batch.append(json.loads(line))
+                        if len(batch) == self.batch_size:
+                            row_ct += self.load(table, batch)
+                            batch = []
+                    row_ct += self.load(table, batch)
+                row_cts[(table, name)] = row_ct
+        return row_cts
+
+    def load_registry(self, registry):
+        """
+        Writes an IdRegistry's codes, ids and names to one table per kind (player_ids, team_ids, ...), replacing what
+        was there
+        """
+        row_cts = {}
+        with self.conn:
+            for kind in registry.kinds:
+                table = kind + '_ids'
+                self.conn.execute(f'DROP TABLE IF EXISTS {_quote(table)}')
+                self.conn.execute(f'CREATE TABLE {_quote(table)} (code INTEGER PRIMARY KEY, {_quote(kind + "_id")} '
+                                  f'TEXT UNIQUE, {_quote(kind + "_name")} TEXT)')
+                self.conn.executemany(f'INSERT INTO {_quote(table)} VALUES (?, ?, ?)',
+                                      ((code, id_str, name) for code, (id_str, name)
+                                       in enumerate(zip(registry.ids[kind], registry.names[kind]))))
+                self._columns.pop(table, None)
+                row_cts[table] = len(registry.ids[kind])
+        return row_cts
+
+    def create_indexes(self):
+        """
+        Indexes every table on its game, player and team ids and season/week, returns the names of the indexes
+        """
+        created = []
+        for table in self.tables():
+            existing = set(self.table_columns(table))
+            for key in index_keys:
+                if set(key) <= existing:
+                    name = f'ix_{table}_{"_".join(key)}'
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS {_quote(name)} ON {_quote(table)} '
+                                      f'({", ".join(_quote(col) for col in key)})')
+                    created.append(name)
+        self.conn.execute('ANALYZE')
+        self.conn.commit()
+        return created
+
+    def query(self, sql, params=()):
+        """
+        Runs sql and returns the rows as dicts
+        """
+        cursor = self.conn.execute(sql, params)
+        names = [desc[0] for desc in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def player_game_log(self, player_id, table='player_offense'):
+        # One row per game the player has in table, oldest first
+        return self.query(f'SELECT * FROM {_quote(table)} WHERE player_id = ? ORDER BY game_id', (player_id,))
+
+    def team_drives(self, team_id, season=None):
+        if season is None:
+            return self.query('SELECT * FROM drives WHERE team_id = ? ORDER BY game_id, drive_num', (team_id,))
+        return self.query('SELECT * FROM drives WHERE team_id = ? AND season = ? ORDER BY game_id, drive_num',
+                          (team_id, season))
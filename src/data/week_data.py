@@ -1,7 +1,9 @@
-from urllib import request
-from bs4 import BeautifulSoup, Comment
 import os
 from datetime import datetime
+from src.data.crawler import fetch_page
+from src.data.instrument import timed_table
+from src.data.page_parser import comment_table, parse_page, soup_parser
+from src.data.registry import default_registry, href_id
 
 
 class WeekData:
@@ -20,47 +22,95 @@ class WeekData:
         },
     }
 
-    def __init__(self, year, week, loc=None):
+    def __init__(self, year, week, loc=None, parser=None):
         self.year = str(year)
         self.week = str(week)
         self.loc = loc
+        self.parser = soup_parser(parser)
         self.soup = self.week_soup()
 
     def week_soup(self):
         if self.loc is None:
-            pg = request.urlopen(f'{self.bs_pg_yrs}{self.year}/week_{self.week}.htm')
-            soup = BeautifulSoup(pg, 'html.parser')
+            pg = fetch_page(f'{self.bs_pg_yrs}{self.year}/week_{self.week}.htm')
+            soup = parse_page(pg, self.parser)
         else:
-            soup = BeautifulSoup(open(os.path.join(self.loc, f'week_{self.week}.htm')), 'html.parser')
+            soup = parse_page(open(os.path.join(self.loc, f'week_{self.week}.htm')), self.parser)
         return soup
 
+    def close(self):
+        # Decomposes the page, the tables already extracted don't depend on it
+        if self.soup is not None:
+            self.soup.decompose()
+            self.soup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def extract_rows(self, tables=None):
+        """
+        Every table in tables (table_dict keys or player_stat div ids) as a list of row dicts, the player_stat tables
+        are named week_ plus their div id without the all_ prefix
+        """
+        if tables is None:
+            tables = list(self.table_dict)
+        rows = {}
+        for table in tables:
+            if table == 'week_summaries':
+                rows[table] = self.week_summaries
+            elif table == 'potw':
+                rows[table] = [self.potw]
+            elif table == 'player_stat' or table in self.table_dict['player_stat']:
+                div_ids = list(self.table_dict['player_stat']) if table == 'player_stat' else [table]
+                for div_id in div_ids:
+                    if self.soup.find('div', {'id': div_id}) is not None:
+                        rows['week_' + div_id[4:]] = self.player_stat(div_id)
+            else:
+                raise KeyError('Table Not in List of Tables')
+        for table in rows:
+            rows[table] = [{k: str(v) if isinstance(v, str) else v for k, v in row.items()} for row in rows[table]]
+        return rows
+
     @property
+    @timed_table
     def week_summaries(self):
         div_val = self.soup.find('div', {'class': 'game_summaries'})
         summ = div_val.find_all('div', {'class': 'game_summary expanded nohover'})
         summ_list = []
+        registry = default_registry()
         for idx in range(15):
             summ_dict = {}
             summ_dict['date'] = str(
                 datetime.strptime(summ[idx].find('tr', {'class': 'date'}).string, '%b %d, %Y').date())
             summ_dict['winning_team'] = summ[idx].find('tr', {'class': 'winner'}).find('td').string
-            summ_dict['winning_team_id'] = summ[idx].find('tr', {'class': 'winner'}).find('td').a['href'].split('/')[-2]
-            summ_dict['wining_team_score'] = summ[idx].find('tr', {'class': 'winner'}).find('td',
-                                                                                           {'class': 'right'}).string
+            summ_dict['winning_team_id'] = registry.intern(
+                'team', summ[idx].find('tr', {'class': 'winner'}).find('td').a['href'].split('/')[-2])[0]
+            summ_dict['wining_team_score'] = summ[idx].find('tr', {'class': 'winner'}).find(
+                'td', {'class': 'right'}).string
             summ_dict['boxscore'] = summ[idx].find(text='Final').parent['href']
             summ_dict['losing_team'] = summ[idx].find('tr', {'class': 'loser'}).find('td').string
-            summ_dict['losing_team_id'] = summ[idx].find('tr', {'class': 'loser'}).find('td').a['href'].split('/')[-2]
+            summ_dict['losing_team_id'] = registry.intern(
+                'team', summ[idx].find('tr', {'class': 'loser'}).find('td').a['href'].split('/')[-2])[0]
             leaders = summ[idx].find('table', {'class': 'stats'}).find_all('td')
             for i in range(0, 9, 3):
                 title = leaders[i].string
-                summ_dict[title + '_leader'] = leaders[i + 1].a['title']
-                summ_dict[title + '_leader_id'] = leaders[i + 1].a['href'].split('/')[-1].split('.')[0]
+                summ_dict[title + '_leader_id'], summ_dict[title + '_leader'] = registry.intern(
+                    'player', href_id(leaders[i + 1].a['href']), leaders[i + 1].a['title'])
                 summ_dict[title + '_leader_team_id'] = leaders[i + 1].contents[-1][1:].lower()
                 summ_dict[title + '_leader_value'] = int(leaders[i + 2].string)
             summ_list.append(summ_dict)
         return summ_list
 
     @property
+    def game_urls(self):
+        # Boxscore urls of every game that week, in the order they're listed
+        div_val = self.soup.find('div', {'class': 'game_summaries'})
+        return [self.bs_pg + td.a['href'] for td in div_val.find_all('td', {'class': 'gamelink'})]
+
+    @property
+    @timed_table
     def potw(self):
         div_val = self.soup.find('div', {'id': 'all_potw'})
         rows = div_val.find_all('tr')
@@ -70,23 +120,23 @@ class WeekData:
             for idx in range(1, 4):
                 potw_dict[conf + '_' + rows[jdx].contents[idx]['data-stat'] + '_name'] = rows[1].contents[idx].a.string
                 potw_dict[conf + '_' + rows[jdx].contents[idx]['data-stat'] + '_id'] = \
-                    rows[1].contents[idx].a['href'].split('/')[-1].split('.')[0]
+                    href_id(rows[1].contents[idx].a['href'])
         return potw_dict
 
+    @timed_table
     def player_stat(self, stat_div):
         div_val = self.soup.find('div', {'id': stat_div})
-        comments = div_val.find_all(string=lambda text: isinstance(text, Comment))
-        table = BeautifulSoup(str(comments), 'lxml')
+        table = comment_table(div_val, self.parser)
         stat_list = []
+        registry = default_registry()
         for rows in table.find_all('tr')[1:]:
             conts = rows.contents
             stat_dict = {}
-            stat_dict['player_name'] = conts[0].a.string
-            stat_dict['player_id'] = conts[0].a['href'].split('/')[-1].split('.')[0]
+            stat_dict['player_id'], stat_dict['player_name'] = registry.link('player', conts[0].a)
             stat_dict['date'] = conts[1].string
             stat_dict['boxscore'] = conts[1].a['href']
-            stat_dict['team_id'] = conts[2].string.lower()
-            stat_dict['opp_id'] = conts[4].string.lower()
+            stat_dict['team_id'] = registry.intern('team', conts[2].string.lower())[0]
+            stat_dict['opp_id'] = registry.intern('team', conts[4].string.lower())[0]
             result = conts[5].string
             result_score = result.split()[-1].split('-')
             if result[0] == 'W':
@@ -98,6 +148,7 @@ class WeekData:
             for idx in range(6, len(conts)):
                 stat_dict[conts[idx]['data-stat']] = float(conts[idx].string)
             stat_list.append(stat_dict)
+        table.decompose()
         return stat_list
 
     abbrev_dict = {
@@ -123,4 +174,4 @@ class WeekData:
         'pass_defended': 'Passes defended by a defensive player',
         'sacks': 'Sacks',
         'fumbles_forced': 'Number of times forced a fumble by the opposition recovered by either team'
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,372 @@
+"""
+Fantasy scoring over whole stat tables at once
+
+    scorer = Scorer(league_formats.values())
+    points = scorer.score(gd.stats_table('all_player_offense'))   # one row per player, one column per league
+
+A table is a stats_table list of dicts, a pandas DataFrame, a StatBatch or a dict of numpy arrays. Players' offense,
+returns and kicking rows of the same game are summed into one row with combine before scoring
+
+History and history_features build the lag, lead, cumulative and exponentially weighted features over a player's
+seasons or weeks
+"""
+import numpy as np
+
+
+class RuleSet:
+    """
+    How one league scores, declared rather than written out as arithmetic
+    points maps a stat (a stats_table data-stat, e.g., pass_yds) to the points per unit of it
+    bonuses are (stat, low, high, points), points awarded once when low <= stat <= high, high None being no upper
+    bound, e.g., ('rush_yds', 100, None, 3) or a points allowed tier ('points_allowed', 1, 6, 7)
+    """
+
+    def __init__(self, name, points, bonuses=()):
+        self.name = name
+        self.points = dict(points)
+        self.bonuses = list(bonuses)
+
+    def extend(self, name, points=None, bonuses=()):
+        # A new rule set with some points changed or added and more bonuses, e.g., PPR from standard
+        return RuleSet(name, dict(self.points, **(points or {})), self.bonuses + list(bonuses))
+
+    @classmethod
+    def from_dict(cls, rules):
+        # From json, {"name": ..., "points": {...}, "bonuses": [[stat, low, high, points], ...]}
+        return cls(rules['name'], rules['points'], [tuple(bonus) for bonus in rules.get('bonuses', [])])
+
+    def to_dict(self):
+        return {'name': self.name, 'points': self.points, 'bonuses': [list(bonus) for bonus in self.bonuses]}
+
+
+# The notebooks' ff_score, misses cost a point and a made field goal nets 4
+standard = RuleSet('standard', {
+    'pass_yds': 0.04, 'pass_td': 4, 'pass_int': -2,
+    'rush_yds': 0.1, 'rush_td': 6,
+    'rec_yds': 0.1, 'rec_td': 6,
+    'kick_ret_td': 6, 'punt_ret_td': 6,
+    'xpm': 2, 'xpa': -1, 'fgm': 5, 'fga': -1,
+})
+
+league_formats = {
+    'standard': standard,
+    'half_ppr': standard.extend('half_ppr', {'rec': 0.5}),
+    'ppr': standard.extend('ppr', {'rec': 1}),
+    'ppr_bonus': standard.extend('ppr_bonus', {'rec': 1, 'fumbles_lost': -2}, [
+        ('pass_yds', 300, None, 3), ('rush_yds', 100, None, 3), ('rec_yds', 100, None, 3)]),
+    'idp': standard.extend('idp', {
+        'tackles_solo': 1, 'tackles_assists': 0.5, 'sacks': 2, 'def_int': 3, 'pass_defended': 1,
+        'fumbles_forced': 2, 'fumbles_rec': 2, 'def_int_td': 6, 'fumbles_rec_td': 6}),
+}
+
+# Team defense, scored on team totals (see combine and points_allowed) like the notebooks' team ff_score
+dst = RuleSet('dst', {
+    'sacks': 1, 'def_int': 2, 'fumbles_rec': 2, 'def_int_td': 6, 'fumbles_rec_td': 6, 'kick_ret_td': 6,
+    'punt_ret_td': 6,
+}, [('points_allowed', 0, 0, 10), ('points_allowed', 1, 6, 7), ('points_allowed', 7, 13, 4),
+    ('points_allowed', 14, 20, 1), ('points_allowed', 28, 34, -1), ('points_allowed', 35, None, -4)])
+
+
+def _row_count(table):
+    if isinstance(table, list):
+        return len(table)
+    if hasattr(table, 'row_ct'):
+        return table.row_ct
+    if hasattr(table, 'shape'):
+        return table.shape[0]
+    return len(next(iter(table.values()))) if table else 0
+
+
+def _has_column(table, col):
+    if isinstance(table, list):
+        return any(col in row for row in table)
+    if hasattr(table, 'row_ct'):
+        return col in table.columns
+    return col in table
+
+
+def stat_column(table, stat):
+    """
+    One stat of table as a float32 array, 0 where the stat is missing or the table doesn't have it
+    """
+    row_ct = _row_count(table)
+    if not _has_column(table, stat):
+        return np.zeros(row_ct, np.float32)
+    if isinstance(table, list):
+        col = np.fromiter((row.get(stat) or 0 for row in table), np.float32, row_ct)
+    elif hasattr(table, 'row_ct'):
+        # A StatBatch, read straight from its buffers
+        col = np.frombuffer(table.columns[stat], np.float32).copy()
+        col[np.frombuffer(table.masks[stat], np.bool_)] = 0
+    else:
+        col = table[stat]
+        col = col.to_numpy(np.float32, na_value=0) if hasattr(col, 'to_numpy') else np.asarray(col, np.float32)
+    # -999 is how the scrapers mark a missing value
+    return np.where(np.isnan(col) | (col == -999), np.float32(0), col)
+
+
+def key_column(table, col):
+    # One key column (player_id, team, game_id, ...) of table as an object array
+    if isinstance(table, list):
+        return np.array([row.get(col) for row in table], dtype=object)
+    if hasattr(table, 'row_ct'):
+        categories = table.registry.ids[table.kinds[col]] if col in table.kinds else table.categories[col]
+        categories = np.array(list(categories) + [None], dtype=object)
+        return categories[np.frombuffer(table.columns[col], np.int32)]
+    col = table[col]
+    return np.asarray(col.to_numpy(object) if hasattr(col, 'to_numpy') else col, dtype=object)
+
+
+def stat_matrix(table, stats):
+    """
+    table as a float32 matrix, one row per row and one column per stat in stats
+    """
+    mat = np.empty((_row_count(table), len(stats)), np.float32)
+    for idx, stat in enumerate(stats):
+        mat[:, idx] = stat_column(table, stat)
+    return mat
+
+
+def combine(tables, stats, keys=('player_id', 'game_id')):
+    """
+    Sums the stats of several tables into one row per key, e.g., a player's offense, returns and kicking rows of a
+    game, or with keys=('team', 'game_id') a team's defense
+    Returns (key rows, matrix), key rows being an object array with a column per key, in the order first seen
+    """
+    key_idx = {}
+    codes = []
+    for table in tables:
+        key_cols = [key_column(table, key) for key in keys]
+        codes.append(np.fromiter((key_idx.setdefault(key, len(key_idx)) for key in zip(*key_cols)), np.int64,
+                                 _row_count(table)))
+    mat = np.zeros((len(key_idx), len(stats)), np.float32)
+    for table, table_codes in zip(tables, codes):
+        np.add.at(mat, table_codes, stat_matrix(table, stats))
+    key_rows = np.empty((len(key_idx), len(keys)), dtype=object)
+    if key_idx:
+        key_rows[:] = list(key_idx)
+    return key_rows, mat
+
+
+def points_allowed(scorebox_rows):
+    """
+    (team, game_id, points_allowed) rows from GameData scorebox dicts, to combine with the defense and returns
+    tables before scoring dst
+    """
+    rows = []
+    for scrbox in scorebox_rows:
+        for team, opp in [('home', 'away'), ('away', 'home')]:
+            rows.append({'team': scrbox[team + '_team_id'], 'game_id': scrbox['game_id'],
+                         'points_allowed': scrbox[opp + '_team_score']})
+    return rows
+
+
+class Scorer:
+    """
+    Scores tables under many rule sets in one pass
+    The rule sets are compiled once into a (stat x rule set) weight matrix, and the bonuses into a (band x rule set)
+    one, so scoring is a matrix product plus one comparison per distinct bonus band, no matter how many leagues
+    """
+
+    def __init__(self, rule_sets):
+        rule_sets = list(rule_sets)
+        self.names = [rule_set.name for rule_set in rule_sets]
+        self.bands = sorted(set((stat, low, high) for rule_set in rule_sets for stat, low, high, _ in rule_set.bonuses),
+                            key=lambda band: (band[0], band[1], float('inf') if band[2] is None else band[2]))
+        self.stats = sorted(set(stat for rule_set in rule_sets for stat in rule_set.points)
+                            | set(stat for stat, _, _ in self.bands))
+        stat_idx = {stat: idx for idx, stat in enumerate(self.stats)}
+        band_idx = {band: idx for idx, band in enumerate(self.bands)}
+        self.weights = np.zeros((len(self.stats), len(rule_sets)), np.float32)
+        self.band_weights = np.zeros((len(self.bands), len(rule_sets)), np.float32)
+        for jdx, rule_set in enumerate(rule_sets):
+            for stat, pts in rule_set.points.items():
+                self.weights[stat_idx[stat], jdx] = pts
+            for stat, low, high, pts in rule_set.bonuses:
+                self.band_weights[band_idx[(stat, low, high)], jdx] += pts
+        self._band_cols = [(stat_idx[stat], low, high) for stat, low, high in self.bands]
+
+    def score_matrix(self, mat):
+        """
+        Points for a matrix whose columns are self.stats, one row per row and one column per rule set
+        """
+        points = mat @ self.weights
+        if self.bands:
+            in_band = np.empty((mat.shape[0], len(self.bands)), np.float32)
+            for idx, (col, low, high) in enumerate(self._band_cols):
+                hit = mat[:, col] >= low
+                if high is not None:
+                    hit &= mat[:, col] <= high
+                in_band[:, idx] = hit
+            points += in_band @ self.band_weights
+        return points
+
+    def score(self, table):
+        return self.score_matrix(stat_matrix(table, self.stats))
+
+    def score_dict(self, table):
+        # {rule set name: points array}
+        points = self.score(table)
+        return {name: points[:, idx] for idx, name in enumerate(self.names)}
+
+
+def period_index(season, week):
+    """
+    Numbers the (season, week) pairs in the data 0, 1, 2, ... in order, so week histories can lag across the
+    offseason, week 1 of a season comes right after the last week played in the season before
+    """
+    season = np.asarray(season, np.int64)
+    week = np.asarray(week, np.int64)
+    _, idx = np.unique(season * 1000 + week, return_inverse=True)
+    return idx.reshape(-1)
+
+
+class History:
+    """
+    Per entity (player or team) histories over periods (seasons, or weeks numbered with period_index)
+    The rows are sorted by entity and period once and each entity/period pair becomes one int64 key, every feature
+    is then a few vectorized passes over that order and comes back in the caller's row order
+    lag and lead go by period, so a player who sat out a season has no value one season back rather than the one from
+    the season before the gap, prev and next go by the entity's rows whatever periods they're in
+    """
+
+    def __init__(self, entity, period):
+        _, codes = np.unique(np.asarray(entity, dtype=object).astype(str), return_inverse=True)
+        codes = codes.reshape(-1).astype(np.int64)
+        period = np.asarray(period, np.int64)
+        self.order = np.lexsort((period, codes))
+        self.codes = codes[self.order]
+        self.periods = period[self.order]
+        span = int(self.periods.max() - self.periods.min()) + 1 if len(period) else 1
+        self.keys = self.codes * span + (self.periods - (self.periods.min() if len(period) else 0))
+        if len(self.keys) > 1 and not np.all(np.diff(self.keys) > 0):
+            raise KeyError('Entity Period Not Unique')
+        # Where each row's entity starts and ends in the sorted order
+        starts = np.flatnonzero(np.r_[True, self.codes[1:] != self.codes[:-1]])
+        ends = np.r_[starts[1:], len(self.codes)]
+        group_lens = ends - starts
+        self.group_start = np.repeat(starts, group_lens)
+        self.group_end = np.repeat(ends, group_lens)
+        self.position = np.arange(len(self.codes)) - self.group_start
+
+    def _sorted(self, values):
+        return np.asarray(values, np.float64)[self.order]
+
+    def _unsort(self, sorted_vals):
+        vals = np.empty_like(sorted_vals)
+        vals[self.order] = sorted_vals
+        return vals
+
+    def _shift_period(self, values, k, fill):
+        vals = self._sorted(values)
+        target = self.keys - k
+        idx = np.searchsorted(self.keys, target)
+        idx_ok = np.minimum(idx, len(self.keys) - 1)
+        found = (idx < len(self.keys)) & (self.keys[idx_ok] == target) & (self.codes[idx_ok] == self.codes)
+        return self._unsort(np.where(found, vals[idx_ok], fill))
+
+    def lag(self, values, k=1, fill=np.nan):
+        # The entity's value k periods before, fill when it has no row then
+        return self._shift_period(values, k, fill)
+
+    def lead(self, values, k=1, fill=np.nan):
+        # The entity's value k periods after, e.g., next season's score as the target
+        return self._shift_period(values, -k, fill)
+
+    def _shift_row(self, values, k, fill):
+        vals = self._sorted(values)
+        idx = np.arange(len(vals)) - k
+        found = (idx >= self.group_start) & (idx < self.group_end)
+        return self._unsort(np.where(found, vals[np.clip(idx, 0, max(len(vals) - 1, 0))], fill))
+
+    def prev(self, values, k=1, fill=np.nan):
+        # The entity's k-th previous row, however many periods back
+        return self._shift_row(values, k, fill)
+
+    def next(self, values, k=1, fill=np.nan):
+        return self._shift_row(values, -k, fill)
+
+    def count(self):
+        # Rows the entity has before this one, the notebooks' season_number
+        return self._unsort(self.position)
+
+    def remaining(self):
+        # Rows the entity has after this one, 0 on its last
+        return self._unsort(self.group_end - self.group_start - self.position - 1)
+
+    def since_first(self):
+        # Periods since the entity's first row, the notebooks' year - first_season
+        return self._unsort(self.periods - self.periods[self.group_start])
+
+    def cumsum(self, values, exclusive=True):
+        """
+        Running total of values over the entity's rows, exclusive leaves out the row itself so the feature only
+        sees the past
+        """
+        vals = np.nan_to_num(self._sorted(values))
+        totals = np.cumsum(vals)
+        before_group = np.r_[0, totals][self.group_start]
+        running = totals - before_group
+        if exclusive:
+            running = running - vals
+        return self._unsort(running)
+
+    def cummean(self, values, exclusive=True, fill=np.nan):
+        counts = self.position + (0 if exclusive else 1)
+        totals = self._sorted(self.cumsum(values, exclusive))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._unsort(np.where(counts > 0, totals / counts, fill))
+
+    def ewm(self, values, halflife, exclusive=True, fill=np.nan):
+        """
+        Exponentially weighted mean of the entity's values, a value halflife periods old counts half as much as
+        the current one, gaps decay it too. exclusive is the mean as of the start of the row's period
+        s_i = a_i * s_(i-1) + v_i is solved for every entity at once with a doubling scan, log2(rows) vectorized
+        passes, the weights (a <= 1) never overflow however long the history
+        """
+        vals = np.nan_to_num(self._sorted(values))
+        gaps = np.diff(self.periods, prepend=0).astype(np.float64)
+        decay = np.where(self.position > 0, 0.5 ** (gaps / halflife), 0.0)
+        totals = _linear_scan(decay, vals)
+        weights = _linear_scan(decay, np.ones_like(vals))
+        if exclusive:
+            # Carry the previous row's state forward to this row's period
+            prev_ok = self.position > 0
+            totals = np.where(prev_ok, decay * np.r_[0, totals[:-1]], 0)
+            weights = np.where(prev_ok, decay * np.r_[0, weights[:-1]], 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._unsort(np.where(weights > 0, totals / weights, fill))
+
+
+def _linear_scan(mult, add):
+    # s_i = mult_i * s_(i-1) + add_i for every i, mult_i = 0 starts a new segment
+    mult = mult.copy()
+    total = add.copy()
+    offset = 1
+    while offset < len(total):
+        total[offset:] = mult[offset:] * total[:-offset] + total[offset:]
+        mult[offset:] = mult[offset:] * mult[:-offset]
+        offset *= 2
+    return total
+
+
+def history_features(frame, columns, entity='player_id', period='year', lags=(1, 2, 3, 4), leads=(1,),
+                     halflife=None, fill=np.nan):
+    """
+    The notebooks' history features for a frame with one row per entity per period, added as new columns
+    <col>_m<k> is col k periods back, <col>_p<k> k periods ahead, <col>_ewm its exponentially weighted history and
+    <col>_cummean its mean over every earlier row, plus season_number (the entity's earlier rows) and
+    periods_since_first
+    """
+    hist = History(frame[entity].to_numpy(), frame[period].to_numpy())
+    features = {'season_number': hist.count(), 'periods_since_first': hist.since_first()}
+    for col in columns:
+        vals = frame[col].to_numpy(np.float64)
+        for k in lags:
+            features[f'{col}_m{k}'] = hist.lag(vals, k, fill)
+        for k in leads:
+            features[f'{col}_p{k}'] = hist.lead(vals, k, fill)
+        features[f'{col}_cummean'] = hist.cummean(vals, fill=fill)
+        if halflife is not None:
+            features[f'{col}_ewm'] = hist.ewm(vals, halflife, fill=fill)
+    return frame.assign(**features)
@@ -0,0 +1,209 @@
+"""
+Rolling per player features, updated a week at a time
+
+    store = FeatureStore.load('data/processed/rolling.npz')
+    store.fold_week(2017, 5, week_rows)      # the week's GameData extract_rows, all games' rows per table
+    store.save()
+    store.features()
+
+Only the players in the new week are touched, so a refresh costs the same after one season or twenty
+"""
+import argparse
+import json
+import os
+import numpy as np
+from src.data.atomic import atomic_write
+from src.features.build_features import Scorer, combine, league_formats
+
+
+class FeatureStore:
+    """
+    Running features for every player, keyed by player_id
+    Per stat it keeps the games played, mean and variance (Welford's update), an exponentially weighted mean and
+    the last last_n games. The store keeps its own clock in weeks (week_ct), the EWMA decays by the weeks on it
+    since the player's last game. A week that's never folded in still moves the clock, while the offseason counts as
+    one week, as with build_features.period_index, so a season's week 1 comes right after the last week before it
+    State lives in one row per player of a few numpy arrays, saved to and loaded from a single npz file. The arrays
+    have room for more players than the store holds, only their first len(store) rows are players
+    """
+
+    stats = ('ff_points', 'offense_snaps', 'targets')
+    arrays = ('games', 'last_week', 'mean', 'm2', 'ewm_total', 'ewm_weight', 'recent')
+
+    def __init__(self, path=None, last_n=4, halflife=3, rule_set='standard'):
+        self.path = path
+        self.last_n = last_n
+        self.halflife = halflife
+        self.rule_set = rule_set
+        self.scorer = Scorer([league_formats[rule_set]])
+        self.player_ids = []
+        self.slots = {}
+        self.week_ct = 0
+        self.folded = []
+        stat_ct = len(self.stats)
+        self.games = np.zeros(0, np.int32)
+        self.last_week = np.zeros(0, np.int32)
+        self.mean = np.zeros((0, stat_ct))
+        self.m2 = np.zeros((0, stat_ct))
+        self.ewm_total = np.zeros((0, stat_ct))
+        self.ewm_weight = np.zeros((0, stat_ct))
+        self.recent = np.zeros((0, last_n, stat_ct), np.float32)
+        self._reserve(1)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def _reserve(self, size):
+        # Room for size players, capacity at least doubles so adding a few players a week is amortized O(new players)
+        # Rows past len(self) stay fresh (0s, recent NaN) until a new player is given one
+        capacity = len(self.games)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        for name in self.arrays:
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], np.nan if name == 'recent' else 0, old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _slots(self, player_ids):
+        # Slots for player_ids, new players get the next fresh row of every array
+        new_ids = [player_id for player_id in dict.fromkeys(player_ids) if player_id not in self.slots]
+        if new_ids:
+            self._reserve(len(self.player_ids) + len(new_ids))
+            for player_id in new_ids:
+                self.slots[player_id] = len(self.player_ids)
+                self.player_ids.append(player_id)
+        return np.fromiter((self.slots[player_id] for player_id in player_ids), np.int64, len(player_ids))
+
+    def update(self, player_ids, values, weeks=1):
+        """
+        Folds one new week into the store, values holding a row of self.stats per player in player_ids, weeks being
+        how far the clock moves from the last week folded
+        Every player appears once, the work is proportional to the number of players that week
+        """
+        values = np.asarray(values, np.float64)
+        slots = self._slots(list(player_ids))
+        self.week_ct += weeks
+        week = self.week_ct
+        # Welford, one step per player
+        self.games[slots] += 1
+        games = self.games[slots][:, None]
+        delta = values - self.mean[slots]
+        self.mean[slots] += delta / games
+        self.m2[slots] += delta * (values - self.mean[slots])
+        # EWMA, decayed by the weeks since the player last played, 0 for a first game
+        decay = np.where(self.last_week[slots] > 0, 0.5 ** ((week - self.last_week[slots]) / self.halflife), 0)
+        self.ewm_total[slots] = self.ewm_total[slots] * decay[:, None] + values
+        self.ewm_weight[slots] = self.ewm_weight[slots] * decay[:, None] + 1
+        self.last_week[slots] = week
+        # Last n games, newest first
+        self.recent[slots, 1:] = self.recent[slots, :-1]
+        self.recent[slots, 0] = values
+        return len(slots)
+
+    def fold_week(self, season, week, table_rows):
+        """
+        Folds in a week of GameData extract_rows output (table name to the rows of every game that week)
+        Fantasy points come from the player_offense, returns and kicking rows, offense snaps from the snap counts
+        and targets from player_offense
+        """
+        if (season, week) in self.folded:
+            raise KeyError('Week Already Folded')
+        if self.folded and (season, week) < self.folded[-1]:
+            raise KeyError('Week Folded Out of Order')
+        # Weeks since the last week folded, a new season starts one week after the last
+        weeks = week - self.folded[-1][1] if self.folded and self.folded[-1][0] == season else week
+        point_tables = [table_rows[table] for table in ['player_offense', 'returns', 'kicking'] if table in table_rows]
+        snap_tables = [table_rows[table] for table in ['home_snap_counts', 'vis_snap_counts'] if table in table_rows]
+        # One row per player for the week, a player who only shows up in some of the tables gets 0 for the rest
+        tables = point_tables + [[{'player_id': row['player_id'], 'offense_snaps': row.get('offense')} for row in rows]
+                                 for rows in snap_tables]
+        keys, mat = combine(tables, self.scorer.stats + ['offense_snaps', 'targets'], keys=('player_id',))
+        points = self.scorer.score_matrix(mat[:, :len(self.scorer.stats)])[:, 0]
+        values = np.column_stack([points, mat[:, -2], mat[:, -1]])
+        self.folded.append((season, week))
+        return self.update(keys[:, 0], values, weeks)
+
+    def features(self, player_ids=None):
+        """
+        A DataFrame of every player's (or just player_ids') features, <stat>_mean, _std, _ewm and _last<n> (the mean
+        of the last n games), plus games and weeks_since (weeks on the store's clock since the player's last game)
+        Players the store hasn't seen (every one, for an empty store) get 0 games, weeks_since -1 and NaN features
+        """
+        import pandas as pd
+        player_ids = self.player_ids if player_ids is None else list(player_ids)
+        known = np.array([player_id in self.slots for player_id in player_ids], np.bool_)
+        slots = np.array([self.slots.get(player_id, 0) for player_id in player_ids], np.int64)
+        games = np.where(known, self.games[slots], 0)
+        data = {'player_id': player_ids, 'games': games,
+                'weeks_since': np.where(known, self.week_ct - self.last_week[slots], -1)}
+        recent = self.recent[slots]
+        played = ~np.isnan(recent)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            recent_mean = np.where(played, recent, 0).sum(axis=1) / played.sum(axis=1)
+            for idx, stat in enumerate(self.stats):
+                data[stat + '_mean'] = np.where(games > 0, self.mean[slots, idx], np.nan)
+                data[stat + '_std'] = np.where(games > 1, np.sqrt(self.m2[slots, idx] / (games - 1)), np.nan)
+                data[stat + '_ewm'] = np.where(games > 0, self.ewm_total[slots, idx] / self.ewm_weight[slots, idx],
+                                               np.nan)
+                data[f'{stat}_last{self.last_n}'] = np.where(games > 0, recent_mean[:, idx], np.nan)
+        return pd.DataFrame(data)
+
+    def save(self, path=None):
+        path = path or self.path
+        meta = {'last_n': self.last_n, 'halflife': self.halflife, 'rule_set': self.rule_set, 'week_ct': self.week_ct,
+                'folded': self.folded, 'stats': list(self.stats)}
+        arrays = {name: getattr(self, name)[:len(self)] for name in self.arrays}
+        # A crash mid save leaves last week's state rather than none
+        with atomic_write(path) as file:
+            np.savez(file, meta=json.dumps(meta), player_ids=np.array(self.player_ids, dtype=str), **arrays)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        The store saved at path, or a new empty one (built with kwargs) if nothing has been saved there yet
+        """
+        if not os.path.exists(path):
+            return cls(path, **kwargs)
+        with np.load(path) as state:
+            meta = json.loads(str(state['meta']))
+            store = cls(path, last_n=meta['last_n'], halflife=meta['halflife'], rule_set=meta['rule_set'])
+            if tuple(meta['stats']) != store.stats:
+                raise KeyError('Stats Do Not Match')
+            store.player_ids = [str(player_id) for player_id in state['player_ids']]
+            store.slots = {player_id: idx for idx, player_id in enumerate(store.player_ids)}
+            store.week_ct = meta['week_ct']
+            store.folded = [tuple(season_week) for season_week in meta['folded']]
+            for name in store.arrays:
+                setattr(store, name, state[name])
+        store._reserve(len(store) + 1)
+        return store
+
+
+def week_rows(in_dir, season, week):
+    """
+    One week of the json lines partitions pipeline.ingest_seasons writes, as table name to rows
+    Only the week's rows are read, from the byte ranges in each partition's weeks index (see pipeline.read_week)
+    """
+    from src.data.pipeline import read_week
+    table_rows = {}
+    for table in sorted(os.listdir(in_dir)):
+        path = os.path.join(in_dir, table, f'season={season}.jsonl')
+        if os.path.exists(path):
+            rows = read_week(path, week)
+            if rows:
+                table_rows[table] = rows
+    return table_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("state", help="npz file the store is loaded from and saved back to")
+    parser.add_argument("year", type=int)
+    parser.add_argument("week", type=int)
+    parser.add_argument("-i", "--in_dir", help="Directory pipeline.ingest_seasons wrote to", default='data/interim')
+    args = parser.parse_args()
+    store = FeatureStore.load(args.state)
+    print(f'{store.fold_week(args.year, args.week, week_rows(args.in_dir, args.year, args.week))} players updated')
+    store.save()
@@ -0,0 +1,222 @@
+"""
+Projections from a model train_model saved, loaded once and kept in memory with its feature rows
+
+    predictor = Predictor.load('models/rf.pkl', 'data/processed/player_seasons.feather')
+    predictor.predict(['BradTo00', 'BrowAn04'], season=2018)
+
+or served to the lineup tools over http
+
+    python -m src.models.predict_model models/rf.pkl data/processed/player_seasons.feather -p 8050
+    curl 'localhost:8050/predict?season=2018&player_id=BradTo00&player_id=BrowAn04'
+
+Requests that arrive together are scored together, one model.predict call per batch
+"""
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import pickle
+import queue
+import threading
+import numpy as np
+from src.features.build_features import history_features
+from src.features.feature_store import week_rows
+from src.models.train_model import encode, read_frame
+
+
+class Predictor:
+    """
+    A fitted model and the encoded feature rows of every player season it can project from
+    The rows are built once, with the spec and categories the model was trained on, and kept as one float32 matrix.
+    The model predicts the period lead in its target (ff_score_p1, one season on), so a player's projection for a
+    season comes from their row exactly that many periods before it, a player without one has no projection. The
+    row to season lookups are built the first time a season is asked for and kept
+    """
+
+    def __init__(self, model, meta, frame):
+        self.model = model
+        self.meta = meta
+        spec = meta['spec']
+        frame = history_features(frame, spec['history'], spec['entity'], spec['period'], spec['lags'], spec['leads'],
+                                 spec['halflife'])
+        self.X = encode(frame, meta['columns'], meta['categories'], spec['fill'])
+        self.entities = frame[spec['entity']].astype(str).to_numpy()
+        self.periods = frame[spec['period']].to_numpy()
+        # How many periods ahead the target is, 1 for the default ff_score_p1
+        self.lead = next((k for col in spec['history'] for k in spec['leads'] if spec['target'] == f'{col}_p{k}'), 1)
+        self._rows = {}
+
+    @classmethod
+    def load(cls, model_path, source):
+        with open(model_path, 'rb') as file:
+            saved = pickle.load(file)
+        return cls(saved['model'], saved['meta'], read_frame(source))
+
+    def rows(self, season=None):
+        """
+        player_id to the index in X of the player's row lead periods before season (their latest row when season is
+        None), the row the model's target projects season from
+        """
+        if season not in self._rows:
+            keep = np.arange(len(self.periods)) if season is None else np.flatnonzero(
+                self.periods == season - self.lead)
+            # Sorted by period, later rows overwrite earlier ones
+            keep = keep[np.argsort(self.periods[keep], kind='stable')]
+            self._rows[season] = dict(zip(self.entities[keep], keep))
+        return self._rows[season]
+
+    def predict(self, player_ids=None, season=None):
+        """
+        {player_id: projection} for player_ids (every player with a row to project season from when None), one
+        predict call for all of them. Players without that row get None
+        """
+        rows = self.rows(season)
+        player_ids = list(rows) if player_ids is None else list(player_ids)
+        found = [player_id for player_id in player_ids if player_id in rows]
+        projections = dict.fromkeys(player_ids)
+        if found:
+            preds = self.model.predict(self.X[[rows[player_id] for player_id in found]])
+            projections.update(zip(found, preds.tolist()))
+        return projections
+
+    def predict_week(self, in_dir, season, week):
+        """
+        Projections for everyone who played in week of season, according to the partitions pipeline.ingest_seasons
+        wrote to in_dir
+        """
+        player_ids = {row['player_id'] for rows in week_rows(in_dir, season, week).values() for row in rows
+                      if row.get('player_id')}
+        return self.predict(sorted(player_ids), season)
+
+
+class Batcher:
+    """
+    Collects predict requests from the server threads and scores them together
+    A batch is whatever arrives within wait seconds of the first request, up to max_size requests. Each season in a
+    batch is one predict call covering every player its requests asked for
+    """
+
+    def __init__(self, predictor, wait=0.005, max_size=64):
+        self.predictor = predictor
+        self.wait = wait
+        self.max_size = max_size
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, player_ids, season=None):
+        # A Future of the request's {player_id: projection}
+        future = Future()
+        self._queue.put((list(player_ids) if player_ids is not None else None, season, future))
+        return future
+
+    def _run(self):
+        while True:
+            seasons = {}
+            for player_ids, season, future in self._batch():
+                seasons.setdefault(season, []).append((player_ids, future))
+            for season, requests in seasons.items():
+                self._score(season, requests)
+
+    def _batch(self):
+        # Blocks for the first request, then takes whatever else comes within wait
+        batch = [self._queue.get()]
+        try:
+            while len(batch) < self.max_size:
+                batch.append(self._queue.get(timeout=self.wait))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _score(self, season, requests):
+        # One predict call for every (player_ids, future) request of a season
+        try:
+            if any(player_ids is None for player_ids, _ in requests):
+                projections = self.predictor.predict(None, season)
+            else:
+                projections = self.predictor.predict(
+                    list(dict.fromkeys(pid for player_ids, _ in requests for pid in player_ids)), season)
+        except Exception as exc:
+            for _, future in requests:
+                future.set_exception(exc)
+            return
+        for player_ids, future in requests:
+            future.set_result(projections if player_ids is None else {pid: projections[pid] for pid in player_ids})
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    """
+    GET /predict?season=2018&player_id=...&player_id=... or POST /predict with {"season": 2018, "player_ids": [...]}
+    Answers with {player_id: projection}, every player the model can project when no player ids are given
+    """
+
+    batcher = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            return self._send(404, {'error': 'Path Not Found'})
+        query = parse_qs(url.query)
+        self._predict(query.get('player_id'), query.get('season', [None])[0])
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/predict':
+            return self._send(404, {'error': 'Path Not Found'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            return self._send(400, {'error': 'Body Is Not JSON'})
+        if not isinstance(body, dict):
+            return self._send(400, {'error': 'Body Is Not An Object'})
+        player_ids = body.get('player_ids')
+        if player_ids is not None and not isinstance(player_ids, list):
+            # A lone string would otherwise be taken a character at a time
+            return self._send(400, {'error': 'Player Ids Are Not A List'})
+        self._predict(player_ids, body.get('season'))
+
+    def _predict(self, player_ids, season):
+        try:
+            season = None if season is None else int(season)
+        except (TypeError, ValueError):
+            return self._send(400, {'error': 'Season Is Not A Year'})
+        try:
+            self._send(200, self.batcher.submit(player_ids, season).result())
+        except Exception as exc:
+            self._send(500, {'error': str(exc)})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(predictor, host='127.0.0.1', port=8050, wait=0.005, max_size=64):
+    """
+    Serves predictor's projections on host:port until interrupted
+    """
+    handler = type('Handler', (PredictHandler,), {'batcher': Batcher(predictor, wait, max_size)})
+    server = ThreadingHTTPServer((host, port), handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", help="Model pickle train_model saved")
+    parser.add_argument("source", help="feather, parquet or csv file of player seasons the model was trained on")
+    parser.add_argument("-p", "--port", type=int, default=8050)
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("-w", "--wait", help="Seconds a batch waits for more requests", type=float, default=0.005)
+    args = parser.parse_args()
+    serve(Predictor.load(args.model, args.source), args.host, args.port, args.wait)
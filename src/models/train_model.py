@@ -0,0 +1,218 @@
+"""
+Fits models on design matrices that are built once and memory mapped from then on
+
+    python -m src.models.train_model data/processed/player_seasons.feather -o models/rf.pkl
+
+The design matrix is cached under the hash of the source file's bytes and the feature spec, so running again with
+the same data and spec goes straight to fitting. The matrix is a float32 .npy opened with mmap_mode='r': the forest's
+threads and every worker process of fit_many read the same pages rather than each holding its own copy
+scikit-learn is only imported when a model is fit
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from src.data.atomic import atomic_write
+from src.features.build_features import history_features
+
+# The notebooks' setup, one row per player per season, predicting next season's score from the last few
+default_spec = {
+    'entity': 'player_id',
+    'period': 'year',
+    'history': ['ff_score'],
+    'lags': [1, 2, 3],
+    'leads': [1],
+    'halflife': None,
+    'target': 'ff_score_p1',
+    'features': None,
+    'drop': ['player_id', 'player_name', 'name'],
+    'fill': -999,
+}
+
+# RandomForestRegressor arguments from random_forest.ipynb
+forest_params = {'n_estimators': 30, 'max_features': 0.5, 'n_jobs': -1, 'oob_score': True, 'random_state': 42}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def read_frame(path):
+    import pandas as pd
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    raise KeyError('Format Not Found')
+
+
+def build_design(frame, spec):
+    """
+    Adds the spec's history features to frame and returns (X, y, columns, categories) for the rows that have a
+    target. Text columns become their category codes, categories keeps the categories of each so the predictor can
+    encode new rows the same way
+    """
+    frame = history_features(frame, spec['history'], spec['entity'], spec['period'], spec['lags'], spec['leads'],
+                             spec['halflife'])
+    frame = frame[frame[spec['target']].notna()]
+    leads = [f'{col}_p{k}' for col in spec['history'] for k in spec['leads']]
+    columns = spec['features'] or [col for col in frame.columns
+                                   if col not in set(spec['drop'] + leads + [spec['target']])]
+    categories = {col: [str(cat) for cat in frame[col].astype('category').cat.categories] for col in columns
+                  if frame[col].dtype == object or str(frame[col].dtype) in ['category', 'string', 'str']}
+    X = encode(frame, columns, categories, spec['fill'])
+    y = frame[spec['target']].to_numpy(np.float32)
+    return X, y, columns, categories
+
+
+def encode(frame, columns, categories, fill=-999):
+    """
+    frame's columns as a C ordered float32 matrix, the columns in categories as their codes in those categories
+    (-1 for a value that isn't one of them), missing values as fill
+    """
+    import pandas as pd
+    X = np.empty((len(frame), len(columns)), np.float32)
+    for idx, col in enumerate(columns):
+        if col in categories:
+            X[:, idx] = pd.Categorical(frame[col].astype(str).where(frame[col].notna()), categories[col]).codes
+        else:
+            X[:, idx] = frame[col].to_numpy(np.float32, na_value=np.nan)
+    X[np.isnan(X)] = fill
+    return X
+
+
+class DesignCache:
+    """
+    Design matrices on disk, root/<key>/ holding X.npy, y.npy and meta.json
+    An entry is written to a temp directory and renamed into place, so a half written one is never read
+    """
+
+    def __init__(self, root='data/processed/design'):
+        self.root = root
+
+    @staticmethod
+    def key(source, spec):
+        sha = hashlib.sha256(file_hash(source).encode())
+        sha.update(json.dumps(spec, sort_keys=True).encode())
+        return sha.hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def load(self, key):
+        """
+        (X, y, meta) of a cached entry, X and y memory mapped read only, None when it isn't cached
+        """
+        path = self.path(key)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        return (np.load(os.path.join(path, 'X.npy'), mmap_mode='r'),
+                np.load(os.path.join(path, 'y.npy'), mmap_mode='r'), meta)
+
+    def store(self, key, X, y, meta):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=self.root)
+        np.save(os.path.join(tmp_path, 'X.npy'), np.ascontiguousarray(X, np.float32))
+        np.save(os.path.join(tmp_path, 'y.npy'), np.ascontiguousarray(y, np.float32))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+        try:
+            os.rename(tmp_path, self.path(key))
+        except OSError:
+            # Another run cached the same key first, theirs is identical
+            shutil.rmtree(tmp_path)
+        return self.load(key)
+
+    def design(self, source, spec=None):
+        """
+        The design matrix for source (a feather, parquet or csv file of player seasons) under spec, built and cached
+        the first time, memory mapped from the cache after that. Returns (X, y, meta, key)
+        """
+        spec = dict(default_spec, **(spec or {}))
+        key = self.key(source, spec)
+        cached = self.load(key)
+        if cached is None:
+            X, y, columns, categories = build_design(read_frame(source), spec)
+            cached = self.store(key, X, y, {'source': source, 'spec': spec, 'columns': columns,
+                                            'categories': categories, 'rows': len(y)})
+        return cached + (key,)
+
+
+def fit_forest(X, y, **params):
+    """
+    Fits a RandomForestRegressor, the notebooks' settings unless params says otherwise
+    With n_jobs the trees are built on threads, which all read the one (memory mapped) X
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    model = RandomForestRegressor(**dict(forest_params, **params))
+    model.fit(X, y)
+    return model
+
+
+def _fit_cached(root, key, params):
+    # Runs in a worker process, only the cache key crosses the process boundary, the matrix is mapped from disk
+    X, y, _ = DesignCache(root).load(key)
+    model = fit_forest(X, y, **params)
+    return params, getattr(model, 'oob_score_', None), pickle.dumps(model)
+
+
+def fit_many(cache, key, param_sets, workers=None):
+    """
+    Fits a forest per dict in param_sets on the cached design matrix key, each in its own process
+    Returns [(params, oob score, model)], the processes share the mapped matrix through the page cache
+    Each fit is single threaded unless its params set n_jobs
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_fit_cached, cache.root, key, dict({'n_jobs': 1}, **params))
+                   for params in param_sets]
+        for future in futures:
+            params, oob, model = future.result()
+            results.append((params, oob, pickle.loads(model)))
+    return results
+
+
+def save_model(model, meta, path):
+    """
+    Pickles the model with the design matrix's meta (columns, categories, spec), which the predictor needs to build
+    matching rows
+    """
+    with atomic_write(path) as file:
+        pickle.dump({'model': model, 'meta': meta}, file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="feather, parquet or csv file with one row per player per season")
+    parser.add_argument("-o", "--out", help="Where the fitted model is pickled", default='models/rf.pkl')
+    parser.add_argument("-c", "--cache", help="Design matrix cache directory", default='data/processed/design')
+    parser.add_argument("-t", "--target", help="Column to predict", default=default_spec['target'])
+    parser.add_argument("-n", "--n_estimators", help="Trees per forest, several fit them in parallel", type=int,
+                        nargs='*', default=[forest_params['n_estimators']])
+    parser.add_argument("-w", "--workers", help="Processes for fitting several forests", type=int)
+    args = parser.parse_args()
+    cache = DesignCache(args.cache)
+    X, y, meta, key = cache.design(args.source, {'target': args.target})
+    print(f'design matrix {key}: {X.shape[0]} rows x {X.shape[1]} features')
+    if len(args.n_estimators) == 1:
+        best = fit_forest(X, y, n_estimators=args.n_estimators[0])
+    else:
+        fits = fit_many(cache, key, [{'n_estimators': n_est} for n_est in args.n_estimators], args.workers)
+        for params, oob, _ in fits:
+            print(params, 'oob', oob)
+        best = max(fits, key=lambda fit: fit[1] or 0)[2]
+    print('oob', getattr(best, 'oob_score_', None))
+    save_model(best, meta, args.out)
@@ -0,0 +1,30 @@
+import os
+import pytest
+from src.data.atomic import atomic_write
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / 'sub' / 'out.json')
+    with atomic_write(path, 'w') as file:
+        file.write('old')
+    with atomic_write(path, 'w') as file:
+        file.write('new')
+        # Until the block is done readers still see the old file
+        with open(path) as current:
+            assert current.read() == 'old'
+    with open(path) as current:
+        assert current.read() == 'new'
+    assert os.listdir(tmp_path / 'sub') == ['out.json']
+
+
+def test_atomic_write_leaves_the_file_when_the_block_raises(tmp_path):
+    path = str(tmp_path / 'out.bin')
+    with atomic_write(path) as file:
+        file.write(b'kept')
+    with pytest.raises(ValueError):
+        with atomic_write(path) as file:
+            file.write(b'half')
+            raise ValueError
+    with open(path, 'rb') as current:
+        assert current.read() == b'kept'
+    assert os.listdir(tmp_path) == ['out.bin']
@@ -0,0 +1,90 @@
+import json
+import numpy as np
+import pytest
+from src.features.build_features import (History, RuleSet, Scorer, combine, dst, history_features, league_formats,
+                                         period_index, points_allowed)
+
+QB = {'player_id': 'qb', 'game_id': 'g', 'pass_yds': 250, 'pass_td': 2, 'pass_int': 1}
+WR = {'player_id': 'wr', 'game_id': 'g', 'rec': 5, 'rec_yds': 80, 'rec_td': 1}
+
+
+def test_standard_half_ppr_and_ppr():
+    scorer = Scorer([league_formats[name] for name in ['standard', 'half_ppr', 'ppr']])
+    points = scorer.score([QB, WR])
+    assert points.tolist() == [[16, 16, 16], [14, 16.5, 19]]
+
+
+def test_bonus_band_includes_both_ends():
+    scorer = Scorer([league_formats['ppr_bonus']])
+    rows = [{'rush_yds': yds} for yds in [99, 100, 101]]
+    assert scorer.score(rows)[:, 0] == pytest.approx([9.9, 13, 13.1])
+    # points_allowed 1 to 6 is one band, 6 gets it and 7 is the next tier
+    scorer = Scorer([dst])
+    rows = [{'points_allowed': pts} for pts in [0, 1, 6, 7, 13, 14, 21, 27, 28, 35, 50]]
+    assert scorer.score(rows)[:, 0].tolist() == [10, 7, 7, 4, 4, 1, 0, 0, -1, -4, -4]
+
+
+def test_team_defense_scores_points_allowed():
+    scorebox = {'game_id': 'g', 'home_team_id': 'nwe', 'away_team_id': 'kan', 'home_team_score': 27,
+                'away_team_score': 6}
+    defense = [{'team': 'nwe', 'game_id': 'g', 'sacks': 3, 'def_int': 1},
+               {'team': 'kan', 'game_id': 'g', 'sacks': 1, 'fumbles_rec': 1}]
+    scorer = Scorer([dst])
+    keys, mat = combine([defense, points_allowed([scorebox])], scorer.stats, keys=('team', 'game_id'))
+    assert keys.tolist() == [['nwe', 'g'], ['kan', 'g']]
+    # nwe: 3 + 2 + 7 for allowing 6, kan: 1 + 2 - 0 for allowing 27
+    assert scorer.score_matrix(mat)[:, 0].tolist() == [12, 3]
+
+
+def test_rule_set_round_trips_through_json():
+    rule_set = league_formats['ppr_bonus']
+    loaded = RuleSet.from_dict(json.loads(json.dumps(rule_set.to_dict())))
+    assert loaded.to_dict() == rule_set.to_dict()
+    assert loaded.bonuses == rule_set.bonuses
+    rows = [QB, WR, {'rush_yds': 120, 'rec': 2}]
+    assert np.array_equal(Scorer([loaded]).score(rows), Scorer([rule_set]).score(rows))
+
+
+def test_combine_sums_offense_returns_and_kicking():
+    offense = [{'player_id': 'rb', 'game_id': 'g', 'rush_yds': 50}, WR]
+    returns = [{'player_id': 'rb', 'game_id': 'g', 'kick_ret_td': 1}]
+    kicking = [{'player_id': 'k', 'game_id': 'g', 'fgm': 2, 'fga': 2, 'xpm': 1, 'xpa': 1}]
+    scorer = Scorer([league_formats['standard']])
+    keys, mat = combine([offense, returns, kicking], scorer.stats)
+    assert keys.tolist() == [['rb', 'g'], ['wr', 'g'], ['k', 'g']]
+    assert scorer.score_matrix(mat)[:, 0].tolist() == [11, 14, 9]
+
+
+def test_lag_and_lead_skip_a_missing_season():
+    # a sat out 2012, b's rows are out of order
+    hist = History(['a', 'a', 'b', 'a', 'b'], [2010, 2011, 2011, 2013, 2010])
+    vals = [10, 20, 5, 40, 3]
+    assert np.array_equal(hist.lag(vals), [np.nan, 10, 3, np.nan, np.nan], equal_nan=True)
+    assert np.array_equal(hist.lead(vals), [20, np.nan, np.nan, np.nan, 5], equal_nan=True)
+    # prev goes by rows, so it does reach back over the gap
+    assert np.array_equal(hist.prev(vals), [np.nan, 10, 3, 20, np.nan], equal_nan=True)
+
+
+def test_ewm_decays_over_the_gap():
+    hist = History(['a'] * 3, [2010, 2011, 2013])
+    vals = [10, 20, 40]
+    # halflife 1: 2011 holds 0.5 * 10 + 20 over a weight of 1.5, two seasons on it's worth a quarter of that
+    assert hist.ewm(vals, 1, exclusive=False)[2] == pytest.approx((0.25 * 25 + 40) / (0.25 * 1.5 + 1))
+    # As of the start of 2013 only the decayed history counts, and decaying both halves leaves the mean as it was
+    assert hist.ewm(vals, 1)[2] == pytest.approx(25 / 1.5)
+    assert np.isnan(hist.ewm(vals, 1)[0])
+
+
+def test_period_index_runs_across_the_offseason():
+    assert period_index([2017, 2016, 2017, 2016], [1, 17, 2, 16]).tolist() == [2, 1, 3, 0]
+
+
+def test_history_features_names_its_columns():
+    import pandas as pd
+    frame = pd.DataFrame({'player_id': ['a', 'a', 'a'], 'year': [2010, 2011, 2013], 'ff_score': [10., 20., 40.]})
+    features = history_features(frame, ['ff_score'], lags=(1,), leads=(1,), halflife=1)
+    assert features['ff_score_m1'][1] == 10 and features['ff_score_p1'][0] == 20
+    assert np.isnan(features['ff_score_m1'][2]) and np.isnan(features['ff_score_p1'][1])
+    assert features['season_number'].tolist() == [0, 1, 2]
+    assert features['periods_since_first'].tolist() == [0, 1, 3]
+    assert features['ff_score_cummean'][2] == pytest.approx(15)
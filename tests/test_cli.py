@@ -0,0 +1,45 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import pytest
+from src.data import cli, crawler, page_cache, registry
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def defaults(monkeypatch):
+    # main() swaps in its own crawler, cache and registry, the other tests get theirs back
+    monkeypatch.delenv('FF_ID_REGISTRY', raising=False)
+    monkeypatch.setattr(crawler, '_default_crawler', crawler._default_crawler)
+    monkeypatch.setattr(page_cache, '_default_cache', None)
+    monkeypatch.setattr(page_cache, '_default_set', True)
+    monkeypatch.setattr(registry, '_default_registry', None)
+
+
+def test_help_imports_no_scrapers():
+    code = ("import sys\nfrom src.data import cli\ntry:\n    cli.main(['game', '--help'])\nexcept SystemExit:\n    pass\n"
+            "print(sorted(set(sys.modules) & {'bs4', 'lxml', 'numpy', 'pandas', 'pyarrow'}))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert 'usage: ff-data game' in result.stdout
+    assert result.stdout.splitlines()[-1] == '[]'
+
+
+def test_game_writes_json_lines(tmp_path):
+    cli.main(['game', BOXSCORE, '-t', 'scoring', 'all_player_offense', '-o', str(tmp_path), '--no_cache'])
+    assert sorted(os.listdir(tmp_path)) == ['player_offense.jsonl', 'scoring.jsonl']
+    with open(tmp_path / 'scoring.jsonl') as file:
+        assert len([json.loads(line) for line in file]) == 3
+
+
+def test_game_partitions_by_season(tmp_path):
+    cli.main(['game', BOXSCORE, '-t', 'scoring', '-o', str(tmp_path), '-f', 'parquet', '--no_cache'])
+    assert os.path.exists(tmp_path / '201709070nwe' / 'scoring' / 'season=2017' / 'part.parquet')
+
+
+def test_playoff_games_belong_to_the_season_before():
+    assert cli._game_season(datetime.datetime(2018, 2, 4)) == 2017
+    assert cli._game_season(datetime.datetime(2017, 9, 7)) == 2017
@@ -0,0 +1,150 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import time
+import pytest
+from src.data import page_cache
+from src.data.crawler import Crawler
+from src.data.page_cache import PageCache
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    /page/<n> answers after a random pause, /retry is a 503 with Retry-After: 0 the first time, /missing is a 404
+    and /etag answers If-None-Match with a 304
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((self.path, time.monotonic(), self.headers.get('If-None-Match')))
+            path_hits = sum(hit[0] == self.path for hit in server.hits)
+        if self.path.startswith('/page/'):
+            time.sleep(random.uniform(0, 0.02))
+            self._send(200, f'page {self.path.split("/")[-1]}'.encode())
+        elif self.path == '/retry':
+            if path_hits == 1:
+                self._send(503, b'busy', {'Retry-After': '0'})
+            else:
+                self._send(200, b'retried')
+        elif self.path == '/etag':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self._send(304, b'', {'ETag': '"v1"'})
+            else:
+                self._send(200, b'tagged', {'ETag': '"v1"'})
+        else:
+            self._send(404, b'not found')
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    server.hits = []
+    server.lock = threading.Lock()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_default_cache(monkeypatch):
+    monkeypatch.setattr('src.data.page_cache._default_cache', None)
+    monkeypatch.setattr('src.data.page_cache._default_set', True)
+
+
+def test_crawl_yields_in_order(server):
+    crawler = Crawler(delay=0, workers=4)
+    urls = [f'{server.url}/page/{idx}' for idx in range(20)]
+    results = list(crawler.crawl(urls, extract=lambda pg: pg.decode()))
+    assert [url for url, _ in results] == urls
+    assert [pg for _, pg in results] == [f'page {idx}' for idx in range(20)]
+
+
+def test_rate_limit_spaces_requests(server):
+    crawler = Crawler(delay=0.1, workers=4)
+    list(crawler.crawl([f'{server.url}/page/{idx}' for idx in range(6)]))
+    times = sorted(hit[1] for hit in server.hits)
+    assert len(times) == 6
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    # One token at a time at 10 a second, allow a little scheduling slack
+    assert min(gaps) > 0.08
+    assert times[-1] - times[0] > 0.45
+
+
+def test_retry_after_is_honoured(server):
+    # A backoff of 60s would stall the test, Retry-After: 0 retries straight away
+    crawler = Crawler(delay=0, retries=2, backoff=60)
+    start = time.monotonic()
+    assert crawler.fetch(f'{server.url}/retry') == b'retried'
+    assert time.monotonic() - start < 5
+    assert [hit[0] for hit in server.hits] == ['/retry', '/retry']
+
+
+def test_retry_after_parses_seconds_and_dates():
+    assert Crawler.retry_after('7') == 7
+    assert Crawler.retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert Crawler.retry_after('soon') is None
+    assert Crawler.retry_after(None) is None
+
+
+def test_missing_page_goes_to_failed(server):
+    crawler = Crawler(delay=0, retries=3)
+    urls = [f'{server.url}/page/1', f'{server.url}/missing', f'{server.url}/page/2']
+    results = list(crawler.crawl(urls, skip_errors=True))
+    assert [url for url, _ in results] == [urls[0], urls[2]]
+    assert [url for url, _ in crawler.failed] == [urls[1]]
+    assert crawler.failed[0][1].code == 404
+    # A 404 isn't worth retrying
+    assert [hit[0] for hit in server.hits].count('/missing') == 1
+
+
+def test_missing_page_raises_without_skip_errors(server):
+    crawler = Crawler(delay=0)
+    with pytest.raises(Exception):
+        list(crawler.crawl([f'{server.url}/missing']))
+
+
+def test_etag_revalidation(server, tmp_path):
+    url = f'{server.url}/etag'
+    cache = PageCache(str(tmp_path), ttl=None)
+    crawler = Crawler(delay=0, cache=cache)
+    assert crawler.fetch(url) == b'tagged'
+    assert cache.entry(url)['etag'] == '"v1"'
+    # Fresh, so it never reaches the server
+    assert crawler.fetch(url) == b'tagged'
+    assert len(server.hits) == 1
+    # Stale, so it's revalidated and the 304 serves the cached copy
+    checked = cache.entry(url)['checked']
+    assert crawler.fetch(url, ttl=0) == b'tagged'
+    assert server.hits[-1][2] == '"v1"'
+    assert len(server.hits) == 2
+    assert cache.entry(url)['checked'] > checked
+
+
+def test_pages_are_cached_by_default(tmp_path, monkeypatch):
+    monkeypatch.setattr('src.data.page_cache._default_set', False)
+    monkeypatch.setattr('src.data.page_cache.DEFAULT_CACHE_DIR', str(tmp_path / 'page_cache'))
+    monkeypatch.delenv('FF_PAGE_CACHE', raising=False)
+    assert page_cache.default_cache().root == str(tmp_path / 'page_cache')
+
+
+def test_ff_page_cache_off_turns_caching_off(monkeypatch):
+    monkeypatch.setattr('src.data.page_cache._default_set', False)
+    monkeypatch.setenv('FF_PAGE_CACHE', 'off')
+    assert page_cache.default_cache() is None
+    assert Crawler(delay=0).cache is None
@@ -0,0 +1,51 @@
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pytest
+from src.data.export import FORMATS, write_table
+
+
+def plays(count):
+    for idx in range(count):
+        yield {'quarter': str(idx % 4 + 1), 'down': idx % 4 + 1, 'detail': f'play {idx % 7}', 'exp_pts_before': 0.5,
+               'year': 2017, 'week': 1, 'away_team': 'Chiefs', 'home_team': None if idx % 5 else 'Patriots'}
+
+
+def read(path, fmt):
+    return pq.read_table(path) if fmt == 'parquet' else feather.read_table(path)
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_generator_is_written_in_batches(tmp_path, fmt):
+    streamed, listed = str(tmp_path / f'streamed.{fmt}'), str(tmp_path / f'listed.{fmt}')
+    assert write_table('pbp_raw', plays(25), streamed, fmt, row_group_size=10) == 25
+    assert write_table('pbp_raw', list(plays(25)), listed, fmt) == 25
+    # Each batch adds to the string columns' dictionaries, the values come back the same
+    assert read(streamed, fmt).to_pylist() == read(listed, fmt).to_pylist()
+    if fmt == 'parquet':
+        assert pq.ParquetFile(streamed).num_row_groups == 3
+
+
+def test_column_after_the_first_batch_is_a_key_error(tmp_path):
+    rows = list(plays(12))
+    rows[11]['surprise'] = 1.0
+    with pytest.raises(KeyError, match='Column Not in Schema'):
+        write_table('pbp_raw', iter(rows), str(tmp_path / 'plays.parquet'), row_group_size=10)
+    # A list is read whole first, so its columns cover every row
+    write_table('pbp_raw', rows, str(tmp_path / 'listed.parquet'), row_group_size=10)
+    assert 'surprise' in pq.read_schema(str(tmp_path / 'listed.parquet')).names
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_no_rows_still_writes_a_file(tmp_path, fmt):
+    path = str(tmp_path / f'empty.{fmt}')
+    assert write_table('pbp_raw', iter([]), path, fmt) == 0
+    assert read(path, fmt).num_rows == 0
+
+
+def test_stats_table_counts_are_int16(tmp_path):
+    rows = [{'player_id': 'BradTo00', 'pass_att': 36.0, 'pass_yds': 267, 'pass_cmp_perc': 44.4, 'sacks': 0.5}]
+    path = str(tmp_path / 'player_offense.parquet')
+    write_table('player_offense', rows, path)
+    schema = pq.read_schema(path)
+    assert str(schema.field('pass_att').type) == 'int16' and str(schema.field('pass_yds').type) == 'int16'
+    assert str(schema.field('pass_cmp_perc').type) == 'float' and str(schema.field('sacks').type) == 'float'
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from src.features.feature_store import FeatureStore
+
+
+def rows(player_ids, yds):
+    return {'player_offense': [{'player_id': player_id, 'rush_yds': yds, 'targets': 1} for player_id in player_ids]}
+
+
+def test_ewm_decays_by_elapsed_weeks():
+    store = FeatureStore(halflife=1)
+    store.fold_week(2017, 1, rows(['a', 'b'], 100))
+    # Week 2 is never folded in, it still counts against a's and b's first games
+    store.fold_week(2017, 3, rows(['a'], 0))
+    assert store.week_ct == 3
+    features = store.features(['a', 'b']).set_index('player_id')
+    # ff_points is a tenth of the rush yards, weighted 1/4 against 1 two weeks on
+    assert features.loc['a', 'ff_points_ewm'] == pytest.approx(10 * 0.25 / 1.25)
+    assert features.loc['b', 'weeks_since'] == 2
+
+
+def test_offseason_counts_as_one_week():
+    store = FeatureStore()
+    store.fold_week(2016, 17, rows(['a'], 100))
+    store.fold_week(2017, 1, rows(['a'], 100))
+    assert store.week_ct == 18
+    assert np.array_equal(store.last_week[:len(store)], [18])
+
+
+def test_weeks_fold_in_order():
+    store = FeatureStore()
+    store.fold_week(2017, 2, rows(['a'], 100))
+    with pytest.raises(KeyError):
+        store.fold_week(2017, 2, rows(['a'], 100))
+    with pytest.raises(KeyError):
+        store.fold_week(2017, 1, rows(['a'], 100))
+
+
+def test_empty_store_has_no_features():
+    store = FeatureStore()
+    assert store.features().empty
+    features = store.features(['a']).set_index('player_id')
+    assert features.loc['a', 'games'] == 0 and features.loc['a', 'weeks_since'] == -1
+    assert np.isnan(features.loc['a', 'ff_points_mean'])
+
+
+def test_arrays_grow_geometrically(tmp_path):
+    store = FeatureStore(str(tmp_path / 'rolling.npz'))
+    capacities = set()
+    for week in range(1, 18):
+        store.fold_week(2017, week, rows([f'p{idx}' for idx in range(week * 10)], week))
+        capacities.add(len(store.games))
+    assert len(store) == 170 and sorted(capacities) == [64, 128, 256]
+    store.save()
+    loaded = FeatureStore.load(store.path)
+    assert len(loaded) == 170 and len(loaded.games) > 170
+    assert loaded.features().equals(store.features())
+    # A player added after the load starts from a fresh row
+    loaded.fold_week(2017, 18, rows(['new'], 100))
+    assert loaded.features(['new'])['ff_points_last4'].tolist() == [10]
@@ -0,0 +1,56 @@
+import os
+import pickle
+import pytest
+from src.data.game_data import GameData
+from src.data.page_parser import page_fragments
+from src.data.registry import IdRegistry
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+
+
+@pytest.fixture
+def subset():
+    with GameData(BOXSCORE, ['scoring', 'all_player_offense'], registry=IdRegistry()) as gd:
+        yield gd
+
+
+def test_table_outside_extract_is_a_key_error(subset):
+    assert len(subset.scoring) == 3
+    assert len(subset.stats_table('all_player_offense')) == 3
+    with pytest.raises(KeyError, match='Table Not Extracted: all_officials'):
+        subset.officials
+    with pytest.raises(KeyError, match='Table Not Extracted: all_home_drives'):
+        subset.drives('home')
+    with pytest.raises(KeyError, match='Table Not Extracted'):
+        subset.extract(['game_info'])
+
+
+def test_table_missing_from_page_is_a_key_error():
+    with GameData(BOXSCORE, registry=IdRegistry()) as gd:
+        with pytest.raises(KeyError, match='Table Not Found: all_player_defense'):
+            gd.stats_table('all_player_defense')
+        assert 'all_player_defense' not in gd.extract(['stats_table'])['stats_table']
+
+
+def test_unknown_table_is_a_key_error():
+    with pytest.raises(KeyError, match='Table Not in List of Tables'):
+        GameData(BOXSCORE, ['box_score'], registry=IdRegistry())
+
+
+def test_prescan_ignores_data_attributes():
+    markup = ('<html><body><div data-id="all_scoring" class="decoy">decoy</div>'
+              '<div class="wrap" data-class="scorebox">wrapped</div>'
+              '<div id="all_scoring"><div>kept</div></div></body></html>')
+    fragments = page_fragments(markup, ['all_scoring'], ['scorebox'])
+    assert 'kept' in fragments
+    assert 'decoy' not in fragments
+    assert 'wrapped' not in fragments
+
+
+def test_extract_rows_outlive_the_soup():
+    # The pipeline's workers pickle these back after the soup is decomposed, game_info's keys are labels off the page
+    with GameData(BOXSCORE, registry=IdRegistry()) as gd:
+        rows = gd.extract_rows()
+    assert all(type(key) is str for row in rows['game_info'] for key in row)
+    # Compared by repr, a play with no time on the clock has NaN times, which never equal themselves
+    assert repr(pickle.loads(pickle.dumps(rows))) == repr(rows)
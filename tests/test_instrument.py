@@ -0,0 +1,68 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from src.data import instrument
+from src.data.pipeline import parse_game
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+
+
+@pytest.fixture(autouse=True)
+def inactive(monkeypatch):
+    monkeypatch.setattr(instrument, 'active', None)
+
+
+def test_hooks_do_nothing_until_enabled():
+    with instrument.timer('parse'):
+        instrument.count('rows', 3)
+    assert instrument.active is None
+    instruments = instrument.enable()
+    with instrument.timer('parse', parser='lxml'):
+        instrument.count('rows', 3, table='scoring')
+    assert list(instruments.timers) == [('parse', (('parser', 'lxml'),))]
+    assert instruments.counters == {('rows', (('table', 'scoring'),)): 3}
+    assert instrument.disable() is instruments and instrument.active is None
+
+
+def test_worker_stats_merge_into_the_run():
+    with open(BOXSCORE, 'rb') as file:
+        pg = file.read()
+    instruments = instrument.enable()
+    instrument.count('cache_hits')
+    with ProcessPoolExecutor(2) as executor:
+        futures = [executor.submit(parse_game, pg, BOXSCORE, ['scoring'], None, True) for _ in range(2)]
+        stats = []
+        for future in futures:
+            rows, worker_stats = future.result()
+            assert len(rows['scoring']) == 3
+            stats.append(worker_stats)
+            instruments.merge(*worker_stats)
+    timers, counters = stats[0]
+    # Each worker's numbers are its own game's, the parent's count isn't carried into them
+    assert ('cache_hits', ()) not in counters and counters[('rows', (('cls', 'GameData'), ('table', 'scoring')))] == 3
+    assert instruments.counters == {('cache_hits', ()): 1, **{key: 2 * val for key, val in counters.items()}}
+    for key, (calls, total, longest) in instruments.timers.items():
+        assert calls == 2 * timers[key][0] and longest == max(worker[0][key][2] for worker in stats)
+
+
+def test_reports(tmp_path):
+    instruments = instrument.enable()
+    instruments.add_time('parse', 0.5, parser='lxml')
+    instruments.add_time('parse', 1.5, parser='lxml')
+    instrument.count('cache_hits', 3)
+    instrument.count('cache_misses')
+    instrument.count('rows', 2, table='say "hi"')
+    path = str(tmp_path / 'run')
+    instrument.write_reports(path)
+    with open(path + '.json') as file:
+        report = json.load(file)
+    assert report['timers'] == [{'stage': 'parse', 'labels': {'parser': 'lxml'}, 'calls': 2, 'total_sec': 2.0,
+                                 'max_sec': 1.5}]
+    assert report['cache_hit_rate'] == 0.75
+    with open(path + '.prom') as file:
+        prom = file.read().splitlines()
+    assert prom[:4] == ['# TYPE ff_stage_seconds_total counter', 'ff_stage_seconds_total{stage="parse",parser="lxml"} 2.0',
+                        '# TYPE ff_stage_calls_total counter', 'ff_stage_calls_total{stage="parse",parser="lxml"} 2']
+    assert 'ff_rows_total{table="say \\"hi\\""} 2' in prom
+    assert prom[-2:] == ['# TYPE ff_cache_hit_ratio gauge', 'ff_cache_hit_ratio 0.75']
@@ -0,0 +1,117 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import pytest
+from src.data import pbp, pipeline
+from src.data.crawler import Crawler
+from src.data.game_data import GameData
+from src.data.manifest import IngestManifest
+from src.data.registry import IdRegistry
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+
+
+class Boxscores(BaseHTTPRequestHandler):
+    """
+    Serves the fixture boxscore with an etag, and a 304 to a request that already has it
+    """
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.server.etag)
+            self.end_headers()
+            return
+        with open(BOXSCORE, 'rb') as file:
+            body = file.read()
+        self.send_response(200)
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Boxscores)
+    server.hits = []
+    server.lock = threading.Lock()
+    server.etag = '"v1"'
+    server.game_url = f'http://127.0.0.1:{server.server_address[1]}/boxscores/201709070nwe.htm'
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_defaults(monkeypatch):
+    monkeypatch.setattr('src.data.page_cache._default_cache', None)
+    monkeypatch.setattr('src.data.page_cache._default_set', True)
+    monkeypatch.setattr('src.data.crawler._default_crawler', None)
+
+
+def test_fetch_if_changed_asks_the_server(server):
+    crawler = Crawler(delay=0)
+    pg, validators = crawler.fetch_if_changed(server.game_url)
+    assert pg.startswith(b'<') and validators['etag'] == '"v1"'
+    assert crawler.fetch_if_changed(server.game_url, validators) == (None, validators)
+    assert server.hits[-1][1] == '"v1"'
+    server.etag = '"v2"'
+    pg, validators = crawler.fetch_if_changed(server.game_url, validators)
+    assert pg is not None and validators['etag'] == '"v2"'
+
+
+def test_manifest_validators_need_a_current_entry(tmp_path):
+    manifest = IngestManifest(str(tmp_path / 'manifest.json'))
+    assert manifest.validators('g', ['pbp'], 1) is None
+    manifest.record('g', 'url', 'hash', ['pbp'], 1, {'etag': '"v1"'})
+    manifest.save()
+    manifest = IngestManifest(str(tmp_path / 'manifest.json'))
+    assert manifest.validators('g', ['pbp'], 1) == {'etag': '"v1"', 'last_modified': None}
+    assert manifest.validators('g', ['pbp'], 2) is None
+    assert manifest.validators('g', ['pbp', 'scoring'], 1) is None
+
+
+def test_incremental_pbp_revalidates_before_downloading(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(pbp, 'game_urls', lambda yr, wk, crawler: [server.game_url] if wk == 3 else [])
+    manifest_path = str(tmp_path / 'manifest.json')
+    # No week is the whole season, each week in its own directory
+    assert pbp.pbp_incremental_export(2017, None, manifest_path, str(tmp_path), slp_tm=0) == ['201709070nwe']
+    assert os.listdir(tmp_path / '2017_wk3') == ['201709070nwe.csv']
+    assert not os.path.exists(tmp_path / '2017_wkNone')
+    assert pbp.pbp_incremental_export(2017, None, manifest_path, str(tmp_path), slp_tm=0) == []
+    assert server.hits == [('/boxscores/201709070nwe.htm', None), ('/boxscores/201709070nwe.htm', '"v1"')]
+
+
+def test_ingest_carries_unchanged_games_over(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, 'season_game_urls', lambda year: iter([(1, server.game_url)]))
+    manifest_path = str(tmp_path / 'manifest.json')
+    out_dir = str(tmp_path / 'out')
+
+    def ingest():
+        row_cts, failed = pipeline.ingest_seasons(2017, 2017, out_dir, workers=1, slp_tm=0, registry=IdRegistry(),
+                                                  manifest_path=manifest_path)
+        assert failed == []
+        with open(os.path.join(out_dir, 'play_by_play', 'season=2017.jsonl')) as file:
+            return row_cts, file.read()
+
+    row_cts, pbp_rows = ingest()
+    assert row_cts[('play_by_play', 2017)] == 18
+    with open(manifest_path) as file:
+        assert json.load(file)['201709070nwe']['etag'] == '"v1"'
+    # Unchanged, so a 304 and the partitions are rewritten from the last run's rows
+    assert ingest() == (row_cts, pbp_rows)
+    assert server.hits[-1][1] == '"v1"'
+    # A new parser version has to parse the game again, so the page is downloaded
+    monkeypatch.setattr(GameData, 'parser_version', GameData.parser_version + 1)
+    assert ingest() == (row_cts, pbp_rows)
+    assert server.hits[-1][1] is None
+    assert len(server.hits) == 3
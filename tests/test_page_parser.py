@@ -0,0 +1,88 @@
+import math
+import os
+import pytest
+from src.data.game_data import GameData
+from src.data.page_parser import PARSERS, parse_page, soup_parser
+from src.data.registry import IdRegistry
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+BOXSCORE = os.path.join(FIXTURES, 'boxscore.htm')
+
+
+def plain(val):
+    # bs4 strings become str and NaN a marker, so results from different trees compare with ==
+    if isinstance(val, dict):
+        return {key: plain(v) for key, v in val.items()}
+    if isinstance(val, list):
+        return [plain(v) for v in val]
+    if isinstance(val, str):
+        return str(val)
+    if isinstance(val, float) and math.isnan(val):
+        return 'NaN'
+    return val
+
+
+def accessors(gd):
+    # Every GameData accessor the fixture has a table for
+    return plain({
+        'scorebox': gd.scorebox,
+        'scoring': gd.scoring,
+        'game_info': gd.game_info,
+        'officials': gd.officials,
+        'game_summ': gd.game_summ,
+        'player_offense': gd.stats_table('all_player_offense'),
+        'home_snap_counts': gd.stats_table('all_home_snap_counts'),
+        'offense_batch': gd.stats_table_batch('all_player_offense').to_frame().astype(object).to_dict('list'),
+        'home_starters': gd.starters('home'),
+        'away_starters': gd.starters('away'),
+        'home_drives': gd.drives('home'),
+        'away_drives': gd.drives('away'),
+        'play_by_play': gd.play_by_play(),
+        'extract_rows': gd.extract_rows(),
+    })
+
+
+@pytest.fixture(scope='module')
+def results():
+    return {parser: accessors(GameData(BOXSCORE, parser=parser, registry=IdRegistry())) for parser in PARSERS}
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+def test_accessors_match_across_parsers(results, parser):
+    expected = results[PARSERS[0]]
+    for table in expected:
+        assert results[parser][table] == expected[table], table
+
+
+def test_accessors_read_the_fixture(results):
+    result = results['lxml']
+    assert result['scorebox']['game_id'] == '201709070nwe'
+    assert result['scorebox']['home_team_score'] == 10
+    assert result['scorebox']['stadium_id'] == 'BOS00'
+    assert [row['score_type'] for row in result['scoring']] == ['pass', 'pass', 'field_goal']
+    assert [row['ref_id'] for row in result['officials']] == ['HochJo0r', 'PaulMi0r']
+    assert [row['player_id'] for row in result['player_offense']] == ['BradTo00', 'SmitAl03', 'HuntKa00']
+    assert len(result['play_by_play']) == 18
+    assert result['play_by_play'][0]['play_subtype'] == 'kickoff'
+    # The timeout has no time on the clock
+    assert result['play_by_play'][12]['sec_left_in_game'] == 'NaN'
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+def test_extract_subset_matches_whole_page(results, parser):
+    tables = ['scoring', 'officials', 'all_player_offense', 'drives']
+    with GameData(BOXSCORE, tables, parser, registry=IdRegistry()) as gd:
+        subset = plain(gd.extract())
+    assert subset['scoring'] == results[parser]['scoring']
+    assert subset['officials'] == results[parser]['officials']
+    assert subset['stats_table']['all_player_offense'] == results[parser]['player_offense']
+    assert subset['drives'] == {'home': results[parser]['home_drives'], 'away': results[parser]['away_drives']}
+
+
+def test_tree_backend_is_not_a_page_parser():
+    with pytest.raises(KeyError):
+        soup_parser('lxml-tree')
+    with pytest.raises(KeyError):
+        parse_page('<html></html>', 'lxml-tree')
+    with pytest.raises(KeyError):
+        GameData(BOXSCORE, parser='lxml-tree')
@@ -0,0 +1,29 @@
+import csv
+import os
+import pytest
+from src.data.game_data import GameData
+from src.data.pbp import pbp_write
+from src.data.registry import IdRegistry
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+
+
+def test_pbp_fields_keep_fields_later_plays_bring(tmp_path):
+    path = str(tmp_path / 'plays.csv')
+    with GameData(BOXSCORE, registry=IdRegistry()) as gd:
+        plays = list(gd.iter_play_by_play())
+    # A sack with an assist and a second penalty, fields the fixture's first play doesn't have
+    plays.append(dict(plays[-1], sack_asst_id='ButlMa00', pen_on_id_2='KelcTr00'))
+    assert 'sack_asst_id' not in plays[0] and 'pen_on_id_2' not in plays[0]
+    assert pbp_write(iter(plays), path, GameData.pbp_fields) == 19
+    with open(path, newline='') as file:
+        reader = csv.DictReader(file)
+        rows = list(reader)
+    assert reader.fieldnames == GameData.pbp_fields
+    assert (rows[-1]['sack_asst_id'], rows[-1]['pen_on_id_2']) == ('ButlMa00', 'KelcTr00')
+
+
+def test_field_the_first_row_lacks_is_an_error(tmp_path):
+    rows = [{'play_id': 1}, {'play_id': 2, 'sack_asst_id': 'ButlMa00'}]
+    with pytest.raises(ValueError):
+        pbp_write(rows, str(tmp_path / 'plays.csv'))
@@ -0,0 +1,56 @@
+from src.data import pipeline
+
+
+class Page:
+    """
+    Stands in for SeasonData/WeekData, records whether each page was closed
+    """
+    opened = []
+
+    def __init__(self, year, week=None):
+        self.week = week
+        self.closed = False
+        Page.opened.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.closed = True
+
+    @property
+    def week_urls(self):
+        wurls = [f'/years/2017/week_{week}.htm' for week in [1, 2, 2]]
+        return wurls, {}
+
+    @property
+    def game_urls(self):
+        return [f'/boxscores/g{self.week}{idx}.htm' for idx in range(2)]
+
+
+def test_season_game_urls_closes_every_page(monkeypatch):
+    monkeypatch.setattr(pipeline, 'SeasonData', Page)
+    monkeypatch.setattr(pipeline, 'WeekData', Page)
+    Page.opened = []
+    urls = pipeline.season_game_urls(2017)
+    assert next(urls) == (1, '/boxscores/g10.htm')
+    # The season page and the first week's are done with before the first game url is handed out
+    assert [page.closed for page in Page.opened] == [True, True]
+    assert list(urls) == [(1, '/boxscores/g11.htm'), (2, '/boxscores/g20.htm'), (2, '/boxscores/g21.htm')]
+    assert [page.week for page in Page.opened] == [None, 1, 2]
+    assert all(page.closed for page in Page.opened)
+
+
+def test_read_week_reads_only_the_week(tmp_path):
+    writer = pipeline.PartitionWriter(str(tmp_path))
+    for week in [1, 1, 2, 3]:
+        writer.write(2017, week, 'scoring', [{'game_id': f'g{week}', 'pts': week}])
+    writer.close()
+    path = writer.path('scoring', 2017)
+    assert [row['pts'] for row in pipeline.read_week(path, 1)] == [1, 1]
+    assert pipeline.read_week(path, 3) == [{'game_id': 'g3', 'pts': 3, 'season': 2017, 'week': 3}]
+    assert pipeline.read_week(path, 4) == []
+    # A file that no longer matches its index is scanned
+    with open(path, 'a') as file:
+        file.write('{"game_id": "g3", "pts": 4, "season": 2017, "week": 3}\n')
+    assert [row['pts'] for row in pipeline.read_week(path, 3)] == [3, 4]
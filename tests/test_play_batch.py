@@ -0,0 +1,23 @@
+import os
+from src.data.game_data import GameData
+from src.data.registry import IdRegistry
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+
+
+def test_play_batch_frame_matches_rows():
+    with GameData(BOXSCORE, registry=IdRegistry()) as gd:
+        rows = gd.play_by_play()
+        frame = gd.play_by_play_batch().to_frame()
+    assert list(frame.columns) == GameData.pbp_fields
+    assert len(frame) == len(rows)
+    assert str(frame['play_yds'].dtype) == 'Int16'
+    assert str(frame['play_type'].dtype) == 'category'
+    # -999 and NaN are nulls, everything else round trips
+    for field in ['play_yds', 'down', 'sec_left_in_game']:
+        expected = [None if val == -999 or val != val else int(val) for val in (row[field] for row in rows)]
+        assert [None if val is None else int(val) for val in frame[field].astype(object).where(
+            frame[field].notna(), None)] == expected
+    assert list(frame['play_type'].astype(object).where(frame['play_type'].notna(), -999)) == [
+        row['play_type'] for row in rows]
+    assert frame['play_yds'].isna().sum() == sum(row['play_yds'] == -999 for row in rows)
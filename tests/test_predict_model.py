@@ -0,0 +1,68 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from urllib import error, request
+import pandas as pd
+import pytest
+from src.models import predict_model, train_model
+
+# The models package's extra, see setup.py
+pytest.importorskip('sklearn')
+
+
+@pytest.fixture(scope='module')
+def predictor(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('predict')
+    # a plays every season, b's last season is 2012
+    frame = pd.DataFrame({'player_id': ['a'] * 5 + ['b'] * 3, 'year': list(range(2010, 2015)) + [2010, 2011, 2012],
+                          'ff_score': [10., 20., 30., 40., 50., 5., 6., 7.]})
+    source = str(tmp_path / 'player_seasons.csv')
+    frame.to_csv(source, index=False)
+    X, y, meta, _ = train_model.DesignCache(str(tmp_path / 'design')).design(source)
+    model = train_model.fit_forest(X, y, n_estimators=5, n_jobs=1, oob_score=False)
+    return predict_model.Predictor(model, meta, frame)
+
+
+def test_projections_need_the_season_before(predictor):
+    projections = predictor.predict(['a', 'b', 'c'], 2015)
+    assert projections['a'] is not None
+    # b's 2012 row projects 2013, not 2015
+    assert projections['b'] is None and projections['c'] is None
+    assert predictor.predict(['b'], 2013)['b'] is not None
+
+
+def test_batcher_scores_requests_together(predictor):
+    batcher = predict_model.Batcher(predictor, wait=0.05)
+    futures = [batcher.submit(['a'], 2015), batcher.submit(['a', 'b'], 2013), batcher.submit(['b'], 2013)]
+    results = [future.result(timeout=5) for future in futures]
+    assert results[0] == predictor.predict(['a'], 2015)
+    assert results[1] == predictor.predict(['a', 'b'], 2013)
+    assert results[2] == {'b': results[1]['b']}
+
+
+@pytest.fixture
+def url(predictor):
+    handler = type('Handler', (predict_model.PredictHandler,), {'batcher': predict_model.Batcher(predictor)})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/predict'
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    req = request.Request(url, json.dumps(body).encode(), {'Content-Type': 'application/json'})
+    try:
+        with request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read())
+    except error.HTTPError as err:
+        return err.code, json.loads(err.read())
+
+
+def test_post_round_trip(predictor, url):
+    assert post(url, {'season': 2015, 'player_ids': ['a', 'b']}) == (200, predictor.predict(['a', 'b'], 2015))
+
+
+def test_post_rejects_player_ids_that_are_not_a_list(url):
+    assert post(url, {'season': 2015, 'player_ids': 'a'}) == (400, {'error': 'Player Ids Are Not A List'})
@@ -0,0 +1,53 @@
+import pyarrow.parquet as pq
+from src.data.export import write_table
+from src.data.registry import IdRegistry, column_kind
+
+
+def test_codes_are_dense_and_never_change():
+    registry = IdRegistry()
+    assert [registry.code('player', id_str) for id_str in ('BradTo00', 'GronRo00', 'BradTo00')] == [0, 1, 0]
+    assert registry.code('team', 'nwe') == 0
+    registry.intern('player', 'BradTo00', 'Tom Brady')
+    assert registry.names['player'] == ['Tom Brady', None]
+    assert len(registry) == 3
+
+
+def test_save_and_load_keep_the_codes(tmp_path):
+    path = str(tmp_path / 'ids.json')
+    registry = IdRegistry(path)
+    registry.intern('player', 'GronRo00', 'Rob Gronkowski')
+    registry.intern('player', 'BradTo00', 'Tom Brady')
+    registry.intern('coach', 'BeliBi0', 'Bill Belichick')
+    registry.save()
+    loaded = IdRegistry(path)
+    assert loaded.ids == registry.ids and loaded.names == registry.names
+    assert loaded.code('player', 'BradTo00') == 1
+
+
+def test_intern_rows_swaps_in_the_registrys_copies():
+    registry = IdRegistry()
+    rows = registry.intern_rows([{'player_id': ''.join(['Brad', 'To00']), 'opp_id': 'kan', 'game_id': '201709070nwe',
+                                  'player_name': 'Tom Brady'}])
+    assert rows[0]['player_id'] is registry.ids['player'][0]
+    assert registry.ids['team'] == ['kan']
+    assert 'game_id' not in registry.codes['player'] and len(registry) == 2
+
+
+def test_column_kind():
+    assert [column_kind(col) for col in ('player_id', 'rec_by_id', 'pen_on_id_2', 'head_coach_id', 'home_team_id',
+                                         'team', 'ref_id', 'stadium_id', 'game_id', 'player_name')] == \
+        ['player', 'player', 'player', 'coach', 'team', 'team', 'referee', 'stadium', None, None]
+
+
+def test_exported_ids_use_the_registry_codes(tmp_path):
+    registry = IdRegistry()
+    registry.intern('player', 'GronRo00')
+    for name, ids in (('a', ['BradTo00', 'GronRo00']), ('b', ['EdelJu00', 'BradTo00'])):
+        rows = [{'player_id': id_str, 'player_name': id_str.lower(), 'pass_yds': 1.0} for id_str in ids]
+        write_table('player_offense', rows, str(tmp_path / f'{name}.parquet'), registry=registry)
+    assert registry.ids['player'] == ['GronRo00', 'BradTo00', 'EdelJu00']
+    for name in ('a', 'b'):
+        column = pq.read_table(str(tmp_path / f'{name}.parquet'), read_dictionary=['player_id'])['player_id']
+        # Every file decodes its ids from the same codes, the other strings keep a dictionary per file
+        assert [registry.code('player', id_str) for id_str in column.to_pylist()] == \
+            column.combine_chunks().indices.to_pylist()
@@ -0,0 +1,34 @@
+import os
+from src.data.game_data import GameData
+from src.data.registry import IdRegistry
+from src.data.stat_batch import StatBatch
+
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscore.htm')
+
+
+def test_dtypes_come_from_the_table_not_the_values():
+    whole = StatBatch(table='player_offense').extend([{'player_id': 'a', 'pass_yds': 250, 'pass_rating': 99}])
+    fraction = StatBatch(table='player_offense').extend([{'player_id': 'b', 'pass_yds': 250, 'pass_rating': 98.5}])
+    assert whole.to_frame().dtypes.astype(str).equals(fraction.to_frame().dtypes.astype(str))
+    assert str(whole.to_frame()['pass_yds'].dtype) == 'Int16'
+    assert str(whole.to_frame()['pass_rating'].dtype) == 'Float32'
+
+
+def test_declared_int_columns_are_integers():
+    batch = StatBatch(table='drives').extend([{'game_id': 'g', 'drive_num': 1, 'net_yds': 7},
+                                              {'game_id': 'g', 'drive_num': 2, 'net_yds': None}])
+    frame = batch.to_frame()
+    assert str(frame['drive_num'].dtype) == 'Int16'
+    assert list(frame['net_yds'].isna()) == [False, True]
+    assert str(StatBatch().extend([{'drive_num': 1}]).to_frame()['drive_num'].dtype) == 'Float32'
+
+
+def test_stats_table_batch_uses_its_table():
+    with GameData(BOXSCORE, registry=IdRegistry()) as gd:
+        batch = gd.stats_table_batch('all_player_offense')
+    assert batch.table == 'player_offense'
+    frame = batch.to_frame()
+    # Counts are integers, rates stay floats
+    assert str(frame['pass_att'].dtype) == 'Int16' and str(frame['pass_yds'].dtype) == 'Int16'
+    assert str(frame['pass_cmp_perc'].dtype) == 'Float32'
+    assert str(frame['player_id'].dtype) == 'category'
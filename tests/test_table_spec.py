@@ -0,0 +1,57 @@
+import os
+import pytest
+from src.data.page_parser import PARSERS
+from src.data.season_data import SeasonData
+from src.data.team_data import TeamData
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+SEASON_DIVS = ['all_AFC', 'all_NFC', 'all_afc_playoff_standings', 'all_playoff_results', 'all_passing', 'all_drives']
+TEAM_TABLES = ['team_stats', 'team_game_results', 'team_conversion']
+
+
+def plain(val):
+    # Keeps each value's type, so a '13' from one backend and a 13 from the other don't compare equal
+    if isinstance(val, dict):
+        return {key: plain(v) for key, v in val.items()}
+    if isinstance(val, list):
+        return [plain(v) for v in val]
+    if isinstance(val, str):
+        return str(val)
+    return type(val).__name__, val
+
+
+@pytest.fixture(scope='module')
+def results():
+    results = {}
+    for parser in PARSERS:
+        with SeasonData(2017, FIXTURES, parser) as sd:
+            result = {div_id: plain(sd.season_stats(div_id)) for div_id in SEASON_DIVS}
+        # The team page is read from the fixture, the season's list of team pages isn't needed
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(TeamData, 'team_pages', lambda self: {})
+            with TeamData(2017, parser=parser) as td:
+                td.soup_team_extract('/teams/nwe/2017.htm', FIXTURES, local=True)
+                result.update({table: plain(getattr(td, table)()) for table in TEAM_TABLES})
+        results[parser] = result
+    return results
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+def test_tables_match_across_parsers(results, parser):
+    expected = results[PARSERS[0]]
+    assert list(results[parser]) == SEASON_DIVS + TEAM_TABLES
+    for table in expected:
+        assert results[parser][table] == expected[table], table
+
+
+def test_tables_read_the_fixtures(results):
+    result = results['lxml']
+    assert [row['team_id'] for row in result['all_AFC']] == ['nwe', 'buf']
+    assert result['all_AFC'][0]['wins'] == '13'
+    assert result['all_playoff_results'][0]['loser_id'] == 'kan'
+    assert result['all_passing'][0]['g'] == ('float', 16.0)
+    assert result['all_drives'][0]['sec_avg'] == ('int', 165)
+    assert result['team_game_results'][0]['game_url'].endswith('/boxscores/201709070nwe.htm')
+    assert result['team_game_results'][0]['overtime'] == ('int', 0)
+    assert result['team_conversion'][0]['third_down_att'] == '211'
+    assert all(len(result[table]) == 2 for table in SEASON_DIVS + TEAM_TABLES)
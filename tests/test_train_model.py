@@ -0,0 +1,38 @@
+import pytest
+from src.models import train_model
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'player_seasons.csv'
+    lines = ['player_id,year,ff_score']
+    lines += [f'p{player},{year},{player * 10 + year - 2010}' for player in range(4) for year in range(2010, 2016)]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_design_is_built_once_then_mapped(source, tmp_path, monkeypatch):
+    cache = train_model.DesignCache(str(tmp_path / 'design'))
+    X, y, meta, key = cache.design(source)
+    # Every player season with a next season to predict
+    assert X.shape == (20, len(meta['columns'])) and len(y) == 20
+    assert 'player_id' not in meta['columns'] and 'ff_score_m1' in meta['columns']
+
+    def rebuild(frame, spec):
+        raise AssertionError('Design Rebuilt')
+
+    monkeypatch.setattr(train_model, 'build_design', rebuild)
+    X_hit, y_hit, meta_hit, key_hit = cache.design(source)
+    assert key_hit == key and meta_hit == meta
+    assert X_hit.filename is not None and (X_hit == X).all() and (y_hit == y).all()
+    # A different spec is a different entry
+    with pytest.raises(AssertionError):
+        cache.design(source, {'lags': [1]})
+
+
+def test_forest_fits_the_cached_design(source, tmp_path):
+    pytest.importorskip('sklearn')
+    X, y, meta, _ = train_model.DesignCache(str(tmp_path / 'design')).design(source)
+    model = train_model.fit_forest(X, y, n_estimators=5, n_jobs=1)
+    assert model.predict(X[:3]).shape == (3,)
+    assert model.n_features_in_ == len(meta['columns'])
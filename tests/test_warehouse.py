@@ -0,0 +1,30 @@
+from src.data.pipeline import PartitionWriter
+from src.data.warehouse import Warehouse
+
+
+def row_ct(wh, table):
+    return wh.query(f'SELECT COUNT(*) AS n FROM {table}')[0]['n']
+
+
+def test_reloading_partitions_replaces_them(tmp_path):
+    writer = PartitionWriter(str(tmp_path / 'interim'))
+    for week in [1, 2]:
+        writer.write(2017, week, 'officials', [{'game_id': f'g{week}', 'ref_id': 'HochJo0r'},
+                                              {'game_id': f'g{week}', 'ref_id': 'PaulMi0r'}])
+    writer.write(2016, 1, 'officials', [{'game_id': 'g0', 'ref_id': 'HochJo0r'}])
+    writer.close()
+    with Warehouse(str(tmp_path / 'ff.db')) as wh:
+        assert sum(wh.load_partitions(str(tmp_path / 'interim')).values()) == 5
+        wh.create_indexes()
+        assert sum(wh.load_partitions(str(tmp_path / 'interim')).values()) == 5
+        assert row_ct(wh, 'officials') == 5
+        assert len(wh.query('SELECT * FROM officials WHERE season = 2017 AND week = 2')) == 2
+
+
+def test_reloading_a_week_replaces_only_that_week(tmp_path):
+    with Warehouse(str(tmp_path / 'ff.db')) as wh:
+        wh.load_rows({'officials': [{'game_id': 'g1', 'ref_id': 'HochJo0r'}]}, 2017, 1)
+        wh.load_rows({'officials': [{'game_id': 'g2', 'ref_id': 'HochJo0r'}]}, 2017, 2)
+        wh.load_rows({'officials': [{'game_id': 'g1', 'ref_id': 'PaulMi0r'}]}, 2017, 1)
+        assert row_ct(wh, 'officials') == 2
+        assert [row['ref_id'] for row in wh.query('SELECT * FROM officials WHERE week = 1')] == ['PaulMi0r']